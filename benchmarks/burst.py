@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: MIT
+'''
+Sends a burst of pipelined method calls to a BlockingDBusServer and reports
+how many syscalls the server needed per message.
+
+Needs dbus-objects installed and a session bus, eg.
+``dbus-run-session -- python benchmarks/burst.py``.
+'''
+import argparse
+import threading
+import time
+
+import jeepney
+import jeepney.io.blocking
+
+import dbus_objects.integration.jeepney
+import dbus_objects.object
+
+
+class BenchmarkObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='io.github.ffy00.dbus_objects.bench')
+
+    @dbus_objects.object.dbus_method()
+    def ping(self) -> str:
+        return 'Pong!'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=500, help='calls per burst')
+    parser.add_argument('--bursts', type=int, default=10, help='number of bursts')
+    args = parser.parse_args()
+
+    name = 'io.github.ffy00.dbus-objects.bench'
+    path = '/io/github/ffy00/dbus_objects/bench'
+    server = dbus_objects.integration.jeepney.BlockingDBusServer(bus='SESSION', name=name)
+    server.register_object(path, BenchmarkObject())
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    address = jeepney.DBusAddress(path, bus_name=name, interface='io.github.ffy00.dbus_objects.bench.BenchmarkObject')
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as client:
+        client.send_and_get_reply(jeepney.new_method_call(address, 'Ping'), timeout=5)  # warm up
+        before = server.io_stats
+        start = time.perf_counter()
+        for _ in range(args.bursts):
+            for _ in range(args.calls):
+                client.send_message(jeepney.new_method_call(address, 'Ping'))
+            replies = 0
+            while replies < args.calls:
+                if client.receive(timeout=5).header.message_type == jeepney.MessageType.method_return:
+                    replies += 1
+        elapsed = time.perf_counter() - start
+
+        time.sleep(0.2)
+        run.clear()
+        client.send_and_get_reply(jeepney.new_method_call(address, 'Ping'), timeout=5)
+    thread.join()
+    after = server.io_stats
+    server.close()
+
+    stats = {key: after[key] - before[key] for key in after}
+    messages = stats['messages_received']
+    print(f'calls:                 {args.calls * args.bursts} ({args.bursts} bursts of {args.calls})')
+    print(f'calls/s:               {args.calls * args.bursts / elapsed:.0f}')
+    print(f'receive syscalls/msg:  {stats["receive_syscalls"] / messages:.3f}')
+    print(f'send syscalls/msg:     {stats["send_syscalls"] / stats["messages_sent"]:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: MIT
+'''
+Registers lots of objects in a server and reports the memory used per
+registered object, by the object itself and by the server registry.
+
+Needs dbus-objects installed, no bus is needed, eg.
+``python benchmarks/memory.py --counts 10000 100000 1000000``.
+'''
+import argparse
+import gc
+import time
+import tracemalloc
+
+import dbus_objects.integration
+import dbus_objects.object
+
+
+class BenchmarkObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='io.github.ffy00.dbus_objects.bench')
+
+    @dbus_objects.object.dbus_method()
+    def ping(self) -> str:
+        return 'Pong!'
+
+    @dbus_objects.object.dbus_property()
+    def status(self) -> str:
+        return 'ok'
+
+
+def measure(count):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [BenchmarkObject() for _ in range(count)]
+    created = tracemalloc.get_traced_memory()[0]
+
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.bench')
+    started = time.perf_counter()
+    for i, obj in enumerate(objects):
+        server.register_object(f'/io/github/ffy00/dbus_objects/bench/{i % 1000}/{i}', obj)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    registered = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (created - start) / count, (registered - created) / count, elapsed / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='number of objects to register')
+    args = parser.parse_args()
+
+    print(f'{"objects":>10}  {"object B":>10}  {"registry B":>10}  {"register us":>11}')
+    for count in args.counts:
+        obj_size, registry_size, register_time = measure(count)
+        print(f'{count:>10}  {obj_size:>10.0f}  {registry_size:>10.0f}  {register_time * 1e6:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
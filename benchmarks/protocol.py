@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: MIT
+'''
+Measures the sans-IO dispatch core (DBusProtocol) on its own, and over a
+socket pair served by a minimal ``selectors`` loop, to tell the cost of the
+dispatch apart from the cost of the transport.
+
+Needs dbus-objects installed, no bus is needed, eg.
+``python benchmarks/protocol.py --calls 100000``.
+'''
+import argparse
+import selectors
+import socket
+import threading
+import time
+
+import jeepney
+import jeepney.low_level
+
+import dbus_objects.integration.protocol
+import dbus_objects.object
+
+
+NAME = 'io.github.ffy00.dbus-objects.bench'
+PATH = '/io/github/ffy00/dbus_objects/bench'
+
+
+class BenchmarkObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='io.github.ffy00.dbus_objects.bench')
+
+    @dbus_objects.object.dbus_method()
+    def ping(self) -> str:
+        return 'Pong!'
+
+
+def make_protocol():
+    protocol = dbus_objects.integration.protocol.DBusProtocol('SESSION', NAME)
+    protocol.register_object(PATH, BenchmarkObject())
+    return protocol
+
+
+def make_calls(count):
+    address = jeepney.DBusAddress(PATH, bus_name=NAME, interface='io.github.ffy00.dbus_objects.bench.BenchmarkObject')
+    return [jeepney.new_method_call(address, 'Ping').serialise(serial=serial) for serial in range(1, count + 1)]
+
+
+def count_messages(parser, data):
+    parser.add_data(data)
+    count = 0
+    while parser.get_next_message() is not None:
+        count += 1
+    return count
+
+
+def measure_core(calls, batch):
+    protocol = make_protocol()
+    parser = jeepney.low_level.Parser()
+    replies = 0
+    elapsed = 0.0
+    for i in range(0, len(calls), batch):
+        data = b''.join(calls[i:i + batch])
+        start = time.perf_counter()
+        protocol.receive_data(data)
+        data = protocol.data_to_send()
+        elapsed += time.perf_counter() - start
+        replies += count_messages(parser, data)
+    assert replies == len(calls)
+    return elapsed
+
+
+def serve(protocol, sock):
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    while True:
+        selector.select()
+        data = sock.recv(64 * 1024)
+        if not data:
+            return
+        protocol.receive_data(data)
+        sock.sendall(protocol.data_to_send())
+
+
+def measure_socketpair(calls, batch):
+    server, client = socket.socketpair()
+    thread = threading.Thread(target=serve, args=(make_protocol(), server), daemon=True)
+    thread.start()
+    parser = jeepney.low_level.Parser()
+    start = time.perf_counter()
+    for i in range(0, len(calls), batch):
+        chunk = calls[i:i + batch]
+        client.sendall(b''.join(chunk))
+        replies = 0
+        while replies < len(chunk):
+            replies += count_messages(parser, client.recv(64 * 1024))
+    elapsed = time.perf_counter() - start
+    client.close()
+    thread.join()
+    server.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=50_000, help='number of calls')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 16, 256], help='calls sent together')
+    args = parser.parse_args()
+
+    calls = make_calls(args.calls)
+    print(f'{"batch":>6}  {"core us/call":>12}  {"socketpair us/call":>18}')
+    for batch in args.batches:
+        core = measure_core(calls, batch)
+        pair = measure_socketpair(calls, batch)
+        print(f'{batch:>6}  {core / len(calls) * 1e6:>12.2f}  {pair / len(calls) * 1e6:>18.2f}')
+
+
+if __name__ == '__main__':
+    main()
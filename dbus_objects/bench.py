@@ -0,0 +1,413 @@
+# SPDX-License-Identifier: MIT
+'''
+Load generator for DBus servers
+
+Runs a number of clients (threads or processes, each with its own
+connection) that call a method for a while, either keeping a number of calls
+in flight or sending at a target rate, and reports the throughput, the
+latency percentiles, the errors and the CPU time used by the server.
+
+The server can be an external one, or the built-in benchmark server
+(:class:`BenchObject` on a :class:`dbus_objects.integration.jeepney.BlockingDBusServer`),
+and the bus a private ``dbus-daemon``::
+
+    python -m dbus_objects.bench run --private --serve --clients 4 --concurrency 8 --duration 10
+    python -m dbus_objects.bench run --bus SESSION --name org.example.Service --path /org/example \\
+        --interface org.example.Service --method Ping --rate 5000 --server-pid 1234
+
+With ``--peer``, the clients connect directly to the server (see
+:meth:`dbus_objects.integration.jeepney.BlockingDBusServer.listen_peer`)
+instead of going through the bus.
+
+In rate mode, latencies are measured from the time each call was due, so a
+server that falls behind shows it in the percentiles.
+'''
+import argparse
+import concurrent.futures
+import contextlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import typing
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import jeepney
+import jeepney.io.blocking
+
+import dbus_objects.integration.capture
+import dbus_objects.integration.jeepney
+import dbus_objects.integration.peer
+import dbus_objects.object
+
+
+BENCH_NAME = 'io.github.ffy00.dbus-objects.bench'
+BENCH_PATH = '/io/github/ffy00/dbus_objects/bench'
+BENCH_INTERFACE = 'io.github.ffy00.dbus_objects.bench.BenchObject'
+
+
+class BenchObject(dbus_objects.object.DBusObject):
+    '''
+    Object exported by the built-in benchmark server
+    '''
+    def __init__(self) -> None:
+        super().__init__(default_interface_root='io.github.ffy00.dbus_objects.bench')
+
+    @dbus_objects.object.dbus_method()
+    def ping(self) -> str:
+        return 'Pong!'
+
+    @dbus_objects.object.dbus_method()
+    def echo(self, value: str) -> str:
+        return value
+
+
+def serve(
+    bus: str,
+    name: str = BENCH_NAME,
+    event: Optional[threading.Event] = None,
+    lanes: int = 0,
+    peer: bool = False,
+) -> None:
+    '''
+    Runs the built-in benchmark server
+
+    :param bus: bus address
+    :param name: DBus name
+    :param event: event which can be cleared to stop the server
+    :param lanes: number of worker lanes, see
+                  :meth:`dbus_objects.integration.jeepney.BlockingDBusServer.set_worker_lanes`
+    :param peer: also accept direct connections, see
+                 :meth:`dbus_objects.integration.jeepney.BlockingDBusServer.listen_peer`
+    '''
+    server = dbus_objects.integration.jeepney.BlockingDBusServer(bus=bus, name=name)
+    server.register_object(BENCH_PATH, BenchObject())
+    server.set_worker_lanes(lanes)
+    if peer:
+        server.listen_peer()
+    try:
+        server.listen(event=event)
+    finally:
+        server.close()
+
+
+class LoadReport(NamedTuple):
+    '''
+    Results of a load run, latencies are in seconds
+    '''
+    calls: int
+    errors: int
+    unanswered: int
+    duration: float
+    throughput: float
+    p50: float
+    p90: float
+    p99: float
+    p999: float
+    server_cpu: Optional[float]  # CPU seconds used by the server during the run
+
+
+class _Target(NamedTuple):
+    bus: str
+    name: str
+    path: str
+    interface: Optional[str]
+    method: str
+    signature: Optional[str]
+    args: Tuple[Any, ...]
+    peer_address: Optional[str]  # connect directly instead of over the bus
+
+
+# latencies, errors, unanswered
+_ClientResult = Tuple[List[float], int, int]
+
+
+class _Client():
+    '''
+    Client with its own connection, that calls the method until the duration
+    is over
+    '''
+    def __init__(self, target: _Target) -> None:
+        self._connection: jeepney.io.blocking.DBusConnection
+        if target.peer_address is not None:
+            self._connection = dbus_objects.integration.peer.open_peer_connection(target.peer_address)
+        else:
+            self._connection = jeepney.io.blocking.open_dbus_connection(target.bus)
+        self._msg = jeepney.new_method_call(
+            jeepney.DBusAddress(target.path, bus_name=target.name, interface=target.interface),
+            target.method, target.signature, target.args,
+        )
+        self._serials = itertools.count(1)
+        self._in_flight: Dict[int, float] = {}  # serial -> time the call was due
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def _send(self, due: float) -> None:
+        serial = next(self._serials)
+        self._in_flight[serial] = due
+        self._connection.send(self._msg, serial=serial)
+
+    def _receive(self, timeout: float) -> None:
+        '''
+        Handles the reply that arrives within the timeout, if any
+        '''
+        try:
+            reply = self._connection.receive(timeout=max(0.0, timeout))
+        except TimeoutError:
+            return
+        sent = self._in_flight.pop(reply.header.fields.get(jeepney.HeaderFields.reply_serial, 0), None)
+        if sent is None:
+            return  # signals from the bus
+        self.latencies.append(time.monotonic() - sent)
+        if reply.header.message_type == jeepney.MessageType.error:
+            self.errors += 1
+
+    def run(self, concurrency: int, rate: Optional[float], duration: float) -> int:
+        '''
+        Keeps ``concurrency`` calls in flight, or sends ``rate`` calls per
+        second if given
+
+        :returns: number of calls left without reply
+        '''
+        now = due = time.monotonic()
+        end = now + duration
+        interval = 1 / rate if rate else 0.0
+        while now < end:
+            if rate and now >= due:
+                self._send(due)
+                due += interval
+            elif not rate and len(self._in_flight) < concurrency:
+                self._send(now)
+            else:
+                self._receive((min(due, end) if rate else end) - now)
+            now = time.monotonic()
+
+        # wait a bit for the calls still in flight
+        drain = time.monotonic() + 1.0
+        while self._in_flight and time.monotonic() < drain:
+            self._receive(drain - time.monotonic())
+        return len(self._in_flight)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def _client(target: _Target, concurrency: int, rate: Optional[float], duration: float) -> _ClientResult:
+    '''
+    Runs a client, in a thread or process of the pool
+
+    :returns: latencies of the replied calls, number of error replies and of
+              calls left without reply
+    '''
+    with contextlib.closing(_Client(target)) as client:
+        unanswered = client.run(concurrency, rate, duration)
+    return client.latencies, client.errors, unanswered
+
+
+def _process_cpu(pid: int) -> Optional[float]:
+    '''
+    CPU time (user and system) used by a process, ``None`` if unavailable
+    (it is read from ``/proc``)
+
+    :param pid: process ID
+    '''
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # the command name may have spaces, the fields we want come after it
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def run_load(
+    bus: str,
+    name: str = BENCH_NAME,
+    path: str = BENCH_PATH,
+    interface: Optional[str] = BENCH_INTERFACE,
+    method: str = 'Ping',
+    signature: Optional[str] = None,
+    args: Sequence[Any] = (),
+    clients: int = 1,
+    concurrency: int = 1,
+    rate: Optional[float] = None,
+    duration: float = 5.0,
+    processes: bool = False,
+    server_pid: Optional[int] = None,
+    peer: bool = False,
+) -> LoadReport:
+    '''
+    Calls a method from several clients for a while and reports the results
+
+    :param bus: bus address
+    :param name: bus name of the server
+    :param path: object path
+    :param interface: interface of the method
+    :param method: method name
+    :param signature: signature of the arguments
+    :param args: arguments of the calls
+    :param clients: number of clients, each with its own connection
+    :param concurrency: calls each client keeps in flight
+    :param rate: total calls per second, spread over the clients, instead of
+                 a fixed concurrency
+    :param duration: how long to run, in seconds
+    :param processes: run the clients in processes instead of threads
+    :param server_pid: process ID of the server, to report its CPU time
+    :param peer: connect directly to the server, with the address it
+                 publishes on the bus (see
+                 :meth:`dbus_objects.integration.jeepney.BlockingDBusServer.listen_peer`)
+    '''
+    if clients < 1 or concurrency < 1:
+        raise ValueError(f'Invalid load, clients and concurrency must be at least 1: {clients}, {concurrency}')
+    if rate is not None and rate <= 0:
+        raise ValueError(f'Invalid rate, must be positive: {rate}')
+    peer_address = _peer_address(bus, name) if peer else None
+    target = _Target(bus, name, path, interface, method, signature, tuple(args), peer_address)
+    client_rate = rate / clients if rate else None
+    executor: concurrent.futures.Executor
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(clients)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(clients)
+    cpu_before = _process_cpu(server_pid) if server_pid is not None else None
+    with executor:
+        start = time.monotonic()
+        futures = [executor.submit(_client, target, concurrency, client_rate, duration) for _ in range(clients)]
+        results = [future.result() for future in futures]
+        elapsed = time.monotonic() - start
+    cpu_after = _process_cpu(server_pid) if server_pid is not None else None
+
+    latencies = sorted(latency for client_latencies, _errors, _unanswered in results for latency in client_latencies)
+    percentile = dbus_objects.integration.capture._percentile
+    return LoadReport(
+        calls=len(latencies),
+        errors=sum(errors for _latencies, errors, _unanswered in results),
+        unanswered=sum(unanswered for _latencies, _errors, unanswered in results),
+        duration=elapsed,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50=percentile(latencies, 50),
+        p90=percentile(latencies, 90),
+        p99=percentile(latencies, 99),
+        p999=percentile(latencies, 99.9),
+        server_cpu=cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+    )
+
+
+def _wait_for_name(bus: str, name: str, timeout: float = 10.0) -> None:
+    '''
+    Waits until the name has an owner on the bus
+    '''
+    deadline = time.monotonic() + timeout
+    with contextlib.closing(jeepney.io.blocking.open_dbus_connection(bus)) as connection:
+        while time.monotonic() < deadline:
+            reply = connection.send_and_get_reply(jeepney.DBus().NameHasOwner(name))
+            if reply.body[0]:
+                return
+            time.sleep(0.05)
+    raise TimeoutError(f'{name} did not show up on the bus')
+
+
+def _peer_address(bus: str, name: str) -> str:
+    '''
+    Asks the server for the address it accepts direct connections on
+    '''
+    with contextlib.closing(jeepney.io.blocking.open_dbus_connection(bus)) as connection:
+        reply = connection.send_and_get_reply(jeepney.new_method_call(
+            jeepney.DBusAddress('/', bus_name=name, interface='io.github.ffy00.dbus_objects.PeerToPeer'),
+            'GetAddress',
+        ), timeout=5)
+    if reply.header.message_type == jeepney.MessageType.error:
+        raise RuntimeError(f'{name} does not accept direct connections: {reply.body}')
+    return typing.cast(str, reply.body[0])
+
+
+@contextlib.contextmanager
+def _bench_server(bus: str, name: str, lanes: int = 0, peer: bool = False) -> Iterator[int]:
+    '''
+    Runs the built-in benchmark server in a process
+
+    :returns: process ID of the server
+    '''
+    process = subprocess.Popen([
+        sys.executable, '-m', 'dbus_objects.bench', 'serve', '--bus', bus, '--name', name, '--lanes', str(lanes),
+        *(['--peer'] if peer else []),
+    ])
+    try:
+        _wait_for_name(bus, name)
+        yield process.pid
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _print_report(report: LoadReport) -> None:
+    print(f'calls       {report.calls} in {report.duration:.2f}s ({report.throughput:.0f}/s)')
+    print(f'errors      {report.errors}')
+    print(f'unanswered  {report.unanswered}')
+    print('latency     ' + '  '.join(
+        f'{label} {value * 1e3:.3f}ms'
+        for label, value in (('p50', report.p50), ('p90', report.p90), ('p99', report.p99), ('p999', report.p999))
+    ))
+    if report.server_cpu is not None:
+        print(f'server cpu  {report.server_cpu:.2f}s ({report.server_cpu / report.duration * 100:.0f}% of a core)')
+
+
+def _run(options: argparse.Namespace) -> None:
+    with contextlib.ExitStack() as stack:
+        bus = options.bus
+        if options.private:
+            bus = stack.enter_context(dbus_objects.integration.capture.private_bus())
+        server_pid = options.server_pid
+        if options.serve:
+            server_pid = stack.enter_context(_bench_server(bus, options.name, options.lanes, options.peer))
+        report = run_load(
+            bus, options.name, options.path, options.interface, options.method,
+            options.signature, json.loads(options.args), options.clients, options.concurrency,
+            options.rate, options.duration, options.processes, server_pid, options.peer,
+        )
+    _print_report(report)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Load generator for DBus servers')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='call a method from several clients and report the latencies')
+    run.add_argument('--bus', default='SESSION', help='bus address (default: %(default)s)')
+    run.add_argument('--private', action='store_true', help='run a private dbus-daemon')
+    run.add_argument('--serve', action='store_true', help='run the built-in benchmark server')
+    run.add_argument('--name', default=BENCH_NAME, help='bus name of the server (default: %(default)s)')
+    run.add_argument('--path', default=BENCH_PATH, help='object path (default: %(default)s)')
+    run.add_argument('--interface', default=BENCH_INTERFACE, help='interface (default: %(default)s)')
+    run.add_argument('--method', default='Ping', help='method (default: %(default)s)')
+    run.add_argument('--signature', help='signature of the arguments')
+    run.add_argument('--args', default='[]', help='arguments, as a JSON array (default: %(default)s)')
+    run.add_argument('--clients', type=int, default=1, help='number of clients (default: %(default)s)')
+    run.add_argument('--processes', action='store_true', help='run the clients in processes instead of threads')
+    load = run.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=int, default=1, help='calls in flight per client (default: %(default)s)')
+    load.add_argument('--rate', type=float, help='total calls per second')
+    run.add_argument('--duration', type=float, default=5.0, help='seconds (default: %(default)s)')
+    run.add_argument('--server-pid', type=int, help='process ID of the server, to report its CPU time')
+    run.add_argument('--lanes', type=int, default=0, help='worker lanes of the built-in server (default: %(default)s)')
+    run.add_argument('--peer', action='store_true', help='connect directly to the server instead of over the bus')
+
+    serve_parser = commands.add_parser('serve', help='run the built-in benchmark server')
+    serve_parser.add_argument('--bus', default='SESSION', help='bus address (default: %(default)s)')
+    serve_parser.add_argument('--name', default=BENCH_NAME, help='bus name (default: %(default)s)')
+    serve_parser.add_argument('--lanes', type=int, default=0, help='worker lanes (default: %(default)s)')
+    serve_parser.add_argument('--peer', action='store_true', help='also accept direct connections')
+
+    options = parser.parse_args(args)
+    if options.command == 'serve':
+        serve(options.bus, options.name, lanes=options.lanes, peer=options.peer)
+    else:
+        _run(options)
+
+
+if __name__ == '__main__':
+    main()
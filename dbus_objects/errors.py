@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: MIT
+
+import re
+
+from typing import Dict, Optional, Type
+
+
+_ERROR_NAME_REGEX = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)+$')
+
+
+def valid_error_name(name: str) -> bool:
+    '''
+    Whether the name is a valid DBus error name (same rules as interface names)
+
+    :param name: error name
+    '''
+    return len(name) <= 255 and bool(_ERROR_NAME_REGEX.match(name))
+
+
+class DBusError(Exception):
+    '''
+    Error sent back to the caller as a DBus error reply
+
+    Handlers can raise it, or one of its subclasses, to reply with a specific
+    error name. Other exceptions are mapped with :func:`error_name`.
+    '''
+    name = 'org.freedesktop.DBus.Error.Failed'
+
+    def __init__(self, message: str = '', name: Optional[str] = None) -> None:
+        '''
+        :param message: error message sent to the caller
+        :param name: DBus error name, defaults to the one of the class
+        '''
+        super().__init__(message)
+        if name is not None:
+            if not valid_error_name(name):
+                raise ValueError(f'Invalid DBus error name: {name}')
+            self.name = name
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class Failed(DBusError):
+    name = 'org.freedesktop.DBus.Error.Failed'
+
+
+class NotSupported(DBusError):
+    name = 'org.freedesktop.DBus.Error.NotSupported'
+
+
+class ServiceUnknown(DBusError):
+    name = 'org.freedesktop.DBus.Error.ServiceUnknown'
+
+
+class InvalidArgs(DBusError):
+    name = 'org.freedesktop.DBus.Error.InvalidArgs'
+
+
+class AccessDenied(DBusError):
+    name = 'org.freedesktop.DBus.Error.AccessDenied'
+
+
+class LimitsExceeded(DBusError):
+    name = 'org.freedesktop.DBus.Error.LimitsExceeded'
+
+
+class Timeout(DBusError):
+    name = 'org.freedesktop.DBus.Error.Timeout'
+
+
+class PropertyReadOnly(DBusError):
+    name = 'org.freedesktop.DBus.Error.PropertyReadOnly'
+
+
+# the lookup errors are also KeyErrors, that is what the server used to raise
+
+
+class UnknownObject(DBusError, KeyError):
+    name = 'org.freedesktop.DBus.Error.UnknownObject'
+
+
+class UnknownInterface(DBusError, KeyError):
+    name = 'org.freedesktop.DBus.Error.UnknownInterface'
+
+
+class UnknownMethod(DBusError, KeyError):
+    name = 'org.freedesktop.DBus.Error.UnknownMethod'
+
+
+class UnknownProperty(DBusError, KeyError):
+    name = 'org.freedesktop.DBus.Error.UnknownProperty'
+
+
+_ERROR_NAMES: Dict[Type[BaseException], str] = {
+    NotImplementedError: NotSupported.name,
+    PermissionError: AccessDenied.name,
+    TimeoutError: Timeout.name,
+    MemoryError: 'org.freedesktop.DBus.Error.NoMemory',
+}
+_PYTHON_ERROR_ROOT = 'org.freedesktop.DBus.Python'
+
+
+def register_error(exception: Type[BaseException], name: str) -> None:
+    '''
+    Sets the DBus error name replied when a handler raises the exception (or
+    a subclass of it)
+
+    :param exception: exception type
+    :param name: DBus error name
+    '''
+    if not valid_error_name(name):
+        raise ValueError(f'Invalid DBus error name: {name}')
+    _ERROR_NAMES[exception] = name
+
+
+def error_name(error: BaseException) -> str:
+    '''
+    DBus error name of an exception
+
+    :class:`DBusError` carries its own name, other exceptions use the name
+    given to :func:`register_error` for the closest class, or
+    ``org.freedesktop.DBus.Python.<exception class>`` (like dbus-python).
+
+    :param error: exception raised by the handler
+    '''
+    if isinstance(error, DBusError):
+        return error.name
+    for cls in type(error).__mro__:
+        if cls in _ERROR_NAMES:
+            return _ERROR_NAMES[cls]
+    cls = type(error)
+    qualname = cls.__qualname__ if cls.__module__ == 'builtins' else f'{cls.__module__}.{cls.__qualname__}'
+    elements = [re.sub(r'[^A-Za-z0-9_]', '_', element) for element in qualname.split('.')]
+    name = '.'.join([_PYTHON_ERROR_ROOT] + [
+        f'_{element}' if element[:1].isdigit() else element
+        for element in elements if element
+    ])
+    return name if valid_error_name(name) else Failed.name
+
+
+def error_message(error: BaseException) -> str:
+    '''
+    Message of the DBus error reply for an exception
+
+    :param error: exception raised by the handler
+    '''
+    return str(error) or type(error).__name__
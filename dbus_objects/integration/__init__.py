@@ -1,17 +1,24 @@
 # SPDX-License-Identifier: MIT
 
+import contextlib
+import contextvars
+import itertools
 import logging
-import os.path
+import sys
 import textwrap
+import threading
+import time
 import typing
 import warnings
 import xml.etree.ElementTree as ET
 
-from typing import Any, Dict, Optional
-
-import treelib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import dbus_objects.errors
+import dbus_objects.integration.dispatch
 import dbus_objects.object
+import dbus_objects.policy
+import dbus_objects.signature
 import dbus_objects.types
 
 
@@ -28,55 +35,48 @@ class _Introspectable(dbus_objects.object.DBusObject):
     "http://www.freedesktop.org/standards/dbus/1.0/introspect.dtd" >
     ''')
 
-    def __init__(
-        self,
-        path: str,
-        method_tree: Optional[treelib.Tree] = None,
-        property_tree: Optional[treelib.Tree] = None,
-    ):
+    def __init__(self, path: str, server: Optional['DBusServerBase'] = None) -> None:
         '''
         :param path: path where the onject is being resgistered
-        :param method_tree: DBus server method tree
+        :param server: DBus server
         '''
         super().__init__(
             name='Introspectable',
             default_interface_root='org.freedesktop.DBus',
         )
         self._path = path
-        self._method_tree = method_tree
-        self._property_tree = property_tree
+        self._server = server
 
-    @dbus_objects.object.dbus_method(return_names=('xml',))
+    @dbus_objects.object.dbus_method(return_names=('xml',), priority=dbus_objects.object.Priority.HIGH)
     def introspect(self) -> str:  # noqa: C901
         xml = ET.Element('node', {'xmlns:doc': 'http://www.freedesktop.org/dbus/1.0/doc.dtd'})
-        interfaces: Dict[str, ET.Element] = {}
-
-        def get_interface(name: str) -> ET.Element:
-            if name not in interfaces:
-                interfaces[name] = ET.SubElement(xml, 'interface', {'name': name})
-            return interfaces[name]
-
-        # add interfaces
-        if self._method_tree and self._path in self._method_tree:
-            for node in self._method_tree.children(self._path):
-                interface = get_interface(node.tag)
-                for method_node in self._method_tree.children(node.identifier):
-                    method, descriptor = method_node.data
-                    interface.append(descriptor.xml)
-        if self._property_tree and self._path in self._property_tree:
-            for node in self._property_tree.children(self._path):
-                interface = get_interface(node.tag)
-                for property_node in self._property_tree.children(node.identifier):
-                    getter, setter, descriptor = property_node.data
-                    interface.append(descriptor.xml)
-
-        # add nodes (subpaths)
-        if self._method_tree:
-            for node in self._method_tree.children('paths'):
-                if node.identifier == self._path or self._path.startswith(node.identifier):
-                    continue
-                if os.path.dirname(node.identifier) == self._path:
-                    ET.SubElement(xml, 'node', {'name': os.path.basename(node.identifier)})
+        node = self._server._tree.get_node(self._path) if self._server else None
+        if node is not None and self._server is not None:
+            interfaces: Dict[str, ET.Element] = {}
+            seen: Set[Tuple[str, str, str]] = set()  # the first object with a member wins, like in the lookups
+
+            def add(
+                kind: str,
+                interface: str,
+                descriptor: typing.Union[dbus_objects.object._DBusMethod, dbus_objects.object._DBusProperty],
+            ) -> None:
+                if interface not in interfaces:
+                    interfaces[interface] = ET.SubElement(xml, 'interface', {'name': interface})
+                if (kind, interface, descriptor.name) not in seen:
+                    seen.add((kind, interface, descriptor.name))
+                    interfaces[interface].append(descriptor.xml)
+
+            for obj in self._server._node_objects(node, self._path):
+                table = obj._dbus_member_table()
+                for interface, methods in table.methods.items():
+                    for method in methods.values():
+                        add('method', interface, method)
+                for interface, properties in table.properties.items():
+                    for _attribute, prop in properties.values():
+                        add('property', interface, prop)
+            # add nodes (subpaths)
+            for name in node.children or ():
+                ET.SubElement(xml, 'node', {'name': name})
 
         return self._XML_DOCTYPE + ET.tostring(xml).decode()
 
@@ -91,7 +91,7 @@ class _Peer(dbus_objects.object.DBusObject):
             default_interface_root='org.freedesktop.DBus',
         )
 
-    @dbus_objects.object.dbus_method()
+    @dbus_objects.object.dbus_method(priority=dbus_objects.object.Priority.HIGH)
     def ping(self) -> None:
         return
 
@@ -109,20 +109,20 @@ class _Properties(dbus_objects.object.DBusObject):
         )
         self._obj = obj
 
-    @dbus_objects.object.dbus_method()
+    @dbus_objects.object.dbus_method(priority=dbus_objects.object.Priority.HIGH)
     def get(self, interface_name: str, property_name: str) -> dbus_objects.types.Variant:
         # TODO: interface == ''
-        return '', None
+        return dbus_objects.signature.variant(None, '')
 
-    @dbus_objects.object.dbus_method(name='set')
+    @dbus_objects.object.dbus_method(name='set', priority=dbus_objects.object.Priority.HIGH)
     def set_(self, interface_name: str, property_name: str, value: dbus_objects.types.Variant) -> None:
         # TODO: interface == ''
         pass
 
-    @dbus_objects.object.dbus_method()
+    @dbus_objects.object.dbus_method(priority=dbus_objects.object.Priority.HIGH)
     def get_all(self, interface_name: str) -> Dict[str, dbus_objects.types.Variant]:
         return {
-            descriptor.name: (descriptor.signature, getter())
+            descriptor.name: dbus_objects.signature.variant(descriptor.convert_return(getter()), descriptor.signature)
             for getter, setter, descriptor in self._obj.get_dbus_properties()
         }
 
@@ -132,58 +132,471 @@ class _Properties(dbus_objects.object.DBusObject):
 # TODO: org.freedesktop.DBus.ObjectManager
 
 
-class _DBusTree(treelib.Tree):  # type: ignore
+class _PathNode():
+    '''
+    Node of the object path trie, holds the objects registered in the path
+
+    The members of the objects are not copied, they are looked up in the
+    member table of their class (see
+    :meth:`dbus_objects.object.DBusObject._dbus_member_table`), and the
+    standard interfaces are provided by the server on demand.
+
+    Nodes are not modified once they are part of a published trie, see
+    :class:`_PathTrieUpdate`.
+    '''
+    __slots__ = ('name', 'children', 'objects', 'references')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.children: Optional[Dict[str, _PathNode]] = None  # created with the first child
+        self.objects: Tuple[dbus_objects.object.DBusObject, ...] = ()
+        self.references = 0  # objects registered in the node and below it
+
+    def copy(self) -> '_PathNode':
+        node = _PathNode(self.name)
+        node.children = dict(self.children) if self.children else None
+        node.objects = self.objects
+        node.references = self.references
+        return node
+
+
+class _PathTrie():
+    '''
+    Snapshot of the object paths of the server, split in their elements
+
+    Lookups cost as much as the depth of the path, and the children of a path
+    are stored in its node. Snapshots are never modified: changes are made on
+    a copy of the nodes they touch (see :class:`_PathTrieUpdate`) which the
+    server then publishes by swapping its reference, so lookups need no locks.
+    '''
+    __slots__ = ('root',)
+
+    def __init__(self, root: Optional[_PathNode] = None) -> None:
+        self.root = root if root is not None else _PathNode('')
+
+    def get_node(self, path: str) -> Optional[_PathNode]:
+        '''
+        Fetches the node of a path
+
+        :param path: object path
+        '''
+        node = self.root
+        for name in path.split('/'):
+            if not name:
+                continue
+            child = node.children.get(name) if node.children else None
+            if child is None:
+                return None
+            node = child
+        return node
+
+    def walk(self, node: Optional[_PathNode] = None, path: str = '/') -> Iterator[Tuple[str, _PathNode]]:
+        '''
+        Iterates over a node and all the nodes below it, parents first
+
+        :param node: node to start from, defaults to the root
+        :param path: path of the node
+        :returns: (path, node) pairs
+        '''
+        stack = [(path, node or self.root)]
+        while stack:
+            path, node = stack.pop()
+            yield path, node
+            if node.children:
+                prefix = path.rstrip('/')
+                stack.extend(reversed([(f'{prefix}/{name}', child) for name, child in node.children.items()]))
+
+
+class _PathTrieUpdate():
+    '''
+    Set of changes to a :class:`_PathTrie`, made on copies of the nodes
+    they touch
+
+    Each node is copied at most once per update, so batches of changes only
+    pay for the paths they touch, and the resulting :attr:`root` shares all
+    the other nodes with the original snapshot.
+    '''
+    def __init__(self, trie: _PathTrie) -> None:
+        self.root = trie.root.copy()
+        # nodes created by this update, which can be modified in place
+        self._copies: Dict[int, _PathNode] = {id(self.root): self.root}
+        self.emptied: List[str] = []  # paths left without objects
+
+    def _copy_path(self, path: str, create: bool = False) -> Optional[List[_PathNode]]:
+        '''
+        Copies the nodes from the root to a path, optionally creating the
+        missing ones
+
+        :param path: object path
+        :param create: whether to create the missing nodes
+        :returns: the nodes from the root to the path
+        '''
+        node = self.root
+        nodes = [node]
+        for name in path.split('/'):
+            if not name:
+                continue
+            child = node.children.get(name) if node.children else None
+            if child is None or id(child) not in self._copies:
+                if child is not None:
+                    child = child.copy()
+                elif create:
+                    child = _PathNode(sys.intern(name))
+                else:
+                    return None
+                self._copies[id(child)] = child
+                if node.children is None:
+                    node.children = {}
+                node.children[child.name] = child
+            node = child
+            nodes.append(node)
+        return nodes
+
+    def _prune(self, nodes: List[_PathNode]) -> None:
+        '''
+        Removes the last node of the path, and its parents, if nothing is
+        registered in them anymore
+
+        :param nodes: nodes from the root to the path, already copied
+        '''
+        for parent, node in zip(reversed(nodes[:-1]), reversed(nodes)):
+            if node.references or node.children:
+                break
+            assert parent.children is not None
+            del parent.children[node.name]
+            if not parent.children:
+                parent.children = None
+
+    def add(self, path: str, obj: dbus_objects.object.DBusObject) -> Tuple[dbus_objects.object.DBusObject, ...]:
+        '''
+        Adds an object to a path
+
+        :param path: object path
+        :param obj: object
+        :returns: the objects that were already registered in the path
+        '''
+        nodes = self._copy_path(path, create=True)
+        assert nodes is not None
+        node = nodes[-1]
+        previous = node.objects
+        node.objects = previous + (obj,)
+        for parent in nodes:
+            parent.references += 1
+        return previous
+
+    def remove(self, path: str, obj: Optional[dbus_objects.object.DBusObject] = None) -> int:
+        '''
+        Removes the objects registered in a path
+
+        :param path: object path
+        :param obj: object to remove, defaults to all of them
+        :returns: number of objects removed
+        '''
+        node = _PathTrie(self.root).get_node(path)
+        if node is None or not any(obj is None or registered is obj for registered in node.objects):
+            return 0
+        nodes = self._copy_path(path)
+        assert nodes is not None
+        node = nodes[-1]
+        remaining = tuple(registered for registered in node.objects if obj is not None and registered is not obj)
+        removed = len(node.objects) - len(remaining)
+        node.objects = remaining
+        for parent in nodes:
+            parent.references -= removed
+        if not remaining:
+            self.emptied.append(path)
+        self._prune(nodes)
+        return removed
+
+    def remove_subtree(self, path: str) -> int:
+        '''
+        Removes all the objects registered in a path and below it
+
+        :param path: object path
+        :returns: number of objects removed
+        '''
+        trie = _PathTrie(self.root)
+        node = trie.get_node(path)
+        if node is None or not node.references:
+            return 0
+        self.emptied.extend(subpath for subpath, subnode in trie.walk(node, path) if subnode.objects)
+        nodes = self._copy_path(path)
+        assert nodes is not None
+        removed = nodes[-1].references
+        for parent in nodes:
+            parent.references -= removed
+        nodes[-1].objects = ()
+        nodes[-1].children = None
+        self._prune(nodes)
+        return removed
+
+
+_SignalKey = Tuple[str, Optional[str], Optional[str], Optional[str], Optional[str]]
+_SignalMask = Tuple[bool, bool, bool, bool]
+
+
+def _is_well_known(sender: Optional[str]) -> bool:
+    '''
+    Whether a signal sender is a well-known name, which never appears as the
+    sender of a signal except for the bus itself
+    '''
+    return sender is not None and not sender.startswith(':') and sender != 'org.freedesktop.DBus'
+
+
+class SignalSubscription():
+    '''
+    Handle of a signal subscription, see :meth:`DBusServerBase.subscribe_signal`
+    '''
+    def __init__(
+        self,
+        callback: Callable[..., Any],
+        bus: str,
+        sender: Optional[str],
+        path: Optional[str],
+        interface: Optional[str],
+        member: Optional[str],
+        arg0: Optional[str],
+    ) -> None:
+        self.callback = callback
+        self.bus = bus
+        self.sender = sender
+        self.path = path
+        self.interface = interface
+        self.member = member
+        self.arg0 = arg0
+
+    @property
+    def key(self) -> _SignalKey:
+        return (self.bus, self.sender, self.path, self.interface, self.member)
+
+    @property
+    def mask(self) -> _SignalMask:
+        return (
+            self.sender is not None,
+            self.path is not None,
+            self.interface is not None,
+            self.member is not None,
+        )
+
+    @property
+    def match_rule(self) -> str:
+        '''
+        Match rule to install in the bus (``AddMatch``)
+        '''
+        pairs = [('type', 'signal')]
+        for field in ('sender', 'path', 'interface', 'member', 'arg0'):
+            value = getattr(self, field)
+            if value is not None:
+                pairs.append((field, value))
+        return ','.join(
+            "{}='{}'".format(key, value.replace("'", r"'\''"))
+            for key, value in pairs
+        )
+
+
+class ClientResource():
+    '''
+    Handle of a per-client resource, see :meth:`DBusServerBase.add_client_resource`
+    '''
+    def __init__(self, bus: str, client: str, release: Callable[[], Any]) -> None:
+        self.bus = bus
+        self.client = client
+        self.release = release
+
+
+class _Client():
+    '''
+    Resources of a client and the subscription that tells us when it leaves
+    '''
+    def __init__(self, subscription: SignalSubscription) -> None:
+        self.subscription = subscription
+        self.resources: List[ClientResource] = []
+
+
+class _WatchedName():
+    '''
+    Well-known name used as a signal sender, and the unique name owning it
+    '''
+    def __init__(self, subscription: SignalSubscription) -> None:
+        self.subscription = subscription
+        self.owner: Optional[str] = None
+        self.count = 1
+
+
+class _Stream():
+    '''
+    Cursor over the items of a generator method
+    '''
+    def __init__(self, iterator: Iterator[Any], chunk_size: int, bus: str, client: Optional[str]) -> None:
+        self.iterator = iterator
+        self.chunk_size = chunk_size
+        self.bus = bus
+        self.client = client
+        self.resource: Optional[ClientResource] = None
+        self.last_used = time.monotonic()
+
+
+class CallContext():
+    '''
+    Information about the method call being executed, see :func:`current_call`
+    '''
+    def __init__(
+        self,
+        server: 'DBusServerBase',
+        bus: str,
+        sender: Optional[str],
+        credentials: Optional[dbus_objects.policy.Credentials] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        '''
+        :param server: server executing the call
+        :param bus: bus the call was received on
+        :param sender: unique name of the caller
+        :param credentials: caller credentials, when they are known
+        :param deadline: time (:func:`time.monotonic`) after which the caller
+                         is no longer waiting for the reply
+        '''
+        self.server = server
+        self.bus = bus
+        self.sender = sender
+        self.credentials = credentials
+        self.deadline = deadline
+
+    @property
+    def cancelled(self) -> bool:
+        '''
+        Whether the deadline has passed, long running handlers should check
+        it and give up
+        '''
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def add_resource(self, release: Callable[[], Any]) -> ClientResource:
+        '''
+        Registers a resource of the caller, released when it disconnects
+
+        :param release: function called when the caller disconnects
+        '''
+        if self.sender is None:
+            raise dbus_objects.object.DBusObjectException('The call has no sender, it can not be tracked')
+        return self.server.add_client_resource(self.sender, release, self.bus)
+
+
+class PendingReply():
+    '''
+    Reply of a method call that completes later
+
+    Handlers can return a pending reply instead of the value, and complete
+    (or fail) it later from any thread. The server sends the reply then,
+    without holding up the loop in the meantime.
+
+    If the call has a deadline and it passes first, the client gets a timeout
+    error, the reply is marked as cancelled and completing it does nothing.
+    '''
     def __init__(self) -> None:
-        super().__init__()
-        self._paths = self.create_node(identifier='paths')
+        self._lock = threading.Lock()
+        self._done = False
+        self._cancelled = False
+        self._value: Any = None
+        self._error: Optional[Exception] = None
+        self._callback: Optional[Callable[['PendingReply'], None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
 
-    def get_path_node(self, path: str) -> treelib.Node:
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def value(self) -> Any:
+        return self._value
+
+    @property
+    def error(self) -> Optional[Exception]:
+        return self._error
+
+    def complete(self, value: Any = None) -> None:
         '''
-        Fetches the path
+        Completes the call
 
-        :param path: path
+        :param value: value returned by the method
         '''
-        if self.contains(path):
-            return self.get_node(path)
-        else:
-            return self.create_node(identifier=path, parent=self._paths)
+        self._settle(value, None)
+
+    def fail(self, error: Exception) -> None:
+        '''
+        Fails the call, the client gets an error reply
+
+        :param error: exception describing the error
+        '''
+        if not isinstance(error, Exception):
+            raise TypeError(f'Expected an Exception, got {error!r}')
+        self._settle(None, error)
+
+    def _settle(self, value: Any, error: Optional[Exception]) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            if self._done:
+                raise dbus_objects.object.DBusObjectException('The reply has already been completed')
+            self._done = True
+            self._value = value
+            self._error = error
+            callback = self._callback
+        if callback is not None:
+            callback(self)
 
-    def get_interface_node(self, path: str, interface: str, create: bool = False) -> treelib.Node:
+    def _cancel(self) -> bool:
         '''
-        Fetches the interface for given path and interface name. Optionally
-        creates it if not found.
+        Cancels the reply if it has not completed yet
 
-        :param path: interface path
-        :param interface: interface name
-        :param create: whether to create the interface or not if missing
+        :returns: whether the reply was cancelled
         '''
-        path_node = self.get_path_node(path)
-        for node in self.children(path):
-            if node.tag == interface:
-                return node
-        return self.create_node(interface, parent=path_node,)
+        with self._lock:
+            if self._done:
+                return False
+            self._done = self._cancelled = True
+            return True
 
-    def get_element(self, path: str, interface: str, name: str) -> Any:
+    def _bind(self, callback: Callable[['PendingReply'], None]) -> None:
         '''
-        Fetches the element for given path, interface and element name
+        Sets the function called when the reply completes, right away if it
+        already has
 
-        :param path: element path
-        :param interface: element interface
-        :param interface: element name
+        :param callback: function called with the pending reply
         '''
-        if self.contains(path):
-            # search for interfaces (2nd level)
-            for interface_node in self.children(path):
-                if interface_node.tag == interface:
-                    # search for methods (3rd level)
-                    for method_node in self.children(interface_node.identifier):
-                        if method_node.tag == name:
-                            return method_node.data
-                    break  # right interface but didn't find the method
-        raise KeyError(f'Element not found: path={path} interface={interface} name={name}')
+        with self._lock:
+            if self._callback is not None:
+                raise dbus_objects.object.DBusObjectException('The reply has already been returned by a call')
+            self._callback = callback
+            done = self._done
+        if done:
+            callback(self)
+
+
+_current_call: 'contextvars.ContextVar[Optional[CallContext]]' = contextvars.ContextVar(
+    'dbus_objects_current_call', default=None
+)
+
+
+def current_call() -> CallContext:
+    '''
+    Context of the method call being executed, only available inside DBus
+    method and property handlers
+    '''
+    context = _current_call.get()
+    if context is None:
+        raise dbus_objects.object.DBusObjectException('Not inside a DBus method call')
+    return context
 
 
 class DBusServerBase():
+    # default limits of the streams of generator methods, see set_stream_limits
+    _STREAMS_PER_CLIENT = 16
+    _STREAMS = 1024
+    _STREAM_IDLE_TIMEOUT = 300.0
+
     def __init__(self, bus: str, name: str) -> None:
         '''
         DBus server base
@@ -192,14 +605,35 @@ class DBusServerBase():
         Subclasses can use get_method to fetch the method they want to
         dispatch.
 
+        The same objects can be published under more names, and on more
+        buses, with :meth:`add_name`.
+
         :param bus: DBus bus (hint: usually SESSION or SYSTEM)
         :param name: DBus name
         '''
         self.__logger = logging.getLogger(self.__class__.__name__)
         self._bus = bus
         self._name = name
-        self._method_tree = _DBusTree()
-        self._property_tree = _DBusTree()
+        self._names: Dict[str, List[str]] = {bus: [name]}  # bus -> names
+        # published snapshot of the registered objects, replaced as a whole on every change
+        self._tree = _PathTrie()
+        self._tree_lock = threading.Lock()
+        self._peer = _Peer()
+        self._signal_index: Dict[_SignalKey, List[SignalSubscription]] = {}
+        self._signal_masks: Dict[_SignalMask, int] = {}  # mask -> subscription count
+        self._match_rules: Dict[Tuple[str, str], int] = {}  # (bus, rule) -> subscription count
+        self._has_policies = False
+        self._clients: Dict[Tuple[str, str], _Client] = {}  # (bus, unique name) -> client
+        self._watched_names: Dict[Tuple[str, str], _WatchedName] = {}  # (bus, well-known name) -> owner
+        self._name_owners: Dict[Tuple[str, str], Set[str]] = {}  # (bus, unique name) -> watched names
+        self._streams: Dict[int, _Stream] = {}  # cursor -> stream, least recently used first
+        self._stream_counts: Dict[Tuple[str, Optional[str]], int] = {}  # (bus, client) -> open streams
+        self._stream_cursors = itertools.count(1)
+        self._streams_per_client = self._STREAMS_PER_CLIENT
+        self._max_streams = self._STREAMS
+        self._stream_idle_timeout = self._STREAM_IDLE_TIMEOUT
+        # path -> (interface, member) -> bucket, dropped with the objects of the path
+        self._method_buckets: Dict[str, Dict[Tuple[str, str], dbus_objects.integration.dispatch.TokenBucket]] = {}
 
     @property
     def name(self) -> str:
@@ -208,18 +642,580 @@ class DBusServerBase():
         '''
         return self._name
 
-    def get_method(self, path: str, interface: str, method: str) -> dbus_objects.object._DBusMethodTuple:
+    @property
+    def names(self) -> List[Tuple[str, str]]:
+        '''
+        All the (bus, name) pairs the server is published under
+        '''
+        return [
+            (bus, name)
+            for bus, names in self._names.items()
+            for name in names
+        ]
+
+    def add_name(self, name: str, bus: Optional[str] = None) -> None:
+        '''
+        Publishes the server under another name
+
+        :param name: DBus name
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        bus = bus or self._bus
+        names = self._names.setdefault(bus, [])
+        if name in names:
+            warnings.warn(f'Name already added! bus={bus} name={name}')
+            return
+        names.append(name)
+
+    def subscribe_signal(
+        self,
+        callback: Callable[..., Any],
+        sender: Optional[str] = None,
+        path: Optional[str] = None,
+        interface: Optional[str] = None,
+        member: Optional[str] = None,
+        arg0: Optional[str] = None,
+        bus: Optional[str] = None,
+    ) -> SignalSubscription:
+        '''
+        Subscribes to a signal
+
+        The callback is called with the signal arguments. Fields left as
+        ``None`` match anything. Signals carry the unique name of the emitter
+        as sender, so when subscribing to a well-known name the server looks
+        up its current owner (``GetNameOwner``) and follows the ownership
+        changes (``NameOwnerChanged``). Signals emitted before the owner is
+        known are not matched.
+
+        Subscriptions sharing the same match rule only install it once in the
+        bus.
+
+        :param callback: function called with the signal arguments
+        :param sender: signal sender
+        :param path: signal path
+        :param interface: signal interface
+        :param member: signal name
+        :param arg0: value of the first signal argument
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        subscription = SignalSubscription(
+            callback, bus or self._bus, sender, path, interface, member, arg0
+        )
+        self._signal_index.setdefault(subscription.key, []).append(subscription)
+        self._signal_masks[subscription.mask] = self._signal_masks.get(subscription.mask, 0) + 1
+        if _is_well_known(sender):
+            self._watch_name(subscription.bus, typing.cast(str, sender))
+
+        rule = (subscription.bus, subscription.match_rule)
+        self._match_rules[rule] = self._match_rules.get(rule, 0) + 1
+        if self._match_rules[rule] == 1:
+            self._add_match(*rule)
+        return subscription
+
+    def unsubscribe_signal(self, subscription: SignalSubscription) -> None:
+        '''
+        Removes a signal subscription
+
+        :param subscription: subscription returned by :meth:`subscribe_signal`
+        '''
+        subscriptions = self._signal_index.get(subscription.key, [])
+        if subscription not in subscriptions:
+            return
+        subscriptions.remove(subscription)
+        if not subscriptions:
+            del self._signal_index[subscription.key]
+        if _is_well_known(subscription.sender):
+            self._unwatch_name(subscription.bus, typing.cast(str, subscription.sender))
+
+        self._signal_masks[subscription.mask] -= 1
+        if not self._signal_masks[subscription.mask]:
+            del self._signal_masks[subscription.mask]
+
+        rule = (subscription.bus, subscription.match_rule)
+        self._match_rules[rule] -= 1
+        if not self._match_rules[rule]:
+            del self._match_rules[rule]
+            self._remove_match(*rule)
+
+    def _watch_name(self, bus: str, name: str) -> None:
+        '''
+        Starts following the owner of a well-known name used as signal sender
+
+        :param bus: DBus bus
+        :param name: well-known name
+        '''
+        watched = self._watched_names.get((bus, name))
+        if watched is not None:
+            watched.count += 1
+            return
+        subscription = self.subscribe_signal(
+            lambda name, old_owner, new_owner: self._name_owner_changed(bus, name, new_owner or None),
+            sender='org.freedesktop.DBus',
+            interface='org.freedesktop.DBus',
+            member='NameOwnerChanged',
+            arg0=name,
+            bus=bus,
+        )
+        self._watched_names[(bus, name)] = _WatchedName(subscription)
+        self._resolve_name(bus, name)
+
+    def _unwatch_name(self, bus: str, name: str) -> None:
+        '''
+        Stops following the owner of a well-known name, once no subscription
+        uses it
+
+        :param bus: DBus bus
+        :param name: well-known name
+        '''
+        watched = self._watched_names.get((bus, name))
+        if watched is None:
+            return
+        watched.count -= 1
+        if watched.count:
+            return
+        self._name_owner_changed(bus, name, None)
+        del self._watched_names[(bus, name)]
+        self.unsubscribe_signal(watched.subscription)
+
+    def _name_owner_changed(self, bus: str, name: str, owner: Optional[str]) -> None:
+        '''
+        Records the new owner of a watched well-known name
+
+        :param bus: DBus bus
+        :param name: well-known name
+        :param owner: unique name of the new owner, ``None`` if it has none
+        '''
+        watched = self._watched_names.get((bus, name))
+        if watched is None:
+            return
+        if watched.owner is not None:
+            names = self._name_owners[(bus, watched.owner)]
+            names.discard(name)
+            if not names:
+                del self._name_owners[(bus, watched.owner)]
+        watched.owner = owner
+        if owner is not None:
+            self._name_owners.setdefault((bus, owner), set()).add(name)
+
+    def _resolve_name(self, bus: str, name: str) -> None:
+        '''
+        Looks up the current owner of a well-known name and passes it to
+        :meth:`_name_owner_changed`, should be implemented by subclasses
+
+        :param bus: DBus bus
+        :param name: well-known name
+        '''
+
+    def _add_match(self, bus: str, rule: str) -> None:
+        '''
+        Installs a match rule in the bus, should be implemented by subclasses
+
+        :param bus: DBus bus
+        :param rule: match rule
+        '''
+
+    def _remove_match(self, bus: str, rule: str) -> None:
+        '''
+        Removes a match rule from the bus, should be implemented by subclasses
+
+        :param bus: DBus bus
+        :param rule: match rule
+        '''
+
+    def add_client_resource(
+        self,
+        client: str,
+        release: Callable[[], Any],
+        bus: Optional[str] = None,
+    ) -> ClientResource:
+        '''
+        Registers a resource that belongs to a client
+
+        ``release`` is called once the client disconnects from the bus. Only
+        the clients with resources are watched, with a ``NameOwnerChanged``
+        match rule for their unique name.
+
+        :param client: unique name of the client (see :attr:`CallContext.sender`)
+        :param release: function called when the client disconnects
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        bus = bus or self._bus
+        key = (bus, client)
+        tracked = self._clients.get(key)
+        if tracked is None:
+            subscription = self.subscribe_signal(
+                lambda name, old_owner, new_owner: None if new_owner else self._client_left(bus, name),
+                sender='org.freedesktop.DBus',
+                interface='org.freedesktop.DBus',
+                member='NameOwnerChanged',
+                arg0=client,
+                bus=bus,
+            )
+            tracked = self._clients[key] = _Client(subscription)
+            self._check_client(bus, client)
+        resource = ClientResource(bus, client, release)
+        tracked.resources.append(resource)
+        return resource
+
+    def remove_client_resource(self, resource: ClientResource) -> None:
+        '''
+        Unregisters a client resource without releasing it
+
+        :param resource: resource returned by :meth:`add_client_resource`
+        '''
+        key = (resource.bus, resource.client)
+        tracked = self._clients.get(key)
+        if tracked is None or resource not in tracked.resources:
+            return
+        tracked.resources.remove(resource)
+        if not tracked.resources:
+            del self._clients[key]
+            self.unsubscribe_signal(tracked.subscription)
+
+    @property
+    def clients(self) -> List[Tuple[str, str]]:
+        '''
+        (bus, unique name) of the clients being watched
+        '''
+        return list(self._clients)
+
+    def _check_client(self, bus: str, client: str) -> None:
+        '''
+        Checks if a newly watched client is still connected, should be
+        implemented by subclasses (the client may have left before the match
+        rule was installed)
+
+        :param bus: DBus bus
+        :param client: client unique name
+        '''
+
+    def _client_left(self, bus: str, client: str) -> None:
+        '''
+        Releases the resources of a client that disconnected
+
+        :param bus: DBus bus
+        :param client: client unique name
+        '''
+        tracked = self._clients.pop((bus, client), None)
+        if tracked is None:
+            return
+        self.__logger.debug(f'{client} left {bus}, releasing {len(tracked.resources)} resources')
+        self.unsubscribe_signal(tracked.subscription)
+        for resource in tracked.resources:
+            try:
+                resource.release()
+            except Exception:
+                self.__logger.error(f'An exception ocurred when releasing a resource of {client}', exc_info=True)
+
+    def set_stream_limits(
+        self,
+        per_client: int = _STREAMS_PER_CLIENT,
+        total: int = _STREAMS,
+        idle_timeout: float = _STREAM_IDLE_TIMEOUT,
+    ) -> None:
+        '''
+        Limits the streams of generator methods open at the same time
+
+        Calls opening more streams get a ``LimitsExceeded`` error. Streams
+        nobody fetched from for ``idle_timeout`` seconds are closed.
+
+        :param per_client: streams each client can have open
+        :param total: streams open in the whole server
+        :param idle_timeout: seconds before an idle stream is closed
+        '''
+        if per_client < 1 or total < 1:
+            raise ValueError(f'Invalid stream limits, must be at least 1: per_client={per_client} total={total}')
+        if idle_timeout <= 0:
+            raise ValueError(f'Invalid idle_timeout, must be positive: {idle_timeout}')
+        self._streams_per_client = per_client
+        self._max_streams = total
+        self._stream_idle_timeout = idle_timeout
+
+    def open_stream(self, items: Iterable[Any], chunk_size: int, bus: str, client: Optional[str]) -> int:
+        '''
+        Opens a cursor over the items of a generator method, see
+        :class:`dbus_objects.object._DBusStreamMethod`
+
+        The cursor is closed when the client disconnects, or when it is left
+        idle (see :meth:`set_stream_limits`).
+
+        :param items: items to stream
+        :param chunk_size: number of items per chunk
+        :param bus: DBus bus of the client
+        :param client: unique name of the client that owns the cursor
+        :returns: cursor
+        '''
+        self._expire_streams()
+        key = (bus, client)
+        if self._stream_counts.get(key, 0) >= self._streams_per_client:
+            raise dbus_objects.errors.LimitsExceeded(f'Too many open streams for {client}')
+        if len(self._streams) >= self._max_streams:
+            raise dbus_objects.errors.LimitsExceeded('Too many open streams')
+        cursor = next(self._stream_cursors)
+        stream = _Stream(iter(items), chunk_size, bus, client)
+        if client is not None:
+            stream.resource = self.add_client_resource(client, lambda: self._drop_stream(cursor), bus)
+        self._streams[cursor] = stream
+        self._stream_counts[key] = self._stream_counts.get(key, 0) + 1
+        return cursor
+
+    def _expire_streams(self) -> None:
+        '''
+        Closes the streams that have been idle for too long
+        '''
+        deadline = time.monotonic() - self._stream_idle_timeout
+        while self._streams:
+            cursor, stream = next(iter(self._streams.items()))
+            if stream.last_used > deadline:
+                break
+            self.__logger.debug(f'closing stream {cursor} of {stream.client}, idle for too long')
+            self.close_stream(cursor, stream.bus, stream.client)
+
+    def _get_stream(self, cursor: int, bus: str, client: Optional[str]) -> _Stream:
+        self._expire_streams()
+        stream = self._streams.get(cursor)
+        if stream is None or (stream.bus, stream.client) != (bus, client):
+            raise dbus_objects.errors.InvalidArgs(f'Unknown cursor: {cursor}')
+        # keep the streams ordered by last use
+        stream.last_used = time.monotonic()
+        self._streams[cursor] = self._streams.pop(cursor)
+        return stream
+
+    def next_stream_chunk(self, cursor: int, bus: str, client: Optional[str]) -> Tuple[List[Any], bool]:
+        '''
+        Fetches the next chunk of a stream, the cursor is closed after the last one
+
+        :param cursor: cursor returned by :meth:`open_stream`
+        :param bus: DBus bus of the client
+        :param client: unique name of the client
+        :returns: items and whether the stream is over
+        '''
+        stream = self._get_stream(cursor, bus, client)
+        try:
+            chunk = list(itertools.islice(stream.iterator, stream.chunk_size))
+        except Exception:
+            self.close_stream(cursor, bus, client)
+            raise
+        done = len(chunk) < stream.chunk_size
+        if done:
+            self.close_stream(cursor, bus, client)
+        return chunk, done
+
+    def close_stream(self, cursor: int, bus: str, client: Optional[str]) -> None:
+        '''
+        Closes a stream before it is over
+
+        :param cursor: cursor returned by :meth:`open_stream`
+        :param bus: DBus bus of the client
+        :param client: unique name of the client
+        '''
+        stream = self._streams.get(cursor)
+        if stream is None or (stream.bus, stream.client) != (bus, client):
+            raise dbus_objects.errors.InvalidArgs(f'Unknown cursor: {cursor}')
+        if stream.resource is not None:
+            self.remove_client_resource(stream.resource)
+        self._drop_stream(cursor)
+
+    def close_streams(self) -> None:
+        '''
+        Closes all the open streams
+        '''
+        for cursor, stream in list(self._streams.items()):
+            self.close_stream(cursor, stream.bus, stream.client)
+
+    def _drop_stream(self, cursor: int) -> None:
+        stream = self._streams.pop(cursor, None)
+        if stream is None:
+            return
+        key = (stream.bus, stream.client)
+        self._stream_counts[key] -= 1
+        if not self._stream_counts[key]:
+            del self._stream_counts[key]
+        if hasattr(stream.iterator, 'close'):
+            stream.iterator.close()
+
+    def dispatch_signal(
+        self,
+        bus: str,
+        sender: Optional[str],
+        path: Optional[str],
+        interface: Optional[str],
+        member: Optional[str],
+        args: Tuple[Any, ...],
+    ) -> bool:
+        '''
+        Calls the callbacks subscribed to a signal
+
+        Only the field combinations that have subscriptions are looked up in
+        the index, so the cost does not grow with the number of subscriptions.
+
+        :param bus: DBus bus the signal was received on
+        :param sender: signal sender
+        :param path: signal path
+        :param interface: signal interface
+        :param member: signal name
+        :param args: signal arguments
+        :returns: whether any subscription matched
+        '''
+        senders: List[Optional[str]] = [sender]
+        if sender is not None:
+            # subscriptions to the well-known names the sender owns
+            senders.extend(self._name_owners.get((bus, sender), ()))
+        keys = [
+            (
+                bus,
+                key_sender,
+                path if mask[1] else None,
+                interface if mask[2] else None,
+                member if mask[3] else None,
+            )
+            for mask in list(self._signal_masks)
+            for key_sender in (senders if mask[0] else [None])
+        ]
+        handled = False
+        for key in keys:
+            for subscription in list(self._signal_index.get(key, ())):
+                if subscription.arg0 is not None and (not args or args[0] != subscription.arg0):
+                    continue
+                handled = True
+                try:
+                    subscription.callback(*args)
+                except Exception:
+                    self.__logger.error(
+                        f'An exception ocurred in the signal callback: {interface}.{member}',
+                        exc_info=True
+                    )
+        return handled
+
+    def _node_objects(self, node: _PathNode, path: str) -> Iterator[dbus_objects.object.DBusObject]:
+        '''
+        Objects serving a path: the registered ones and then the standard
+        interfaces, which are created on demand
+
+        :param node: path node
+        :param path: object path
+        '''
+        yield from node.objects
+        if node.objects:
+            yield _Properties(node.objects[0])
+        yield self._peer
+        yield _Introspectable(path, self)
+
+    def _get_element(
+        self,
+        table: str,
+        path: str,
+        interface: Optional[str],
+        name: str,
+    ) -> Tuple[dbus_objects.object.DBusObject, Any]:
+        '''
+        Looks up a member of the objects of a path
+
+        :param table: ``methods`` or ``properties``
+        :param path: object path
+        :param interface: member interface, ``None`` looks in all of them
+        :param name: member name
+        :returns: the object and the member table entry
+        '''
+        node = self._tree.get_node(path)
+        if node is None or not node.references:
+            raise dbus_objects.errors.UnknownObject(f'No such object: {path}')
+        known_interface = interface is None
+        for obj in self._node_objects(node, path):
+            member_table = obj._dbus_member_table()
+            interfaces: Dict[str, Dict[str, Any]] = getattr(member_table, table)
+            if interface is None:
+                for elements in interfaces.values():
+                    if name in elements:
+                        return obj, elements[name]
+            elif interface in interfaces and name in interfaces[interface]:
+                return obj, interfaces[interface][name]
+            else:
+                known_interface |= interface in member_table.methods or interface in member_table.properties
+        if not known_interface:
+            raise dbus_objects.errors.UnknownInterface(f'No such interface: {interface} (path={path})')
+        if table == 'properties':
+            raise dbus_objects.errors.UnknownProperty(f'No such property: {interface}.{name} (path={path})')
+        raise dbus_objects.errors.UnknownMethod(f'No such method: {interface}.{name} (path={path})')
+
+    def get_method(self, path: str, interface: Optional[str], method: str) -> dbus_objects.object._DBusMethodTuple:
         '''
         Fetches the method for given path, interface and method name
 
+        Raises :class:`dbus_objects.errors.UnknownObject`,
+        :class:`dbus_objects.errors.UnknownInterface` or
+        :class:`dbus_objects.errors.UnknownMethod` (all of them
+        :class:`KeyError`) if it is not found.
+
         :param path: method path
-        :param interface: method interface
+        :param interface: method interface, ``None`` looks in all of them
         :param interface: method name
         '''
-        return typing.cast(
-            dbus_objects.object._DBusMethodTuple,
-            self._method_tree.get_element(path, interface, method)
-        )
+        obj, descriptor = self._get_element('methods', path, interface, method)
+        return descriptor.bind(obj), descriptor
+
+    def get_policies(
+        self,
+        path: str,
+        interface: Optional[str],
+        member: str,
+        args: Tuple[Any, ...],
+        descriptor: dbus_objects.object._DBusMethod,
+    ) -> List[dbus_objects.policy.Policy]:
+        '''
+        Fetches the access control policies that apply to a method call
+
+        Calls to ``org.freedesktop.DBus.Properties`` are subject to the
+        policies of the properties they access, ``GetAll`` to the policies of
+        all the properties of the object.
+
+        :param path: method path
+        :param interface: method interface
+        :param member: method name
+        :param args: call arguments
+        :param descriptor: method descriptor
+        '''
+        if not self._has_policies:
+            return []
+        policies = [descriptor.policy] if descriptor.policy else []
+        if descriptor.interface == 'org.freedesktop.DBus.Properties':
+            if member in ('Get', 'Set') and len(args) >= 2:
+                try:
+                    _getter, _setter, property_descriptor = self.get_property(path, args[0], args[1])
+                except KeyError:
+                    pass
+                else:
+                    if property_descriptor.policy:
+                        policies.append(property_descriptor.policy)
+            elif member == 'GetAll':
+                node = self._tree.get_node(path)
+                policies.extend(
+                    property_descriptor.policy
+                    for obj in (node.objects if node else ())
+                    for elements in obj._dbus_member_table().properties.values()
+                    for _name, property_descriptor in elements.values()
+                    if property_descriptor.policy
+                )
+        return policies
+
+    def _consume_method_token(self, path: str, descriptor: dbus_objects.object._DBusMethod) -> bool:
+        '''
+        Takes a token from the bucket of a method with a rate limit (see the
+        ``rate_limit`` argument of :func:`dbus_objects.object.dbus_method`),
+        each object path has its own buckets
+
+        :param path: method path
+        :param descriptor: method descriptor
+        :returns: whether the call is allowed
+        '''
+        if descriptor.rate_limit is None:
+            return True
+        buckets = self._method_buckets.setdefault(path, {})
+        key = (descriptor.interface, descriptor.name)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = dbus_objects.integration.dispatch.TokenBucket(*descriptor.rate_limit)
+        return bucket.consume()
 
     def get_property(self, path: str, interface: str, method: str) -> dbus_objects.object._DBusPropertyTuple:
         '''
@@ -229,85 +1225,140 @@ class DBusServerBase():
         :param interface: property interface
         :param interface: property name
         '''
-        return typing.cast(
-            dbus_objects.object._DBusPropertyTuple,
-            self._property_tree.get_element(path, interface, method)
+        obj, (name, descriptor) = self._get_element('properties', path, interface, method)
+        return (
+            lambda: getattr(obj, name),
+            lambda value: setattr(obj, name, value),
+            descriptor,
         )
 
-    def _register_element(
-        self,
-        tree: _DBusTree,
-        path: str,
-        interface: str,
-        name: str,
-        data: Any,
-        ignore_warn: bool,
-    ) -> None:
-        interface_node = tree.get_interface_node(path, interface)
-        for node in tree.children(interface_node.identifier):
-            if node.tag == name:
-                if not ignore_warn:
-                    warnings.warn(
-                        f'Element already registered! '
-                        f'path={path} '
-                        f'interface={interface} '
-                        f'name={name} '
-                    )
-                break
-        else:  # no break
-            tree.create_node(name, data=data, parent=interface_node)
-
-    def _register_object(
+    def _warn_duplicates(
         self,
         path: str,
+        objects: Tuple[dbus_objects.object.DBusObject, ...],
         obj: dbus_objects.object.DBusObject,
-        ignore_warn: bool = False
     ) -> None:
         '''
-        Low level object registration logic
+        Warns about the members of the object already provided by the other
+        objects of the path
 
         :param path: object path
-        :param obj: object
-        :param ignore_warn: ignores the duplicated object warning, you want to
-                            set this when registering the standard interfaces
-        '''
-        for method, method_descriptor in obj.get_dbus_methods():
-            self._register_element(
-                self._method_tree,
-                path,
-                method_descriptor.interface,
-                method_descriptor.name,
-                (method, method_descriptor),
-                ignore_warn,
-            )
-        for getter, setter, property_descriptor in obj.get_dbus_properties():
-            self._register_element(
-                self._property_tree,
-                path,
-                property_descriptor.interface,
-                property_descriptor.name,
-                (getter, setter, property_descriptor),
-                ignore_warn,
-            )
+        :param objects: objects already registered in the path
+        :param obj: object being registered
+        '''
+        table = obj._dbus_member_table()
+        for other in objects:
+            other_table = other._dbus_member_table()
+            for kind in ('methods', 'properties'):
+                other_interfaces = getattr(other_table, kind)
+                for interface, elements in getattr(table, kind).items():
+                    for name in elements.keys() & other_interfaces.get(interface, {}).keys():
+                        warnings.warn(
+                            f'Element already registered! '
+                            f'path={path} '
+                            f'interface={interface} '
+                            f'name={name} '
+                        )
+
+    @contextlib.contextmanager
+    def _update_tree(self) -> Iterator[_PathTrieUpdate]:
+        '''
+        Context in which the registered objects are changed
+
+        Changes are made on a copy, published at once when the context exits
+        (and dropped if it raises), so the dispatch never sees them half way.
+        Updates from several threads are serialized.
+        '''
+        with self._tree_lock:
+            update = _PathTrieUpdate(self._tree)
+            yield update
+            self._tree = _PathTrie(update.root)
+        if update.emptied:
+            self._paths_emptied(update.emptied)
+
+    def _paths_emptied(self, paths: List[str]) -> None:
+        '''
+        Called after publishing an update that left paths without objects
+
+        :param paths: object paths
+        '''
+        for path in paths:
+            self._method_buckets.pop(path, None)
+
+    def _add_object(self, update: _PathTrieUpdate, path: str, obj: dbus_objects.object.DBusObject) -> None:
+        self.__logger.debug(f'registering {obj.dbus_name} in {path}')
+        # TODO: validate paths, interfaces and method names
+        table = obj._dbus_member_table()
+        previous = update.add(path, obj)
+        if previous:
+            self._warn_duplicates(path, previous, obj)
+        self._has_policies |= table.has_policies
 
     def register_object(self, path: str, obj: dbus_objects.object.DBusObject) -> None:
         '''
         Registers the object into the server
 
+        The path and all its parents get the ``org.freedesktop.DBus.Peer``
+        and ``org.freedesktop.DBus.Introspectable`` interfaces, for as long as
+        there are objects registered in or below them.
+
+        Objects can be registered, and unregistered, from any thread while
+        the server is running.
+
         :param path: object path
         :param obj: object
         '''
-        self.__logger.debug(f'registering {obj.dbus_name} in {path}')
-        # TODO: validate paths, interfaces and method names
-        self._register_object(path, obj)
-        self._register_object(path, _Properties(obj), ignore_warn=True)
-        do = True
-        while do:
-            self._register_object(path, _Peer(), ignore_warn=True)
-            self._register_object(
-                path,
-                _Introspectable(path, self._method_tree, self._property_tree),
-                ignore_warn=True
-            )
-            do = path != '/'
-            path = os.path.dirname(path)
+        with self._update_tree() as update:
+            self._add_object(update, path, obj)
+
+    def register_objects(self, objects: Iterable[Tuple[str, dbus_objects.object.DBusObject]]) -> None:
+        '''
+        Registers several objects at once, calls see either none or all of
+        them
+
+        :param objects: (object path, object) pairs
+        '''
+        with self._update_tree() as update:
+            for path, obj in objects:
+                self._add_object(update, path, obj)
+
+    def unregister_object(self, path: str, obj: Optional[dbus_objects.object.DBusObject] = None) -> None:
+        '''
+        Removes an object from the server
+
+        The standard interfaces of the parent paths are removed as well once
+        there are no objects left below them.
+
+        :param path: object path
+        :param obj: object to remove, defaults to all the objects registered in the path
+        '''
+        with self._update_tree() as update:
+            if not update.remove(path, obj):
+                raise dbus_objects.errors.UnknownObject(f'No such object: {path}')
+        self.__logger.debug(f'unregistered {path}')
+
+    def unregister_subtree(self, path: str) -> int:
+        '''
+        Removes all the objects registered in a path and below it, at once
+
+        :param path: object path
+        :returns: number of objects removed
+        '''
+        with self._update_tree() as update:
+            count = update.remove_subtree(path)
+        self.__logger.debug(f'unregistered {count} objects in {path}')
+        return count
+
+    def _show_tree(self) -> str:
+        '''
+        Text representation of the registered paths, interfaces and methods
+        '''
+        lines = []
+        for path, node in self._tree.walk():
+            if node.objects:
+                lines.append(path)
+                for obj in node.objects:
+                    for interface, methods in obj._dbus_member_table().methods.items():
+                        lines.append(f'    {interface}')
+                        lines.extend(f'        {name}' for name in methods)
+        return '\n'.join(lines)
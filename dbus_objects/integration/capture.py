@@ -0,0 +1,350 @@
+# SPDX-License-Identifier: MIT
+'''
+Capture of the method calls received by a
+:class:`dbus_objects.integration.jeepney.BlockingDBusServer` and replay of
+the captures, to reproduce real traffic when measuring performance.
+
+Captures are started with
+:meth:`dbus_objects.integration.jeepney.BlockingDBusServer.start_capture` and
+replayed with :func:`replay`, or from the command line::
+
+    python -m dbus_objects.integration.capture replay calls.cap --bus unix:path=/tmp/bus --speed 10
+
+The capture file starts with an 8 byte magic (``DBOCAP`` and the format
+version) and is followed by one record per call: the time since the start
+of the capture (little endian ``double``, in seconds), the length of the
+message (little endian ``uint32``) and the message as sent over the wire,
+header fields and body included.
+'''
+import argparse
+import contextlib
+import struct
+import subprocess
+import threading
+import time
+import typing
+
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import jeepney
+import jeepney.io.blocking
+import jeepney.low_level
+
+import dbus_objects.integration.protocol
+
+
+_MAGIC = b'DBOCAP\x00\x01'
+_RECORD = struct.Struct('<dI')
+
+
+class CaptureWriter():
+    '''
+    Writes method calls to a capture file
+    '''
+    def __init__(self, path: str) -> None:
+        '''
+        :param path: capture file, it is overwritten
+        '''
+        self._file: Optional[BinaryIO] = open(path, 'wb')
+        self._file.write(_MAGIC)
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def record(self, msg: jeepney.Message) -> None:
+        '''
+        Appends a message to the capture, ignored once the capture is closed
+
+        :param msg: received message
+        '''
+        data = msg.serialise(serial=msg.header.serial)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_RECORD.pack(time.monotonic() - self._start, len(data)))
+            self._file.write(data)
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, jeepney.Message]]:
+    '''
+    Reads the messages of a capture file
+
+    :param path: capture file
+    :returns: (seconds since the start of the capture, message) pairs
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f'Not a capture file (or from another version): {path}')
+        while True:
+            header = f.read(_RECORD.size)
+            if not header:
+                return
+            if len(header) < _RECORD.size:
+                raise ValueError(f'Truncated capture file: {path}')
+            timestamp, length = _RECORD.unpack(header)
+            data = f.read(length)
+            parser = jeepney.low_level.Parser()
+            parser.add_data(data)
+            msg = parser.get_next_message()
+            if len(data) < length or msg is None:
+                raise ValueError(f'Truncated capture file: {path}')
+            yield timestamp, msg
+
+
+class MemberLatency(NamedTuple):
+    '''
+    Latencies of the replayed calls to a member, in seconds
+    '''
+    calls: int
+    errors: int
+    unanswered: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+def _percentile(latencies: List[float], percentile: float) -> float:
+    if not latencies:
+        return 0.0
+    index = min(len(latencies) - 1, max(0, round(percentile / 100 * len(latencies)) - 1))
+    return latencies[index]
+
+
+class _Results():
+    '''
+    Outstanding calls of a replay and the latencies of the completed ones
+    '''
+    def __init__(self) -> None:
+        self.pending: Dict[int, Tuple[str, float]] = {}  # serial -> (member, send time)
+        self.latencies: Dict[str, List[float]] = {}
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def sent(self, serial: int, member: str, expects_reply: bool) -> None:
+        self.calls[member] = self.calls.get(member, 0) + 1
+        self.latencies.setdefault(member, [])
+        if expects_reply:
+            self.pending[serial] = (member, time.monotonic())
+
+    def replied(self, msg: jeepney.Message) -> None:
+        now = time.monotonic()
+        serial = msg.header.fields.get(jeepney.HeaderFields.reply_serial)
+        if serial not in self.pending:
+            return
+        member, sent = self.pending.pop(serial)
+        self.latencies[member].append(now - sent)
+        if msg.header.message_type == jeepney.MessageType.error:
+            self.errors[member] = self.errors.get(member, 0) + 1
+
+    def summary(self) -> Dict[str, MemberLatency]:
+        unanswered: Dict[str, int] = {}
+        for member, _sent in self.pending.values():
+            unanswered[member] = unanswered.get(member, 0) + 1
+        summary = {}
+        for member, latencies in self.latencies.items():
+            latencies.sort()
+            summary[member] = MemberLatency(
+                self.calls[member],
+                self.errors.get(member, 0),
+                unanswered.get(member, 0),
+                _percentile(latencies, 50),
+                _percentile(latencies, 90),
+                _percentile(latencies, 99),
+                latencies[-1] if latencies else 0.0,
+            )
+        return summary
+
+
+class _ReplayConnection():
+    '''
+    Server connection that hands the replies to the replay instead of
+    sending them
+    '''
+    def __init__(self, connection: Any, results: _Results) -> None:
+        self._connection = connection
+        self._results = results
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def send(self, msg: jeepney.Message) -> int:
+        self._results.replied(msg)
+        return 0
+
+
+def _member(msg: jeepney.Message) -> str:
+    interface = msg.header.fields.get(jeepney.HeaderFields.interface)
+    member = msg.header.fields.get(jeepney.HeaderFields.member, '')
+    return f'{interface}.{member}' if interface else typing.cast(str, member)
+
+
+def _schedule(
+    path: str,
+    speed: float,
+) -> Iterator[Tuple[float, int, jeepney.Message]]:
+    '''
+    Messages of a capture with the time they are due and a new serial
+
+    :param path: capture file
+    :param speed: speed up factor, ``0`` to send the calls as fast as possible
+    '''
+    start = time.monotonic()
+    for serial, (timestamp, msg) in enumerate(read_capture(path), 1):
+        msg.header.serial = serial
+        yield (start + timestamp / speed if speed else 0.0), serial, msg
+
+
+def _replay_in_process(server: Any, path: str, speed: float, timeout: float) -> _Results:
+    results = _Results()
+    connection = _ReplayConnection(server._connections[server._bus], results)
+    for due, serial, msg in _schedule(path, speed):
+        while time.monotonic() < due:
+            server._send_completed()
+            time.sleep(min(0.001, max(0.0, due - time.monotonic())))
+        results.sent(serial, _member(msg), dbus_objects.integration.protocol.reply_expected(msg))
+        server._handle_msg(msg, connection)
+        server._run_queue()
+    deadline = time.monotonic() + timeout
+    while results.pending and time.monotonic() < deadline:
+        # replies completed later, from other threads
+        server._send_completed()
+        server._expire_deferred()
+        time.sleep(0.001)
+    return results
+
+
+def _receive(connection: jeepney.io.blocking.DBusConnection, timeout: float, results: _Results) -> None:
+    '''
+    Handles the replies that arrive within the timeout
+    '''
+    try:
+        msg = connection.receive(timeout=timeout)
+    except TimeoutError:
+        return
+    if msg.header.message_type in (jeepney.MessageType.method_return, jeepney.MessageType.error):
+        results.replied(msg)
+
+
+def _replay_bus(bus: str, path: str, speed: float, destination: Optional[str], timeout: float) -> _Results:
+    results = _Results()
+    with contextlib.closing(jeepney.io.blocking.open_dbus_connection(bus)) as connection:
+        for due, serial, msg in _schedule(path, speed):
+            now = time.monotonic()
+            while now < due:
+                _receive(connection, due - now, results)
+                now = time.monotonic()
+            # the bus sets the sender, and the serials must be unique in our connection
+            msg.header.fields.pop(jeepney.HeaderFields.sender, None)
+            if destination is not None:
+                msg.header.fields[jeepney.HeaderFields.destination] = destination
+            results.sent(serial, _member(msg), dbus_objects.integration.protocol.reply_expected(msg))
+            connection.send(msg, serial=serial)
+        deadline = time.monotonic() + timeout
+        while results.pending and time.monotonic() < deadline:
+            _receive(connection, deadline - time.monotonic(), results)
+    return results
+
+
+def replay(
+    path: str,
+    target: Any,
+    speed: float = 1.0,
+    destination: Optional[str] = None,
+    timeout: float = 5.0,
+) -> Dict[str, MemberLatency]:
+    '''
+    Sends the calls of a capture to a server, keeping the original spacing
+    between calls (divided by ``speed``), and reports the latencies per
+    member (``interface.member``)
+
+    Calls can be replayed over a bus, when ``target`` is a bus address, or
+    in-process, when it is a
+    :class:`dbus_objects.integration.jeepney.BlockingDBusServer` that is not
+    listening. In-process, the calls go straight to the dispatch of the server
+    and the latency does not include the bus, calls that wait for the
+    credentials of the caller (see :class:`dbus_objects.policy.Policy`) are
+    not answered.
+
+    :param path: capture file
+    :param target: bus address (eg. the one of :func:`private_bus`) or server
+    :param speed: speed up factor, ``0`` to send the calls as fast as possible
+    :param destination: bus name the calls are sent to, instead of the captured one
+    :param timeout: how long to wait for the outstanding replies at the end
+    '''
+    if speed < 0:
+        raise ValueError(f'Invalid speed, must not be negative: {speed}')
+    if isinstance(target, str):
+        results = _replay_bus(target, path, speed, destination, timeout)
+    else:
+        results = _replay_in_process(target, path, speed, timeout)
+    return results.summary()
+
+
+@contextlib.contextmanager
+def private_bus() -> Iterator[str]:
+    '''
+    Runs a private ``dbus-daemon`` for the duration of the context
+
+    :returns: address of the bus
+    '''
+    process = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        assert process.stdout is not None
+        address = process.stdout.readline().decode().strip()
+        if not address:
+            raise RuntimeError('dbus-daemon failed to start')
+        yield address
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _print_summary(summary: Dict[str, MemberLatency]) -> None:
+    print(f'{"member":<50}  {"calls":>7}  {"errors":>6}  {"lost":>5}  '
+          f'{"p50 ms":>8}  {"p90 ms":>8}  {"p99 ms":>8}  {"max ms":>8}')
+    for member, latency in sorted(summary.items()):
+        print(
+            f'{member:<50}  {latency.calls:>7}  {latency.errors:>6}  {latency.unanswered:>5}  '
+            f'{latency.p50 * 1e3:>8.3f}  {latency.p90 * 1e3:>8.3f}  '
+            f'{latency.p99 * 1e3:>8.3f}  {latency.max * 1e3:>8.3f}'
+        )
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Inspect and replay dbus-objects captures')
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help='list the captured calls')
+    show.add_argument('capture')
+    replay_parser = commands.add_parser('replay', help='replay the captured calls over a bus')
+    replay_parser.add_argument('capture')
+    replay_parser.add_argument('--bus', default='SESSION', help='bus address (default: %(default)s)')
+    replay_parser.add_argument('--speed', type=float, default=1.0,
+                               help='speed up factor, 0 for as fast as possible (default: %(default)s)')
+    replay_parser.add_argument('--destination', help='send the calls to this name instead')
+    replay_parser.add_argument('--timeout', type=float, default=5.0,
+                               help='how long to wait for the last replies (default: %(default)s)')
+    options = parser.parse_args(args)
+
+    if options.command == 'show':
+        for timestamp, msg in read_capture(options.capture):
+            fields = msg.header.fields
+            print(f'{timestamp:>12.6f}  {fields.get(jeepney.HeaderFields.sender, "-"):<12}  '
+                  f'{fields.get(jeepney.HeaderFields.path)}  {_member(msg)}')
+    else:
+        _print_summary(replay(options.capture, options.bus, options.speed, options.destination, options.timeout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,467 @@
+# SPDX-License-Identifier: MIT
+
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+import zlib
+
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class _PriorityClass():
+    '''
+    Calls of one priority, queued per sender
+    '''
+    def __init__(self) -> None:
+        # sender -> (arrival time, item) queue, in round-robin order
+        self.senders: 'collections.OrderedDict[Hashable, Deque[Tuple[float, Any]]]' = collections.OrderedDict()
+        self.served = 0  # calls served from the sender at the head in this turn
+        self.length = 0
+
+
+class DispatchQueue():
+    '''
+    Priority ordered queue of calls waiting to be executed
+
+    Calls with higher priority are popped first. Inside a priority, each
+    sender gets its own queue and senders are served round-robin, taking as
+    many calls per turn as their weight, so one client sending lots of calls
+    can't delay everyone else. Calls from the same sender are popped in
+    arrival order. Senders are identified by any hashable key, servers on
+    several buses use (bus, unique name) since unique names are only unique
+    within a bus. The time each call spent waiting is recorded per priority
+    class.
+    '''
+    def __init__(self) -> None:
+        self._classes: Dict[int, _PriorityClass] = {}
+        self._priorities: List[int] = []  # sorted, highest first
+        self._weights: Dict[Hashable, int] = {}
+        self._stats: Dict[int, Dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        return sum(priority_class.length for priority_class in self._classes.values())
+
+    def __iter__(self) -> Iterator[Any]:
+        '''
+        Iterates over the queued items, in no particular order
+        '''
+        for priority_class in self._classes.values():
+            for queue in priority_class.senders.values():
+                for _arrival, item in queue:
+                    yield item
+
+    def set_weight(self, sender: Hashable, weight: int) -> None:
+        '''
+        Sets the number of calls a sender gets served per turn
+
+        :param sender: sender key
+        :param weight: calls per turn, defaults to 1
+        '''
+        if weight < 1:
+            raise ValueError(f'Invalid weight, must be at least 1: {weight}')
+        self._weights[sender] = weight
+
+    def has_weight(self, sender: Hashable) -> bool:
+        '''
+        Whether the sender has a weight set
+
+        :param sender: sender key
+        '''
+        return sender in self._weights
+
+    def reset_weight(self, sender: Hashable) -> None:
+        '''
+        Restores the default weight of a sender
+
+        :param sender: sender key
+        '''
+        self._weights.pop(sender, None)
+
+    def push(self, item: Any, priority: int, sender: Hashable = None) -> None:
+        '''
+        Queues an item
+
+        :param item: item to queue
+        :param priority: item priority
+        :param sender: sender key of the call
+        '''
+        priority_class = self._classes.get(priority)
+        if priority_class is None:
+            priority_class = self._classes[priority] = _PriorityClass()
+            self._priorities = sorted(self._classes, reverse=True)
+        queue = priority_class.senders.get(sender)
+        if queue is None:
+            queue = priority_class.senders[sender] = collections.deque()
+        queue.append((time.monotonic(), item))
+        priority_class.length += 1
+
+    def pop(self) -> Any:
+        '''
+        Removes and returns the next item
+        '''
+        for priority in self._priorities:
+            priority_class = self._classes[priority]
+            if priority_class.length:
+                break
+        else:
+            raise IndexError('pop from an empty queue')
+        return self._take(priority, priority_class, next(iter(priority_class.senders)))
+
+    def pop_ready(self, ready: Callable[[Any], bool]) -> Optional[Any]:
+        '''
+        Removes and returns the next item that is ready
+
+        Only the oldest item of each sender is considered, so the items of a
+        sender are still popped in arrival order. Senders whose oldest item is
+        not ready are skipped, keeping their place in the round-robin.
+
+        :param ready: function that tells whether an item can be popped now
+        :returns: the item, ``None`` if no item is ready
+        '''
+        for priority in self._priorities:
+            priority_class = self._classes[priority]
+            for sender, queue in priority_class.senders.items():
+                if ready(queue[0][1]):
+                    return self._take(priority, priority_class, sender)
+        return None
+
+    def _take(self, priority: int, priority_class: _PriorityClass, sender: Hashable) -> Any:
+        senders = priority_class.senders
+        head = sender == next(iter(senders))
+        queue = senders[sender]
+        arrival, item = queue.popleft()
+        priority_class.length -= 1
+        if not queue:
+            del senders[sender]
+            if head:
+                priority_class.served = 0
+        elif not head:
+            # served out of turn, while the senders ahead wait
+            senders.move_to_end(sender)
+        else:
+            priority_class.served += 1
+            if priority_class.served >= self._weights.get(sender, 1):
+                senders.move_to_end(sender)
+                priority_class.served = 0
+
+        wait = time.monotonic() - arrival
+        stats = self._stats.get(priority)
+        if stats is None:
+            stats = self._stats[priority] = {'count': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+        stats['count'] += 1
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+        return item
+
+    @property
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        '''
+        Queue wait time per priority: number of calls, total and maximum wait
+        (in seconds)
+        '''
+        return {priority: dict(stats) for priority, stats in self._stats.items()}
+
+
+class TokenBucket():
+    '''
+    Token bucket rate limiter
+
+    The bucket holds up to ``burst`` tokens and is refilled with ``rate``
+    tokens per second, each call consumes one token.
+    '''
+    def __init__(self, rate: float, burst: float) -> None:
+        '''
+        :param rate: tokens added per second
+        :param burst: bucket capacity
+        '''
+        if rate <= 0 or burst < 1:
+            raise ValueError(f'Invalid token bucket, rate={rate} burst={burst}')
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._timestamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._timestamp) * self._rate)
+        self._timestamp = now
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self._burst
+
+    def consume(self) -> bool:
+        '''
+        Takes a token from the bucket
+
+        :returns: whether there was a token available
+        '''
+        self._refill(time.monotonic())
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class RateLimiter():
+    '''
+    Keeps token buckets per key (eg. per sender or per method)
+
+    Buckets are created on first use and the ones that are full again are
+    dropped once there are too many of them, so clients that come and go do
+    not leak memory.
+    '''
+    _PRUNE_SIZE = 1024
+
+    def __init__(self, rate: float, burst: float) -> None:
+        '''
+        :param rate: calls per second allowed per key
+        :param burst: calls allowed in a burst per key
+        '''
+        TokenBucket(rate, burst)  # validate
+        self._rate = rate
+        self._burst = burst
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._prune_size = self._PRUNE_SIZE
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: Hashable) -> bool:
+        '''
+        Takes a token from the bucket of the key
+
+        :param key: bucket key
+        :returns: whether the call is allowed
+        '''
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_size:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self._rate, self._burst)
+        return bucket.consume()
+
+    def _prune(self) -> None:
+        for key in [key for key, bucket in self._buckets.items() if bucket.full]:
+            del self._buckets[key]
+        # the buckets still in use can stay until there are twice as many
+        self._prune_size = max(self._PRUNE_SIZE, 2 * len(self._buckets))
+
+
+class DeadlineHeap():
+    '''
+    Entries (eg. pending calls) ordered by deadline
+
+    Entries removed before their deadline, like calls that completed in time,
+    are dropped lazily: they stay in the heap until they reach the top or the
+    heap is mostly made of them, then it is rebuilt.
+    '''
+    _SLACK = 64  # removed entries tolerated before the heap is rebuilt
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int]] = []  # (deadline, key)
+        self._entries: Dict[int, Any] = {}  # key -> entry, until it expires or is removed
+        self._keys = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        '''
+        Soonest deadline, ``None`` if there are no entries
+        '''
+        return self._heap[0][0] if self._heap else None
+
+    def push(self, deadline: float, entry: Any) -> int:
+        '''
+        Adds an entry
+
+        :param deadline: time (:func:`time.monotonic`) the entry expires at
+        :param entry: entry
+        :returns: key to remove the entry with
+        '''
+        key = next(self._keys)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (deadline, key))
+        return key
+
+    def remove(self, key: int) -> None:
+        '''
+        Removes an entry, if it has not expired yet
+
+        :param key: key of the entry
+        '''
+        self._entries.pop(key, None)
+        self._drop_removed()
+        if len(self._heap) > 2 * len(self._entries) + self._SLACK:
+            self._heap = [item for item in self._heap if item[1] in self._entries]
+            heapq.heapify(self._heap)
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Any]:
+        '''
+        Removes and returns the entries whose deadline passed, soonest first
+
+        :param now: current time, defaults to :func:`time.monotonic`
+        '''
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _deadline, key = heapq.heappop(self._heap)
+            expired.append(self._entries.pop(key))
+            self._drop_removed()
+        return expired
+
+    def _drop_removed(self) -> None:
+        # keeps an entry that is still there at the top
+        while self._heap and self._heap[0][1] not in self._entries:
+            heapq.heappop(self._heap)
+
+
+class _Lane():
+    '''
+    Worker thread that runs its tasks one at a time, in order
+    '''
+    def __init__(self, name: str) -> None:
+        self._tasks: Deque[Tuple[float, Callable[[], Any]]] = collections.deque()  # (arrival time, task)
+        self._condition = threading.Condition()
+        self._running = False
+        self._closed = False
+        self._stats: Dict[str, float] = {
+            'count': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'busy': 0.0, 'max_queued': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, task: Callable[[], Any]) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('The lane is closed')
+            self._tasks.append((time.monotonic(), task))
+            self._stats['max_queued'] = max(self._stats['max_queued'], len(self._tasks))
+            self._condition.notify_all()
+
+    @property
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._tasks)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._tasks and not self._closed:
+                    self._condition.wait()
+                if not self._tasks:
+                    return
+                arrival, task = self._tasks.popleft()
+                self._running = True
+            start = time.monotonic()
+            try:
+                task()
+            except Exception:
+                logging.getLogger(self.__class__.__name__).error('An exception ocurred in a lane task', exc_info=True)
+            end = time.monotonic()
+            with self._condition:
+                self._running = False
+                wait = start - arrival
+                self._stats['count'] += 1
+                self._stats['total_wait'] += wait
+                self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+                self._stats['busy'] += end - start
+                self._condition.notify_all()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._tasks and not self._running, timeout)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return dict(self._stats, queued=len(self._tasks))
+
+
+class WorkerLanes():
+    '''
+    Worker threads (lanes) that run tasks in parallel, in order per key
+
+    Each key is hashed to one of the lanes, so the tasks with the same key
+    run one at a time, in the order they were submitted, while tasks with
+    keys in other lanes run in parallel.
+    '''
+    def __init__(self, count: int, name: str = 'dbus-objects-lane') -> None:
+        '''
+        :param count: number of lanes
+        :param name: name prefix of the threads
+        '''
+        if count < 1:
+            raise ValueError(f'Invalid number of lanes, must be at least 1: {count}')
+        self._lanes = [_Lane(f'{name}-{index}') for index in range(count)]
+
+    def __len__(self) -> int:
+        return len(self._lanes)
+
+    def lane(self, key: Hashable) -> int:
+        '''
+        Index of the lane the tasks of a key run in
+
+        Strings are hashed with CRC-32, so they land in the same lane on every
+        run, other keys with :func:`hash`.
+
+        :param key: task key
+        '''
+        value = zlib.crc32(key.encode()) if isinstance(key, str) else hash(key)
+        return value % len(self._lanes)
+
+    def submit(self, key: Hashable, task: Callable[[], Any]) -> None:
+        '''
+        Queues a task in the lane of its key
+
+        :param key: task key
+        :param task: function to run
+        '''
+        self._lanes[self.lane(key)].submit(task)
+
+    def queued(self, key: Hashable) -> int:
+        '''
+        Number of tasks waiting to run in the lane of a key
+
+        :param key: task key
+        '''
+        return self._lanes[self.lane(key)].queued
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        '''
+        Waits until all the lanes are done with their tasks
+
+        :param timeout: maximum time to wait per lane
+        :returns: whether all lanes are idle
+        '''
+        return all([lane.wait_idle(timeout) for lane in self._lanes])
+
+    def close(self) -> None:
+        '''
+        Stops the lanes once they run the tasks already queued
+        '''
+        for lane in self._lanes:
+            lane.close()
+
+    @property
+    def stats(self) -> List[Dict[str, float]]:
+        '''
+        Metrics of each lane: tasks run (``count``), total and maximum time
+        they waited in the lane (``total_wait`` and ``max_wait``, in seconds),
+        time spent running them (``busy``), tasks currently waiting
+        (``queued``) and the most that ever waited at once (``max_queued``)
+        '''
+        return [lane.stats for lane in self._lanes]
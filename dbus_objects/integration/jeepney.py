@@ -1,134 +1,1368 @@
 # SPDX-License-Identifier: MIT
 
+import collections
+import enum
+import itertools
 import logging
+import os
+import select
+import socket
 import threading
 import time
+import typing
 
-from typing import Optional
+from typing import Any, Callable, Collection, Deque, Dict, Hashable, List, Optional, Set, Tuple
 
 import jeepney
 import jeepney.io.blocking
+import jeepney.low_level
 
+import dbus_objects.errors
 import dbus_objects.integration
+import dbus_objects.integration.capture
+import dbus_objects.integration.dispatch
+import dbus_objects.integration.peer
+import dbus_objects.integration.protocol
+import dbus_objects.object
+import dbus_objects.policy
+
+
+class NameRequestResult(enum.IntEnum):
+    '''
+    Reply codes of the ``RequestName`` bus method
+    '''
+    PRIMARY_OWNER = 1
+    IN_QUEUE = 2
+    EXISTS = 3
+    ALREADY_OWNER = 4
+
+
+class _BusConnection():
+    '''
+    Connection to a message bus and the names the server holds on it
+
+    Reads drain everything already available in the socket, and replies are
+    queued and written with a single vectored send when flushed.
+    '''
+    _RECV_SIZE = 64 * 1024
+    _IOV_MAX = 1024
+
+    def __init__(self, bus: str, conn: Optional[jeepney.io.blocking.DBusConnectionBase] = None) -> None:
+        '''
+        :param bus: DBus bus (hint: usually SESSION or SYSTEM)
+        :param conn: established connection, by default the bus is connected to
+        '''
+        self.bus = bus
+        self.conn = conn if conn is not None else jeepney.io.blocking.open_dbus_connection(bus)
+        self.name_request_results: Dict[str, NameRequestResult] = {}
+        self.owned_names: Set[str] = set()
+        self.stats = {
+            'receive_syscalls': 0,
+            'send_syscalls': 0,
+            'messages_received': 0,
+            'messages_sent': 0,
+        }
+        self._pending: List[jeepney.Message] = []
+        self._outgoing: List[bytes] = []
+
+    def fileno(self) -> int:
+        return typing.cast(int, self.conn.sock.fileno())
+
+    def has_pending(self) -> bool:
+        '''
+        Whether there are complete messages already buffered in the parser,
+        which happens when someone else read from the connection
+        '''
+        msg = self.conn.parser.get_next_message()
+        while msg is not None:
+            self._pending.append(msg)
+            msg = self.conn.parser.get_next_message()
+        return bool(self._pending)
+
+    def receive(self) -> List[jeepney.Message]:
+        '''
+        Receives all the messages available in the socket, without blocking
+        '''
+        while True:
+            try:
+                data = self.conn.sock.recv(self._RECV_SIZE, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            self.stats['receive_syscalls'] += 1
+            if not data:
+                raise ConnectionResetError('connection closed by the bus')
+            self.conn.parser.add_data(data)
+            if len(data) < self._RECV_SIZE:
+                break  # drained, don't waste a syscall to get EAGAIN
+
+        self.has_pending()
+        messages, self._pending = self._pending, []
+        self.stats['messages_received'] += len(messages)
+        return messages
+
+    def send(self, msg: jeepney.Message) -> int:
+        '''
+        Queues a message, it will be sent on the next :meth:`flush`
+
+        :returns: serial of the message
+        '''
+        serial = typing.cast(int, next(self.conn.outgoing_serial))
+        self._outgoing.append(msg.serialise(serial=serial))
+        return serial
+
+    def flush(self) -> None:
+        '''
+        Sends all the queued messages
+        '''
+        self.stats['messages_sent'] += len(self._outgoing)
+        while self._outgoing:
+            buffers = self._outgoing[:self._IOV_MAX]
+            del self._outgoing[:self._IOV_MAX]
+            sent = self.conn.sock.sendmsg(buffers)
+            self.stats['send_syscalls'] += 1
+            if sent < sum(len(buffer) for buffer in buffers):
+                self.conn.sock.sendall(b''.join(buffers)[sent:])
+                self.stats['send_syscalls'] += 1
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class _PeerConnection(_BusConnection):
+    '''
+    Direct connection from a client, without a bus in between
+
+    There is no bus to tell who sent the messages, so the received messages
+    get a made up unique name as the sender. That keeps the per sender state
+    (fairness, rate limits, credentials, client resources) working as usual.
+
+    The socket is non-blocking, a client that does not read its replies
+    can't stall the loop. Whatever the socket does not take is kept in an
+    output buffer and written once the socket is writable again (see
+    :meth:`wants_write`). Flushing fails with :class:`ConnectionError` once
+    the buffer grows over ``max_buffer`` bytes, or with
+    :class:`TimeoutError` when nothing could be written for ``send_timeout``
+    seconds, so the client can be dropped.
+    '''
+    def __init__(
+        self,
+        address: str,
+        sock: socket.socket,
+        sender: str,
+        data: bytes = b'',
+        max_buffer: int = 4 * 1024 * 1024,
+        send_timeout: float = 30.0,
+    ) -> None:
+        '''
+        :param address: address the server listens on, used as the bus name
+        :param sock: authenticated socket
+        :param sender: unique name given to the client
+        :param data: data received along with the end of the handshake
+        :param max_buffer: bytes allowed to wait in the output buffer
+        :param send_timeout: time allowed without writing to a client that is not reading
+        '''
+        super().__init__(address, jeepney.io.blocking.DBusConnectionBase(sock))
+        self.sender = sender
+        self.conn.parser.add_data(data)
+        self.conn.sock.setblocking(False)
+        self._max_buffer = max_buffer
+        self._send_timeout = send_timeout
+        self._unsent: Deque[memoryview] = collections.deque()
+        self._unsent_size = 0
+        self.send_deadline: Optional[float] = None  # set while there is unsent data
+
+    def wants_write(self) -> bool:
+        '''
+        Whether there is data waiting for the socket to be writable
+        '''
+        return bool(self._unsent)
+
+    def has_pending(self) -> bool:
+        pending = super().has_pending()
+        for msg in self._pending:
+            msg.header.fields[jeepney.HeaderFields.sender] = self.sender
+        return pending
+
+    def send(self, msg: jeepney.Message) -> int:
+        # the replies are addressed to the made up sender
+        msg.header.fields.pop(jeepney.HeaderFields.destination, None)
+        return super().send(msg)
+
+    def flush(self) -> None:
+        '''
+        Writes as much of the queued messages as the socket takes, without
+        blocking
+        '''
+        self.stats['messages_sent'] += len(self._outgoing)
+        for data in self._outgoing:
+            self._unsent.append(memoryview(data))
+            self._unsent_size += len(data)
+        self._outgoing.clear()
+        now = time.monotonic()
+        while self._unsent:
+            try:
+                sent = self.conn.sock.sendmsg(list(itertools.islice(self._unsent, self._IOV_MAX)))
+            except BlockingIOError:
+                break
+            self.stats['send_syscalls'] += 1
+            self._consume(sent)
+            self.send_deadline = None  # progress, restart the timeout
+
+        if not self._unsent:
+            self.send_deadline = None
+            return
+        if self.send_deadline is None:
+            self.send_deadline = now + self._send_timeout
+        if self._unsent_size > self._max_buffer:
+            raise ConnectionError(f'{self._unsent_size} bytes waiting to be sent to {self.sender}')
+        if now >= self.send_deadline:
+            raise TimeoutError(f'{self.sender} did not read for {self._send_timeout} seconds')
+
+    def _consume(self, sent: int) -> None:
+        '''
+        Drops the data the socket took from the output buffer
+
+        :param sent: number of bytes sent
+        '''
+        self._unsent_size -= sent
+        while sent:
+            if sent < len(self._unsent[0]):
+                self._unsent[0] = self._unsent[0][sent:]
+                return
+            sent -= len(self._unsent.popleft())
+
+
+class _Waker():
+    '''
+    Pipe used to wake up the loop from other threads
+    '''
+    def __init__(self) -> None:
+        self._read, self._write = os.pipe()
+        os.set_blocking(self._read, False)
+        os.set_blocking(self._write, False)
+
+    def fileno(self) -> int:
+        return self._read
+
+    def wake(self) -> None:
+        try:
+            os.write(self._write, b'\0')
+        except (BlockingIOError, OSError):
+            pass  # already woken up, or closed
+
+    def drain(self) -> None:
+        try:
+            while os.read(self._read, 4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self) -> None:
+        for fd in (self._read, self._write):
+            if fd >= 0:
+                os.close(fd)
+        self._read = self._write = -1
+
+
+# method call, connection, method, descriptor, access control policies, deadline
+_Call = Tuple[
+    jeepney.Message,
+    _BusConnection,
+    Callable[..., Any],
+    dbus_objects.object._DBusMethod,
+    List[dbus_objects.policy.Policy],
+    Optional[float],
+]
 
 
 class BlockingDBusServer(dbus_objects.integration.DBusServerBase):
     '''
     This class represents a DBus server. It should be instanciated.
     '''
+    # number of queued calls executed before checking for new messages
+    _BATCH_SIZE = 16
 
-    def __init__(self, bus: str, name: str) -> None:
+    def __init__(self, bus: str, name: str, standby: bool = False) -> None:
         '''
         Blocking DBus server built on top of Jeepney
 
+        In standby mode, the server queues for the name and only starts
+        serving method calls once the bus hands it the ownership (eg. when the
+        active server exits). Objects should be registered beforehand, so that
+        the takeover does not have to wait for anything.
+
+        Every bus the server is published in (see :meth:`add_name`) gets its
+        own connection, all of them are served from the same loop.
+
+        Received method calls go through a priority queue (see
+        :class:`dbus_objects.object.Priority`), so that calls like
+        ``org.freedesktop.DBus.Peer.Ping`` are not stuck behind bulk work.
+        Inside each priority, senders are served round-robin. Calls over the
+        rate limits (see :meth:`set_sender_rate_limit` and the ``rate_limit``
+        argument of :meth:`dbus_objects.object.dbus_method`) get a
+        ``org.freedesktop.DBus.Error.LimitsExceeded`` error.
+
+        Calls subject to an access control policy (see
+        :class:`dbus_objects.policy.Policy`) are held until the caller
+        credentials arrive from the bus. The credentials are then cached until
+        the caller disconnects, so only the first call of each client pays
+        for the lookup.
+
+        Handlers can return a :class:`dbus_objects.integration.PendingReply`
+        and complete it later, from any thread, the loop is woken up to send
+        the reply.
+
+        Calls can have a deadline (see :meth:`set_call_timeout` and the
+        ``timeout`` argument of :meth:`dbus_objects.object.dbus_method`).
+        Calls still queued when it passes are dropped, and pending replies are
+        cancelled, with a ``org.freedesktop.DBus.Error.Timeout`` error.
+        Running handlers can check
+        :attr:`dbus_objects.integration.CallContext.cancelled`.
+
+        The server can also accept direct connections from clients, without
+        the bus in between (see :meth:`listen_peer`).
+
         :param bus: DBus bus (hint: usually SESSION or SYSTEM)
         :param name: DBus name
+        :param standby: wait in the name queue instead of serving right away
         '''
         super().__init__(bus, name)
         self.__logger = logging.getLogger(self.__class__.__name__)
 
         self._dbus = jeepney.DBus()
+        self._standby = standby
+        self._connections: Dict[str, _BusConnection] = {}  # bus -> connection
+        self._queue = dbus_objects.integration.dispatch.DispatchQueue()
+        self._sender_limiter: Optional[dbus_objects.integration.dispatch.RateLimiter] = None
+        # (bus, serial) -> callback for the reply of our calls to the bus
+        self._reply_callbacks: Dict[Tuple[str, int], Callable[[jeepney.Message], None]] = {}
+        # (bus, unique name) -> credentials, dropped when the client leaves
+        self._credentials: Dict[Tuple[str, str], dbus_objects.policy.Credentials] = {}
+        self._held_calls: Dict[Tuple[str, str], List[_Call]] = {}  # (bus, unique name) -> calls
+        # replies completed from other threads, and the pipe that wakes up the loop for them
+        self._completed: Deque[Tuple[
+            jeepney.Message, _BusConnection, dbus_objects.object._DBusMethod, Any, Optional[int],
+        ]] = collections.deque()
+        self._waker = _Waker()
+        self._call_timeout: Optional[float] = None
+        # pending replies with a deadline: (reply, method call, connection, descriptor)
+        self._deadlines = dbus_objects.integration.dispatch.DeadlineHeap()
+        self._expired_calls = 0
+        self._capture: Optional[dbus_objects.integration.capture.CaptureWriter] = None
+        self._lanes: Optional[dbus_objects.integration.dispatch.WorkerLanes] = None
+        self._lane_key: Callable[[str], Hashable] = str
+        self._lane_max_queued = 0
+        self._queue_blocked = False  # every queued call waits for a busy lane
+        # work handed back to the loop by the lanes, in order
+        self._loop_calls: Deque[Callable[[], None]] = collections.deque()
+        self._peer_listener: Optional[dbus_objects.integration.peer.PeerListener] = None
+        self._peer_object: Optional[dbus_objects.integration.peer._PeerToPeer] = None
+        self._peers: Dict[str, _PeerConnection] = {}  # made up unique name -> connection
+        self._peer_limits: Tuple[int, float] = (0, 0.0)  # output buffer size, send timeout
+        self._peer_serials = itertools.count(1)
         self._conn_start()
 
     def __del__(self) -> None:
         self.close()  # pragma: no cover
 
-    def _conn_start(self) -> None:
+    @property
+    def _conn(self) -> jeepney.io.blocking.DBusConnection:
+        '''
+        Connection to the bus the server was created with
+        '''
+        return self._connections[self._bus].conn
+
+    def _conn_start(self, bus: Optional[str] = None) -> None:
         '''
         Start DBus connection
+
+        :param bus: bus to connect to, defaults to all of them
         '''
-        self._conn = jeepney.io.blocking.open_dbus_connection(self._bus)
-        jeepney.io.blocking.Proxy(self._dbus, self._conn).RequestName(self._name)
+        for conn_bus in [bus] if bus else list(self._names):
+            if conn_bus in self._connections:
+                self._connections[conn_bus].close()
+                # the replies will never arrive and the serials start over
+                for reply_key in [key for key in self._reply_callbacks if key[0] == conn_bus]:
+                    del self._reply_callbacks[reply_key]
+                for sender_key in [key for key in self._held_calls if key[0] == conn_bus]:
+                    del self._held_calls[sender_key]
+            connection = _BusConnection(conn_bus)
+            self._connections[conn_bus] = connection
+            for name in self._names[conn_bus]:
+                self._request_name(connection, name)
+            for rule_bus, rule in self._match_rules:
+                if rule_bus == conn_bus:
+                    self._add_match(rule_bus, rule)
+            for name_bus, watched_name in self._watched_names:
+                if name_bus == conn_bus:
+                    self._resolve_name(name_bus, watched_name)
 
-    def _handle_msg(self, msg: jeepney.Message) -> None:
+    def _request_name(self, connection: _BusConnection, name: str) -> None:
+        '''
+        Request the DBus name, queuing for it if it is already taken
+
+        :param connection: bus connection
+        :param name: DBus name
+        '''
+        result = NameRequestResult(
+            jeepney.io.blocking.Proxy(self._dbus, connection.conn).RequestName(name)[0]
+        )
+        connection.name_request_results[name] = result
+        if result in (NameRequestResult.PRIMARY_OWNER, NameRequestResult.ALREADY_OWNER):
+            self.__logger.debug(f'acquired name {name} on {connection.bus}')
+            connection.owned_names.add(name)
+        elif self._standby:
+            self.__logger.info(f'waiting for name {name} on {connection.bus} in standby')
+        else:
+            self.__logger.warning(
+                f'could not acquire name {name} on {connection.bus} ({result.name}), '
+                'queued for ownership'
+            )
+
+    def add_name(self, name: str, bus: Optional[str] = None) -> None:
+        '''
+        Publishes the server under another name
+
+        Connects to the bus if needed and requests the name right away.
+
+        :param name: DBus name
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        bus = bus or self._bus
+        known = name in self._names.get(bus, [])
+        super().add_name(name, bus)
+        if known:
+            return
+        if bus in self._connections:
+            self._request_name(self._connections[bus], name)
+        else:
+            self._conn_start(bus)
+
+    @property
+    def name_request_result(self) -> Optional[NameRequestResult]:
+        '''
+        Result of the last name request
+        '''
+        return self._connections[self._bus].name_request_results.get(self._name)
+
+    @property
+    def owns_name(self) -> bool:
+        '''
+        Whether the server currently owns the DBus name
+        '''
+        return self.owns(self._name)
+
+    def owns(self, name: str, bus: Optional[str] = None) -> bool:
+        '''
+        Whether the server currently owns a DBus name
+
+        :param name: DBus name
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        connection = self._connections.get(bus or self._bus)
+        return connection is not None and name in connection.owned_names
+
+    def _handle_name_signal(self, msg: jeepney.Message, connection: _BusConnection) -> bool:
+        '''
+        Track the name ownership from the NameAcquired and NameLost signals
+
+        :param msg: message to handle
+        :param connection: connection the message was received on
+        :returns: whether the message was a name ownership signal
+        '''
+        fields = msg.header.fields
+        if (
+            fields.get(jeepney.HeaderFields.sender) != 'org.freedesktop.DBus'
+            or fields.get(jeepney.HeaderFields.interface) != 'org.freedesktop.DBus'
+            or fields.get(jeepney.HeaderFields.member) not in ('NameAcquired', 'NameLost')
+        ):
+            return False
+        if not msg.body or msg.body[0] not in self._names[connection.bus]:
+            return True  # our unique name or some other name we don't care about
+        name = msg.body[0]
+        if fields[jeepney.HeaderFields.member] == 'NameAcquired':
+            self.__logger.info(f'acquired name {name} on {connection.bus}')
+            connection.owned_names.add(name)
+        else:
+            self.__logger.warning(f'lost name {name} on {connection.bus}')
+            connection.owned_names.discard(name)
+        return True
+
+    def _handle_signal(self, msg: jeepney.Message, connection: _BusConnection) -> None:
+        '''
+        Handle signal message
+
+        :param msg: message to handle
+        :param connection: connection the message was received on
+        '''
+        fields = msg.header.fields
+        name_signal = self._handle_name_signal(msg, connection)
+        handled = self.dispatch_signal(
+            connection.bus,
+            fields.get(jeepney.HeaderFields.sender),
+            fields.get(jeepney.HeaderFields.path),
+            fields.get(jeepney.HeaderFields.interface),
+            fields.get(jeepney.HeaderFields.member),
+            msg.body,
+        )
+        if not name_signal and not handled:
+            self.__logger.debug(f'Unhandled signal: {msg} / {msg.header} / {msg.header.fields}')
+
+    def _call_bus_no_reply(self, bus: str, msg: jeepney.Message) -> None:
+        '''
+        Sends a method call to the bus without waiting for the reply, which
+        would mean discarding the messages received in the meantime
+
+        :param bus: DBus bus
+        :param msg: method call message
+        '''
+        msg.header.flags |= jeepney.low_level.MessageFlag.no_reply_expected
+        if bus in self._connections:
+            self._connections[bus].send(msg)
+            self._connections[bus].flush()
+
+    def _call_bus(
+        self,
+        connection: _BusConnection,
+        msg: jeepney.Message,
+        callback: Callable[[jeepney.Message], None],
+    ) -> None:
+        '''
+        Sends a method call to the bus without blocking, the callback is
+        called with the reply (or error) when it is received
+
+        :param connection: bus connection
+        :param msg: method call message
+        :param callback: function called with the reply message
+        '''
+        serial = connection.send(msg)
+        self._reply_callbacks[(connection.bus, serial)] = callback
+
+    def _handle_reply(self, msg: jeepney.Message, connection: _BusConnection) -> bool:
+        '''
+        Handle the reply to one of our calls to the bus
+
+        :param msg: method return or error message
+        :param connection: connection the message was received on
+        :returns: whether the message was expected
+        '''
+        reply_serial = msg.header.fields.get(jeepney.HeaderFields.reply_serial)
+        callback = self._reply_callbacks.pop((connection.bus, reply_serial), None)
+        if callback is None:
+            return False
+        try:
+            callback(msg)
+        except Exception:
+            self.__logger.error('An exception ocurred in a reply callback', exc_info=True)
+        return True
+
+    def _add_match(self, bus: str, rule: str) -> None:
+        self.__logger.debug(f'adding match rule on {bus}: {rule}')
+        self._call_bus_no_reply(bus, self._dbus.AddMatch(rule))
+
+    def _remove_match(self, bus: str, rule: str) -> None:
+        self.__logger.debug(f'removing match rule on {bus}: {rule}')
+        self._call_bus_no_reply(bus, self._dbus.RemoveMatch(rule))
+
+    def _serving(self, msg: jeepney.Message, connection: _BusConnection) -> bool:
+        '''
+        Whether the method call should be served, standby servers only serve
+        the names they own
+
+        :param msg: method call message
+        :param connection: connection the message was received on
+        '''
+        if not self._standby:
+            return True
+        if isinstance(connection, _PeerConnection):
+            return self.owns_name
+        destination = msg.header.fields.get(jeepney.HeaderFields.destination)
+        if destination == connection.conn.unique_name:
+            return bool(connection.owned_names)
+        return destination in connection.owned_names
+
+    def _handle_msg(self, msg: jeepney.Message, connection: _BusConnection) -> None:
         '''
         Handle message
 
         :param msg: message to handle
+        :param connection: connection the message was received on
         '''
-        if msg.header.message_type == jeepney.MessageType.method_call:
-            self.__logger.debug(f'received message {msg.header.message_type}')
-            for key, value in msg.header.fields.items():
-                self.__logger.debug(f'\t{jeepney.HeaderFields(key).name} = {value}')
+        if msg.header.message_type == jeepney.MessageType.signal:
+            self._handle_signal(msg, connection)
+        elif msg.header.message_type == jeepney.MessageType.method_call:
+            if self._capture is not None:
+                self._capture.record(msg)
+            if self._serving(msg, connection):
+                self._handle_method_call(msg, connection)
+            else:
+                destination = msg.header.fields.get(jeepney.HeaderFields.destination)
+                self.__logger.debug(f'in standby for {destination}, refusing method call')
+                self._send_error(connection, msg, dbus_objects.errors.ServiceUnknown(f'{destination} is in standby'))
+        elif not self._handle_reply(msg, connection):
+            self.__logger.info(f'Unhandled message: {msg} / {msg.header} / {msg.header.fields}')
 
-            # TODO: validate fields are in msg
-            try:
-                method, descriptor = self.get_method(
-                    msg.header.fields[jeepney.HeaderFields.path],
-                    msg.header.fields[jeepney.HeaderFields.interface],
-                    msg.header.fields[jeepney.HeaderFields.member],
-                )
-            except KeyError:
-                self.__logger.info(
-                    'Method not found:',
-                    msg.header.fields[jeepney.HeaderFields.path],
-                    msg.header.fields[jeepney.HeaderFields.interface],
-                    msg.header.fields[jeepney.HeaderFields.member]
-                )
+    def _handle_method_call(self, msg: jeepney.Message, connection: _BusConnection) -> None:
+        '''
+        Handle method call message
+
+        :param msg: message to handle
+        :param connection: connection to reply on
+        '''
+        self.__logger.debug(f'received message {msg.header.message_type}')
+        for key, value in msg.header.fields.items():
+            self.__logger.debug(f'\t{jeepney.HeaderFields(key).name} = {value}')
+
+        fields = msg.header.fields
+        path = fields.get(jeepney.HeaderFields.path)
+        interface = fields.get(jeepney.HeaderFields.interface)
+        member = fields.get(jeepney.HeaderFields.member)
+        if path is None or member is None:
+            # the bus should not let these through, but peers might send them
+            self._send_error(connection, msg, dbus_objects.errors.InvalidArgs('Method call without path or member'))
+            return
+        try:
+            method, descriptor = self.get_method(path, interface, member)
+        except KeyError as e:
+            self.__logger.info(f'Method not found: path={path} interface={interface} member={member}')
+            self._send_error(connection, msg, e)
+            return
+
+        timeout = descriptor.timeout if descriptor.timeout is not None else self._call_timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        sender = fields.get(jeepney.HeaderFields.sender)
+        if not self._check_rate_limits(path, connection.bus, sender, descriptor):
+            self._send_error(connection, msg, dbus_objects.errors.LimitsExceeded(
+                f'Rate limit exceeded for {descriptor.name}'
+            ))
+            return
+
+        policies = self.get_policies(path, interface, member, msg.body, descriptor)
+        if policies:
+            self._authorize((msg, connection, method, descriptor, policies, deadline))
+        else:
+            self._queue.push((msg, connection, method, descriptor, deadline), descriptor.priority, (connection.bus, sender))
+
+    def _send_error(self, connection: _BusConnection, msg: jeepney.Message, error: BaseException) -> None:
+        '''
+        Reply to a method call with an error, unless the caller asked for no reply
+
+        The error name comes from :func:`dbus_objects.errors.error_name`.
+
+        :param connection: connection to reply on
+        :param msg: method call message
+        :param error: exception describing the error
+        '''
+        reply = dbus_objects.integration.protocol.error_reply(msg, error)
+        if reply is not None:
+            connection.send(reply)
+
+    def _authorize(self, call: _Call) -> None:
+        '''
+        Queue the call if the caller is allowed by the policies, fetching its
+        credentials from the bus first if they are not cached
+
+        :param call: method call
+        '''
+        msg, connection = call[0], call[1]
+        sender = msg.header.fields.get(jeepney.HeaderFields.sender)
+        if sender is None:
+            self._dispatch_authorized(call, None)
+            return
+        key = (connection.bus, sender)
+        credentials = self._credentials.get(key)
+        if credentials is not None:
+            self._dispatch_authorized(call, credentials)
+        elif key in self._held_calls:
+            self._held_calls[key].append(call)
+        else:
+            self._held_calls[key] = [call]
+            self._call_bus(
+                connection,
+                self._dbus.GetConnectionCredentials(sender),
+                lambda reply: self._credentials_received(connection, sender, reply),
+            )
+
+    def _credentials_received(self, connection: _BusConnection, sender: str, reply: jeepney.Message) -> None:
+        '''
+        Cache the credentials of a caller and dispatch the calls that were
+        waiting for them
+
+        :param connection: bus connection
+        :param sender: caller unique name
+        :param reply: ``GetConnectionCredentials`` reply
+        '''
+        bus = connection.bus
+        credentials: Optional[dbus_objects.policy.Credentials] = None
+        if reply.header.message_type == jeepney.MessageType.method_return:
+            credentials = dbus_objects.policy.Credentials.from_dbus(reply.body[0])
+            self._credentials[(bus, sender)] = credentials
+            self.add_client_resource(sender, lambda: self._credentials.pop((bus, sender), None), bus)
+        else:
+            self.__logger.warning(f'could not get the credentials of {sender} on {bus}: {reply.body}')
+
+        for call in self._held_calls.pop((bus, sender), []):
+            self._dispatch_authorized(call, credentials)
+
+    def _check_client(self, bus: str, client: str) -> None:
+        if bus in self._connections:
+            self._call_bus(
+                self._connections[bus],
+                self._dbus.NameHasOwner(client),
+                lambda reply: None if not reply.body or reply.body[0] else self._client_left(bus, client),
+            )
+
+    def _resolve_name(self, bus: str, name: str) -> None:
+        if bus in self._connections:
+            self._call_bus(
+                self._connections[bus],
+                self._dbus.GetNameOwner(name),
+                lambda reply: None if reply.header.message_type == jeepney.MessageType.error
+                else self._name_owner_changed(bus, name, reply.body[0]),
+            )
+
+    def _dispatch_authorized(self, call: _Call, credentials: Optional[dbus_objects.policy.Credentials]) -> None:
+        '''
+        Queue the call if the policies allow the caller, refuse it otherwise
+
+        :param call: method call
+        :param credentials: caller credentials, ``None`` if unknown
+        '''
+        msg, connection, method, descriptor, policies, deadline = call
+        try:
+            allowed = credentials is not None and all(policy.allows(credentials) for policy in policies)
+        except Exception:
+            self.__logger.error(f'An exception ocurred when checking the policy of {descriptor.name}', exc_info=True)
+            allowed = False
+        if allowed:
+            sender = msg.header.fields.get(jeepney.HeaderFields.sender)
+            self._queue.push((msg, connection, method, descriptor, deadline), descriptor.priority, (connection.bus, sender))
+        else:
+            self.__logger.debug(f'access denied to {descriptor.name} for {credentials}')
+            self._send_error(connection, msg, dbus_objects.errors.AccessDenied(f'Access denied to {descriptor.name}'))
+
+    def _check_rate_limits(
+        self,
+        path: str,
+        bus: str,
+        sender: Optional[str],
+        descriptor: dbus_objects.object._DBusMethod,
+    ) -> bool:
+        '''
+        Consume a token from the sender and method buckets
+
+        :param path: method path
+        :param bus: DBus bus the call was received on
+        :param sender: sender of the call
+        :param descriptor: method descriptor
+        :returns: whether the call is allowed
+        '''
+        if self._sender_limiter is not None and not self._sender_limiter.consume((bus, sender)):
+            self.__logger.debug(f'sender {sender} is over the rate limit')
+            return False
+        if not self._consume_method_token(path, descriptor):
+            self.__logger.debug(f'method {descriptor.name} is over the rate limit')
+            return False
+        return True
+
+    def set_sender_rate_limit(self, rate: Optional[float], burst: Optional[float] = None) -> None:
+        '''
+        Limits the calls each sender can make
+
+        :param rate: calls per second allowed per sender, ``None`` to disable
+        :param burst: calls allowed in a burst, defaults to one second worth of calls
+        '''
+        if rate is None:
+            self._sender_limiter = None
+        else:
+            self._sender_limiter = dbus_objects.integration.dispatch.RateLimiter(
+                rate, burst if burst is not None else max(rate, 1)
+            )
+
+    def set_call_timeout(self, timeout: Optional[float]) -> None:
+        '''
+        Sets the default deadline of the method calls
+
+        Should match the timeout of the clients (25 seconds for libdbus), so
+        that the server does not work on calls nobody is waiting for.
+
+        :param timeout: seconds, ``None`` to disable
+        '''
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f'Invalid timeout, must be positive: {timeout}')
+        self._call_timeout = timeout
+
+    @property
+    def expired_calls(self) -> int:
+        '''
+        Number of calls dropped because their deadline passed
+        '''
+        return self._expired_calls
+
+    def _send_timeout(
+        self,
+        connection: _BusConnection,
+        msg: jeepney.Message,
+        descriptor: dbus_objects.object._DBusMethod,
+    ) -> None:
+        self._expired_calls += 1
+        self.__logger.debug(f'call to {descriptor.name} timed out')
+        self._send_error(connection, msg, dbus_objects.errors.Timeout(f'{descriptor.name} timed out'))
+
+    def _expire_deferred(self) -> None:
+        '''
+        Cancel the pending replies whose deadline passed
+        '''
+        for reply, msg, connection, descriptor in self._deadlines.pop_expired():
+            if reply._cancel():
+                self._send_timeout(connection, msg, descriptor)
+
+    def start_capture(self, path: str) -> dbus_objects.integration.capture.CaptureWriter:
+        '''
+        Starts recording the received method calls to a capture file, which
+        can be replayed with :func:`dbus_objects.integration.capture.replay`
+
+        A capture already running is stopped.
+
+        :param path: capture file, it is overwritten
+        '''
+        self.stop_capture()
+        self._capture = dbus_objects.integration.capture.CaptureWriter(path)
+        self.__logger.info(f'capturing method calls to {path}')
+        return self._capture
+
+    def stop_capture(self) -> None:
+        '''
+        Stops recording the received method calls
+        '''
+        capture, self._capture = self._capture, None
+        if capture is not None:
+            capture.close()
+            self.__logger.info(f'captured {capture.records} method calls')
+
+    def set_sender_weight(self, sender: str, weight: int, bus: Optional[str] = None) -> None:
+        '''
+        Sets how many calls a sender gets executed per round-robin turn
+
+        The weight is dropped when the sender disconnects.
+
+        :param sender: sender unique name
+        :param weight: calls per turn, defaults to 1
+        :param bus: DBus bus of the sender, defaults to the bus the server was created with
+        '''
+        key = (bus or self._bus, sender)
+        known = self._queue.has_weight(key)
+        self._queue.set_weight(key, weight)
+        if not known:
+            self.add_client_resource(sender, lambda: self._queue.reset_weight(key), key[0])
+
+    def _execute(
+        self,
+        msg: jeepney.Message,
+        connection: _BusConnection,
+        method: Callable[..., Any],
+        descriptor: dbus_objects.object._DBusMethod,
+        deadline: Optional[float] = None,
+    ) -> None:
+        '''
+        Execute a queued method call and send the reply
+
+        :param msg: method call message
+        :param connection: connection to reply on
+        :param method: method to call
+        :param descriptor: method descriptor
+        :param deadline: time after which the caller is no longer waiting
+        '''
+        if deadline is not None and time.monotonic() >= deadline:
+            self._send_timeout(connection, msg, descriptor)
+            return
+
+        try:
+            dbus_objects.integration.protocol.check_signature(msg, descriptor)
+        except dbus_objects.errors.InvalidArgs as e:
+            self.__logger.debug(f'got invalid signature: {e}')
+            self._send_error(connection, msg, e)
+            return
+
+        if self._lanes is not None:
+            path = msg.header.fields.get(jeepney.HeaderFields.path, '/')
+            self._lanes.submit(self._lane_key(path), lambda: self._execute_in_lane(
+                msg, connection, method, descriptor, deadline,
+            ))
+            return
+
+        try:
+            return_args = self._call(msg, connection, method, descriptor, deadline)
+        except Exception as e:
+            self._call_failed(connection, msg, descriptor, e)
+            return
+        self._reply(msg, connection, descriptor, deadline, return_args)
+
+    def _call(
+        self,
+        msg: jeepney.Message,
+        connection: _BusConnection,
+        method: Callable[..., Any],
+        descriptor: dbus_objects.object._DBusMethod,
+        deadline: Optional[float],
+    ) -> Any:
+        '''
+        Call the method, with the call context set
+
+        :param msg: method call message
+        :param connection: connection the call was received on
+        :param method: method to call
+        :param descriptor: method descriptor
+        :param deadline: time after which the caller is no longer waiting
+        :returns: value returned by the method
+        '''
+        sender = msg.header.fields.get(jeepney.HeaderFields.sender)
+        return dbus_objects.integration.protocol.invoke(
+            self, connection.bus, msg, method, descriptor, self._credentials.get((connection.bus, sender)), deadline,
+        )
+
+    def _call_failed(
+        self,
+        connection: _BusConnection,
+        msg: jeepney.Message,
+        descriptor: dbus_objects.object._DBusMethod,
+        error: Exception,
+    ) -> None:
+        self.__logger.error(
+            f'An exception ocurred when try to call method: {descriptor.name}',
+            exc_info=error,
+        )
+        self._send_error(connection, msg, error)
+
+    def _reply(
+        self,
+        msg: jeepney.Message,
+        connection: _BusConnection,
+        descriptor: dbus_objects.object._DBusMethod,
+        deadline: Optional[float],
+        return_args: Any,
+    ) -> None:
+        '''
+        Send the reply of a call, or wait for it if the method returned a
+        pending reply
+
+        :param msg: method call message
+        :param connection: connection to reply on
+        :param descriptor: method descriptor
+        :param deadline: time after which the caller is no longer waiting
+        :param return_args: value returned by the method
+        '''
+        try:
+            if isinstance(return_args, dbus_objects.integration.PendingReply):
+                deadline_key = None
+                if deadline is not None:
+                    deadline_key = self._deadlines.push(deadline, (return_args, msg, connection, descriptor))
+                return_args._bind(lambda reply: self._deferred_reply(msg, connection, descriptor, reply, deadline_key))
                 return
+            if dbus_objects.integration.protocol.reply_expected(msg):
+                connection.send(dbus_objects.integration.protocol.method_return(msg, descriptor, return_args))
+        except Exception as e:
+            self._call_failed(connection, msg, descriptor, e)
 
-            if jeepney.HeaderFields.signature in msg.header.fields:
-                msg_sig = msg.header.fields[jeepney.HeaderFields.signature]
-            else:
-                msg_sig = ''
-
-            signature_input, signature_output = descriptor.signature
-
-            if signature_input != msg_sig:
-                self.__logger.debug(
-                    'got invalid signature, was expecting '
-                    f'{signature_input} but got {msg_sig}'
-                )
-                return_msg = jeepney.new_error(
-                    msg, 'Client Error', 's',
-                    tuple([f'Invalid signature, expected {signature_input}'])
-                )
+    def _execute_in_lane(
+        self,
+        msg: jeepney.Message,
+        connection: _BusConnection,
+        method: Callable[..., Any],
+        descriptor: dbus_objects.object._DBusMethod,
+        deadline: Optional[float],
+    ) -> None:
+        '''
+        Execute a method call in a worker lane, the reply is sent from the
+        loop
+
+        :param msg: method call message
+        :param connection: connection to reply on
+        :param method: method to call
+        :param descriptor: method descriptor
+        :param deadline: time after which the caller is no longer waiting
+        '''
+        if deadline is not None and time.monotonic() >= deadline:
+            self._call_soon(lambda: self._send_timeout(connection, msg, descriptor))
+            return
+        try:
+            return_args = self._call(msg, connection, method, descriptor, deadline)
+        except Exception as e:
+            error = e
+            self._call_soon(lambda: self._call_failed(connection, msg, descriptor, error))
+            return
+        self._call_soon(lambda: self._reply(msg, connection, descriptor, deadline, return_args))
+
+    def _call_soon(self, func: Callable[[], None]) -> None:
+        '''
+        Run a function in the loop, this can be called from any thread
+
+        :param func: function to run
+        '''
+        self._loop_calls.append(func)
+        self._waker.wake()
+
+    def set_worker_lanes(
+        self,
+        count: int,
+        key: Optional[Callable[[str], Hashable]] = None,
+        max_queued: int = 4,
+    ) -> None:
+        '''
+        Execute the method calls in worker threads (lanes) instead of the loop
+
+        Calls are assigned to a lane by object path, or by the key the
+        function returns for the path, so the calls to the same object run
+        one at a time, in the order they were received, while calls to
+        objects in other lanes run in parallel. The loop keeps receiving,
+        queueing and replying. Per-lane metrics are in :attr:`lane_stats`.
+
+        Calls are only handed to a lane while it has less than ``max_queued``
+        calls waiting, the rest stay in the dispatch queue, where the priority
+        and per-sender fairness still apply to them. The calls of a sender
+        leave the queue in the order they arrived, so they also wait behind
+        the calls of the same sender to a busy lane.
+
+        Handlers that share state across objects in different lanes have to
+        protect it themselves.
+
+        :param count: number of lanes, ``0`` to execute the calls in the loop again
+        :param key: function that maps an object path to the key of its lane
+        :param max_queued: calls allowed to wait in a lane
+        '''
+        if count < 0:
+            raise ValueError(f'Invalid number of lanes, must not be negative: {count}')
+        if max_queued < 1:
+            raise ValueError(f'Invalid lane queue size, must be at least 1: {max_queued}')
+        lanes, self._lanes = self._lanes, None
+        if lanes is not None:
+            lanes.close()  # the queued calls still run, their replies are sent by the loop
+        if count:
+            self._lane_key = key or str
+            self._lane_max_queued = max_queued
+            self._lanes = dbus_objects.integration.dispatch.WorkerLanes(count)
+
+    @property
+    def lane_stats(self) -> List[Dict[str, float]]:
+        '''
+        Metrics of the worker lanes (see
+        :attr:`dbus_objects.integration.dispatch.WorkerLanes.stats`), empty if
+        they are not in use
+        '''
+        return self._lanes.stats if self._lanes is not None else []
+
+    def listen_peer(
+        self,
+        address: Optional[str] = None,
+        uids: Optional[Collection[int]] = None,
+        max_buffer: int = 4 * 1024 * 1024,
+        send_timeout: float = 30.0,
+    ) -> str:
+        '''
+        Accept direct connections from clients on a UNIX socket, without the
+        bus daemon in between
+
+        Direct connections are served from the same loop and dispatch the
+        same objects as the bus connections. Clients authenticate with SASL
+        ``EXTERNAL`` and the credentials reported by the kernel are the ones
+        the access control policies see. Each connection gets a made up unique
+        name (``:peer.N``) as the sender of its calls, see
+        :class:`dbus_objects.integration.peer.PeerListener`.
+
+        The address is published on the bus, as ``GetAddress`` of the
+        ``io.github.ffy00.dbus_objects.PeerToPeer`` interface of the ``/``
+        object.
+
+        Replies are written without blocking the loop. Clients that stop
+        reading are disconnected once ``max_buffer`` bytes are waiting for
+        them, or when nothing could be written to them for ``send_timeout``
+        seconds.
+
+        A listener already running is stopped, along with its connections.
+
+        :param address: D-Bus address to listen on, defaults to a socket in a new private directory
+        :param uids: user IDs allowed to connect, defaults to the user of the process
+        :param max_buffer: bytes allowed to wait to be sent to a client
+        :param send_timeout: time allowed without writing to a client that is not reading
+        :returns: address clients can connect to (see :func:`dbus_objects.integration.peer.open_peer_connection`)
+        '''
+        if max_buffer < 0 or send_timeout <= 0:
+            raise ValueError(f'Invalid peer output limits, max_buffer={max_buffer} send_timeout={send_timeout}')
+        self.stop_peer()
+        self._peer_limits = (max_buffer, send_timeout)
+        self._peer_listener = dbus_objects.integration.peer.PeerListener(address, uids)
+        self._peer_object = dbus_objects.integration.peer._PeerToPeer(self._peer_listener)
+        self.register_object('/', self._peer_object)
+        self.__logger.info(f'listening for direct connections on {self._peer_listener.address}')
+        return self._peer_listener.address
+
+    def stop_peer(self) -> None:
+        '''
+        Stop accepting direct connections and close the current ones
+        '''
+        for peer in list(self._peers.values()):
+            self._peer_closed(peer)
+        if self._peer_object is not None:
+            self.unregister_object('/', self._peer_object)
+            self._peer_object = None
+        if self._peer_listener is not None:
+            self._peer_listener.close()
+            self._peer_listener = None
+
+    @property
+    def peer_address(self) -> Optional[str]:
+        '''
+        Address direct connections are accepted on, ``None`` if they are not
+        '''
+        return self._peer_listener.address if self._peer_listener is not None else None
+
+    @property
+    def peers(self) -> List[str]:
+        '''
+        Made up unique names of the clients connected directly
+        '''
+        return list(self._peers)
+
+    def _accept_peers(self, readable: List[Any]) -> None:
+        '''
+        Accept new direct connections and advance their authentication
+
+        :param readable: objects ready to be read from
+        '''
+        assert self._peer_listener is not None
+        address = self._peer_listener.address
+        for sock, credentials, data in self._peer_listener.process(readable):
+            sender = f':peer.{next(self._peer_serials)}'
+            self.__logger.debug(f'{sender} connected directly: {credentials}')
+            self._peers[sender] = _PeerConnection(address, sock, sender, data, *self._peer_limits)
+            self._credentials[(address, sender)] = credentials
+
+    def _peer_closed(self, peer: _PeerConnection) -> None:
+        '''
+        Drop a direct connection and release the resources of its client
+
+        :param peer: connection
+        '''
+        if self._peers.pop(peer.sender, None) is None:
+            return
+        self.__logger.debug(f'{peer.sender} disconnected')
+        peer.close()
+        self._credentials.pop((peer.bus, peer.sender), None)
+        self._client_left(peer.bus, peer.sender)
+
+    def _deferred_reply(
+        self,
+        msg: jeepney.Message,
+        connection: _BusConnection,
+        descriptor: dbus_objects.object._DBusMethod,
+        reply: dbus_objects.integration.PendingReply,
+        deadline_key: Optional[int] = None,
+    ) -> None:
+        '''
+        Queue the reply of a call completed later, this can be called from
+        any thread
+
+        :param msg: method call message
+        :param connection: connection to reply on
+        :param descriptor: method descriptor
+        :param reply: completed reply
+        :param deadline_key: key of the deadline of the call, if it has one
+        '''
+        self._completed.append((msg, connection, descriptor, reply, deadline_key))
+        self._waker.wake()
+
+    def _send_completed(self) -> None:
+        '''
+        Send the replies of the calls completed from other threads
+        '''
+        self._waker.drain()
+        while self._loop_calls:
+            self._loop_calls.popleft()()
+        while self._completed:
+            msg, connection, descriptor, reply, deadline_key = self._completed.popleft()
+            if deadline_key is not None:
+                self._deadlines.remove(deadline_key)
+            if reply.error is not None:
+                self.__logger.error(f'Deferred call to {descriptor.name} failed: {reply.error}')
+                self._send_error(connection, msg, reply.error)
+                continue
+            try:
+                if dbus_objects.integration.protocol.reply_expected(msg):
+                    connection.send(dbus_objects.integration.protocol.method_return(msg, descriptor, reply.value))
+            except Exception as e:
+                self.__logger.error(f'Deferred call to {descriptor.name} failed: {e}')
+                self._send_error(connection, msg, e)
+
+    def _run_queue(self, limit: Optional[int] = None) -> None:
+        '''
+        Execute the queued method calls, highest priority first
+
+        :param limit: maximum number of calls to execute
+        '''
+        count = 0
+        self._queue_blocked = False
+        while self._queue and (limit is None or count < limit):
+            if self._lanes is None:
+                call = self._queue.pop()
             else:
-                try:
-                    return_args = method(*msg.body)
-                except Exception as e:
-                    self.__logger.error(
-                        f'An exception ocurred when try to call method: {descriptor.name}',
-                        exc_info=True
-                    )
-                    return_msg = jeepney.new_error(msg, type(e).__name__, 's', tuple([str(e)]))
-                else:
-                    return_msg = jeepney.new_method_return(
-                        msg,
-                        signature_output,
-                        (return_args,) if return_args is not None else tuple()
-                    )
-
-            self._conn.send_message(return_msg)
-        else:
-            self.__logger.info(f'Unhandled message: {msg} / {msg.header} / {msg.header.fields}')
+                call = self._queue.pop_ready(self._lane_ready)
+                if call is None:
+                    # a lane finishing a call wakes the loop up
+                    self._queue_blocked = True
+                    return
+            self._execute(*call)
+            count += 1
+
+    def _lane_ready(self, call: Tuple[Any, ...]) -> bool:
+        '''
+        Whether the lane of a queued call has room for it
+
+        :param call: queued call arguments
+        '''
+        assert self._lanes is not None
+        path = call[0].header.fields.get(jeepney.HeaderFields.path, '/')
+        return self._lanes.queued(self._lane_key(path)) < self._lane_max_queued
+
+    @property
+    def queue_stats(self) -> Dict[int, Dict[str, float]]:
+        '''
+        Time method calls spent in the dispatch queue, per priority (see
+        :attr:`dbus_objects.integration.dispatch.DispatchQueue.stats`)
+        '''
+        return self._queue.stats
+
+    @property
+    def io_stats(self) -> Dict[str, int]:
+        '''
+        I/O counters (syscalls and messages) summed over all the connections
+        '''
+        stats: Dict[str, int] = {}
+        for connection in self._all_connections():
+            for key, value in connection.stats.items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
 
     def close(self) -> None:
         '''
-        Close the DBus connection
+        Close the DBus connections
+        '''
+        self.stop_capture()
+        self.set_worker_lanes(0)
+        self.stop_peer()
+        self.close_streams()
+        for connection in self._connections.values():
+            connection.close()
+        self._waker.close()
+
+    def _process(self, connection: _BusConnection) -> None:
+        '''
+        Handles all the messages available in the connection and sends the
+        replies
+
+        :param connection: connection to process
+        '''
+        try:
+            messages = connection.receive()
+        except ConnectionResetError:
+            if isinstance(connection, _PeerConnection):
+                self._peer_closed(connection)
+                return
+            self.__logger.debug(f'connection to {connection.bus} reset abruptly, restarting...')
+            self._conn_start(connection.bus)
+            return
+        for msg in messages:
+            self._handle_msg(msg, connection)
+
+    def _select_timeout(self, connections: List[_BusConnection]) -> Optional[float]:
+        '''
+        How long to wait for new messages: not at all if there is work
+        pending, until the next deadline otherwise
+
+        :param connections: connections to wait on
+        '''
+        queued = bool(self._queue) and not self._queue_blocked
+        if any([connection.has_pending() for connection in connections]) or queued or self._completed or self._loop_calls:
+            return 0
+        deadlines = [self._deadlines.next_deadline, *(peer.send_deadline for peer in self._peers.values())]
+        if self._peer_listener is not None:
+            deadlines.append(self._peer_listener.next_deadline)
+        pending = [deadline for deadline in deadlines if deadline is not None]
+        if pending:
+            return max(0.0, min(pending) - time.monotonic())
+        return None
+
+    def _all_connections(self) -> List[_BusConnection]:
+        '''
+        Bus connections and direct connections
         '''
-        self._conn.close()
+        return [*self._connections.values(), *self._peers.values()]
 
-    def listen(self, delay: float = 0.01, event: Optional[threading.Event] = None) -> None:
+    def _wait(self, connections: List[_BusConnection]) -> List[Any]:
+        '''
+        Wait for new messages, or new direct connections, and accept the
+        latter
+
+        :param connections: connections to wait on
+        :returns: the objects ready to be read from
+        '''
+        selectable: List[Any] = [*connections, self._waker]
+        if self._peer_listener is not None:
+            selectable += self._peer_listener.selectables
+        writable = [peer for peer in self._peers.values() if peer.wants_write()]
+        readable, _, _ = select.select(selectable, writable, [], self._select_timeout(connections))
+        if self._peer_listener is not None:
+            self._accept_peers(readable)
+        return readable
+
+    def listen(self, delay: float = 0, event: Optional[threading.Event] = None) -> None:
         '''
         Start listening and handling messages
 
+        Each iteration queues every message available, executes a few of the
+        queued calls and then flushes all the replies together. Checking for
+        new messages between these small batches lets high priority calls
+        overtake the backlog.
+
         :param delay: loop delay
         :param event: event which can be activated to stop listening
         '''
         self.__logger.debug('server topology:')
-        for line in self._method_tree.show(stdout=False).splitlines():
+        for line in self._show_tree().splitlines():
             self.__logger.debug('\t' + line)
         self.__logger.info('started listening...')
         try:
             while event is None or event.is_set():
-                try:
-                    msg = self._conn.receive()
-                except ConnectionResetError:
-                    self.__logger.debug('connection reset abruptly, restarting...')
-                    self._conn_start()
-                else:
-                    self._handle_msg(msg)
-                time.sleep(delay)
+                connections = self._all_connections()
+                readable = self._wait(connections)
+                for connection in connections:
+                    if connection in readable or connection.has_pending():
+                        self._process(connection)
+                self._run_queue(self._BATCH_SIZE)
+                self._send_completed()
+                self._expire_deferred()
+                self._flush()
+                if delay:
+                    time.sleep(delay)
+            self._run_queue()
+            while self._lanes is not None:
+                self._lanes.wait_idle()
+                if not self._queue:
+                    break
+                self._run_queue()
+            self._send_completed()
+            self._flush()
         except KeyboardInterrupt:
             self.__logger.info('exiting...')
+
+    def _flush(self) -> None:
+        '''
+        Send the queued messages of all connections
+        '''
+        for connection in self._connections.values():
+            connection.flush()
+        for peer in list(self._peers.values()):
+            try:
+                peer.flush()
+            except OSError as e:
+                self.__logger.debug(f'dropping {peer.sender}: {e}')
+                self._peer_closed(peer)
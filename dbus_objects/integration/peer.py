@@ -0,0 +1,364 @@
+# SPDX-License-Identifier: MIT
+'''
+Direct (peer-to-peer) D-Bus connections, without a bus daemon in between.
+
+:meth:`dbus_objects.integration.jeepney.BlockingDBusServer.listen_peer`
+makes the server listen on its own UNIX socket, clients connect to it with
+:func:`open_peer_connection`. The address can be found by calling
+``GetAddress`` on the ``io.github.ffy00.dbus_objects.PeerToPeer``
+interface of the ``/`` object of the server, over the bus.
+
+Clients authenticate with the SASL ``EXTERNAL`` mechanism, the user ID they
+claim is checked against the one the kernel reports for the socket.
+'''
+import enum
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import time
+
+from typing import Collection, Dict, List, Optional, Tuple
+
+import jeepney.bus
+import jeepney.io.blocking
+import jeepney.io.common
+
+import dbus_objects.object
+import dbus_objects.policy
+
+
+class _AuthState(enum.Enum):
+    WAITING_FOR_NUL = enum.auto()
+    WAITING_FOR_AUTH = enum.auto()
+    WAITING_FOR_DATA = enum.auto()
+    WAITING_FOR_BEGIN = enum.auto()
+    AUTHENTICATED = enum.auto()
+    FAILED = enum.auto()
+
+
+class SASLExternal():
+    '''
+    Server side of the D-Bus authentication handshake, supporting only the
+    ``EXTERNAL`` mechanism
+
+    It does no I/O: the received bytes are fed to it and it returns the bytes
+    to send back.
+
+    https://dbus.freedesktop.org/doc/dbus-specification.html#auth-protocol
+    '''
+    _MAX_LINE = 16 * 1024
+    _MAX_REJECTIONS = 3
+
+    def __init__(self, peer_uid: Optional[int], uids: Collection[int], guid: str) -> None:
+        '''
+        :param peer_uid: user ID of the peer, as reported by the kernel
+        :param uids: user IDs allowed to connect
+        :param guid: server GUID, sent to the client when it is authenticated
+        '''
+        self._peer_uid = peer_uid
+        self._uids = uids
+        self._guid = guid
+        self._state = _AuthState.WAITING_FOR_NUL
+        self._buffer = b''
+        self._rejections = 0
+
+    @property
+    def authenticated(self) -> bool:
+        return self._state == _AuthState.AUTHENTICATED
+
+    @property
+    def failed(self) -> bool:
+        return self._state == _AuthState.FAILED
+
+    @property
+    def remaining(self) -> bytes:
+        '''
+        Data received after ``BEGIN``, the start of the first messages
+        '''
+        return self._buffer if self.authenticated else b''
+
+    def feed(self, data: bytes) -> bytes:
+        '''
+        Processes data received from the client
+
+        :param data: received bytes
+        :returns: reply to send to the client
+        '''
+        self._buffer += data
+        replies = []
+        if self._state == _AuthState.WAITING_FOR_NUL and self._buffer:
+            if self._buffer[:1] != b'\0':
+                self._state = _AuthState.FAILED
+                return b''
+            self._buffer = self._buffer[1:]
+            self._state = _AuthState.WAITING_FOR_AUTH
+        while self._state not in (_AuthState.AUTHENTICATED, _AuthState.FAILED):
+            line, separator, rest = self._buffer.partition(b'\r\n')
+            if not separator:
+                if len(self._buffer) > self._MAX_LINE:
+                    self._state = _AuthState.FAILED
+                break
+            self._buffer = rest
+            replies.append(self._command(line))
+        return b''.join(replies)
+
+    def _command(self, line: bytes) -> bytes:
+        '''
+        Processes a command line of the client
+
+        :param line: command, without the line ending
+        :returns: reply
+        '''
+        command, _, argument = line.partition(b' ')
+        if command == b'BEGIN':
+            # BEGIN before OK is a protocol violation, the connection is dropped
+            self._state = _AuthState.AUTHENTICATED if self._state == _AuthState.WAITING_FOR_BEGIN else _AuthState.FAILED
+            return b''
+        if command in (b'CANCEL', b'ERROR') and self._state != _AuthState.WAITING_FOR_AUTH:
+            return self._reject()
+        if self._state == _AuthState.WAITING_FOR_AUTH and command == b'AUTH':
+            mechanism, _, response = argument.partition(b' ')
+            if mechanism != b'EXTERNAL':
+                return self._reject()
+            if not response:
+                self._state = _AuthState.WAITING_FOR_DATA
+                return b'DATA\r\n'
+            return self._check(response)
+        if self._state == _AuthState.WAITING_FOR_DATA and command == b'DATA':
+            return self._check(argument)
+        if self._state == _AuthState.WAITING_FOR_BEGIN and command == b'NEGOTIATE_UNIX_FD':
+            return b'ERROR "file descriptor passing is not supported"\r\n'
+        if command == b'ERROR':
+            return self._reject()
+        return b'ERROR "unexpected command"\r\n'
+
+    def _check(self, response: bytes) -> bytes:
+        '''
+        Checks the identity claimed by the client
+
+        :param response: hex encoded user ID, empty to use the one of the socket
+        '''
+        try:
+            identity = bytes.fromhex(response.decode('ascii')).decode('ascii')
+        except ValueError:
+            return self._reject()
+        if self._peer_uid is None or self._peer_uid not in self._uids:
+            return self._reject()
+        if identity and identity != str(self._peer_uid):
+            return self._reject()
+        self._state = _AuthState.WAITING_FOR_BEGIN
+        return f'OK {self._guid}\r\n'.encode()
+
+    def _reject(self) -> bytes:
+        self._rejections += 1
+        if self._rejections >= self._MAX_REJECTIONS:
+            self._state = _AuthState.FAILED
+            return b''
+        self._state = _AuthState.WAITING_FOR_AUTH
+        return b'REJECTED EXTERNAL\r\n'
+
+
+def peer_credentials(sock: socket.socket) -> dbus_objects.policy.Credentials:
+    '''
+    Credentials of the process on the other end of a UNIX socket, as reported
+    by the kernel (empty if the platform does not support ``SO_PEERCRED``)
+
+    :param sock: connected UNIX socket
+    '''
+    if not hasattr(socket, 'SO_PEERCRED'):  # pragma: no cover
+        return dbus_objects.policy.Credentials()
+    ucred = struct.Struct('3i')  # pid, uid, gid
+    pid, uid, gid = ucred.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, ucred.size))
+    return dbus_objects.policy.Credentials(uid, (gid,), pid)
+
+
+class _Handshake():
+    '''
+    Accepted connection that is still authenticating
+    '''
+    def __init__(self, sock: socket.socket, auth: SASLExternal, credentials: dbus_objects.policy.Credentials,
+                 deadline: float) -> None:
+        self.sock = sock
+        self.auth = auth
+        self.credentials = credentials
+        self.deadline = deadline
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+
+class PeerListener():
+    '''
+    Listening UNIX socket accepting direct connections
+
+    Connections are authenticated without blocking, the listener and the
+    connections still authenticating are meant to be waited on with
+    ``select`` (see :attr:`selectables`). Authenticated sockets are handed
+    over still in non-blocking mode.
+    '''
+    _BACKLOG = 128
+    _RECV_SIZE = 4096
+
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        uids: Optional[Collection[int]] = None,
+        auth_timeout: float = 5.0,
+    ) -> None:
+        '''
+        :param address: D-Bus address to listen on (``unix:path=...`` or
+                        ``unix:abstract=...``), defaults to a socket in a new
+                        private directory
+        :param uids: user IDs allowed to connect, defaults to the user of the process
+        :param auth_timeout: time connections have to authenticate
+        '''
+        self._directory: Optional[str] = None
+        if address is None:
+            self._directory = tempfile.mkdtemp(prefix='dbus-objects-')
+            address = f'unix:path={os.path.join(self._directory, "socket")}'
+        self.address = address
+        self.guid = os.urandom(16).hex()
+        self._uids = frozenset(uids) if uids is not None else frozenset((os.getuid(),))
+        self._auth_timeout = auth_timeout
+        self._handshakes: Dict[int, _Handshake] = {}  # fd -> handshake
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.bind(next(jeepney.bus.get_connectable_addresses(address)))
+            self._sock.listen(self._BACKLOG)
+        except BaseException:
+            self.close()
+            raise
+        self._sock.setblocking(False)
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    @property
+    def selectables(self) -> List[object]:
+        '''
+        Objects to wait on for new connections and handshake data
+        '''
+        return [self, *self._handshakes.values()]
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        '''
+        When the oldest handshake times out, ``None`` if there are none
+        '''
+        return min((handshake.deadline for handshake in self._handshakes.values()), default=None)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                sock, _address = self._sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            credentials = peer_credentials(sock)
+            self._handshakes[sock.fileno()] = _Handshake(
+                sock,
+                SASLExternal(credentials.uid, self._uids, self.guid),
+                credentials,
+                time.monotonic() + self._auth_timeout,
+            )
+
+    def _advance(self, handshake: _Handshake) -> bool:
+        '''
+        Reads and answers the handshake data available
+
+        :returns: whether the handshake is over, successfully or not
+        '''
+        try:
+            data = handshake.sock.recv(self._RECV_SIZE)
+            if not data:
+                return True
+            reply = handshake.auth.feed(data)
+            if reply and handshake.sock.send(reply) < len(reply):
+                return True  # the client is not reading, give up
+        except OSError:
+            return True
+        return handshake.auth.authenticated or handshake.auth.failed
+
+    def process(self, readable: Collection[object]) -> List[Tuple[socket.socket, dbus_objects.policy.Credentials, bytes]]:
+        '''
+        Accepts new connections and advances the handshakes
+
+        :param readable: objects ready to be read from (see :attr:`selectables`)
+        :returns: the connections that finished authenticating, with the
+                  credentials of the peer and the data received after the
+                  handshake
+        '''
+        if self in readable:
+            self._accept()
+        authenticated = []
+        now = time.monotonic()
+        for fd, handshake in list(self._handshakes.items()):
+            if handshake in readable:
+                done = self._advance(handshake)
+            else:
+                done = now >= handshake.deadline
+            if not done:
+                continue
+            del self._handshakes[fd]
+            if handshake.auth.authenticated:
+                authenticated.append((handshake.sock, handshake.credentials, handshake.auth.remaining))
+            else:
+                handshake.sock.close()
+        return authenticated
+
+    def close(self) -> None:
+        '''
+        Stops listening and drops the connections still authenticating
+        '''
+        for handshake in self._handshakes.values():
+            handshake.sock.close()
+        self._handshakes.clear()
+        self._sock.close()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+
+class _PeerToPeer(dbus_objects.object.DBusObject):
+    '''
+    Publishes the peer-to-peer address of the server on the bus
+    '''
+    def __init__(self, listener: PeerListener) -> None:
+        super().__init__(
+            name='PeerToPeer',
+            default_interface_root='io.github.ffy00.dbus_objects',
+        )
+        self._listener = listener
+
+    @dbus_objects.object.dbus_method(return_names=('address',), priority=dbus_objects.object.Priority.HIGH)
+    def get_address(self) -> str:
+        return self._listener.address
+
+
+class PeerConnection(jeepney.io.blocking.DBusConnection):  # type: ignore
+    '''
+    Client side of a direct connection, a Jeepney blocking connection that
+    skips the ``Hello`` to the bus
+
+    There is no bus, so the messages do not need a destination (Jeepney
+    still requires one when building method calls, it is ignored).
+    '''
+    def __init__(self, sock: socket.socket) -> None:
+        '''
+        :param sock: authenticated socket
+        '''
+        jeepney.io.blocking.DBusConnectionBase.__init__(self, sock)
+        self._filters = jeepney.io.common.MessageFilters()
+
+
+def open_peer_connection(address: str, timeout: float = 1.0) -> PeerConnection:
+    '''
+    Connects directly to a server listening for peer connections (see
+    :meth:`dbus_objects.integration.jeepney.BlockingDBusServer.listen_peer`)
+
+    :param address: D-Bus address of the server
+    :param timeout: authentication timeout
+    '''
+    return PeerConnection(jeepney.io.blocking.prep_socket(jeepney.bus.get_bus(address), timeout=timeout))
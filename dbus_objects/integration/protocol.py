@@ -0,0 +1,467 @@
+# SPDX-License-Identifier: MIT
+'''
+Sans-IO core of the DBus servers.
+
+:class:`DBusProtocol` consumes the bytes (or parsed messages) received from a
+connection and produces the messages to send back, without doing any I/O
+itself, so it can be embedded in any event loop. The transport authenticates
+the connection, feeds the received data to :meth:`DBusProtocol.receive_data`
+and writes :meth:`DBusProtocol.data_to_send`. For example, over a socket
+authenticated with :func:`jeepney.io.blocking.prep_socket`::
+
+    protocol = DBusProtocol('SESSION', 'org.example.Service')
+    protocol.register_object('/org/example', ExampleObject())
+    protocol.connect()
+    sock.sendall(protocol.data_to_send())
+    while True:
+        protocol.receive_data(sock.recv(65536))
+        sock.sendall(protocol.data_to_send())
+
+The functions that build the replies are shared with
+:class:`dbus_objects.integration.jeepney.BlockingDBusServer`, which adds the
+dispatch queue, per-sender rate limits, a default call timeout and worker
+lanes on top.
+'''
+import collections
+import functools
+import itertools
+import logging
+import threading
+import time
+import typing
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import jeepney
+import jeepney.low_level
+
+import dbus_objects.errors
+import dbus_objects.integration
+import dbus_objects.integration.dispatch
+import dbus_objects.object
+import dbus_objects.policy
+
+
+def reply_expected(msg: jeepney.Message) -> bool:
+    '''
+    Whether the caller wants a reply (the ``NO_REPLY_EXPECTED`` flag is not set)
+
+    :param msg: method call message
+    '''
+    return not msg.header.flags & jeepney.low_level.MessageFlag.no_reply_expected
+
+
+def error_reply(msg: jeepney.Message, error: BaseException) -> Optional[jeepney.Message]:
+    '''
+    Error reply to a method call, ``None`` if the caller asked for no reply
+
+    The error name comes from :func:`dbus_objects.errors.error_name`.
+
+    :param msg: method call message
+    :param error: exception describing the error
+    '''
+    if not reply_expected(msg):
+        return None
+    return jeepney.new_error(
+        msg, dbus_objects.errors.error_name(error), 's', (dbus_objects.errors.error_message(error),)
+    )
+
+
+def method_return(
+    msg: jeepney.Message,
+    descriptor: dbus_objects.object._DBusMethod,
+    return_args: Any,
+) -> jeepney.Message:
+    '''
+    Reply of a method call
+
+    :param msg: method call message
+    :param descriptor: method descriptor
+    :param return_args: value returned by the method
+    '''
+    return_args = descriptor.convert_return(return_args)
+    if return_args is None:
+        body: Tuple[Any, ...] = tuple()
+    elif descriptor.multiple_returns:
+        body = tuple(return_args)
+    else:
+        body = (return_args,)
+    return jeepney.new_method_return(msg, descriptor.signature[1], body)
+
+
+def check_signature(msg: jeepney.Message, descriptor: dbus_objects.object._DBusMethod) -> None:
+    '''
+    Raises :class:`dbus_objects.errors.InvalidArgs` if the arguments of the
+    call do not match the signature of the method
+
+    :param msg: method call message
+    :param descriptor: method descriptor
+    '''
+    msg_sig = msg.header.fields.get(jeepney.HeaderFields.signature, '')
+    signature_input = descriptor.signature[0]
+    if signature_input != msg_sig:
+        raise dbus_objects.errors.InvalidArgs(
+            f'Invalid signature, expected {signature_input!r} but got {msg_sig!r}'
+        )
+
+
+def invoke(
+    server: dbus_objects.integration.DBusServerBase,
+    bus: str,
+    msg: jeepney.Message,
+    method: Callable[..., Any],
+    descriptor: dbus_objects.object._DBusMethod,
+    credentials: Optional[dbus_objects.policy.Credentials] = None,
+    deadline: Optional[float] = None,
+) -> Any:
+    '''
+    Calls the method with the arguments of the call, with the call context
+    (see :func:`dbus_objects.integration.current_call`) set
+
+    :param server: server executing the call
+    :param bus: bus the call was received on
+    :param msg: method call message
+    :param method: method to call
+    :param descriptor: method descriptor
+    :param credentials: caller credentials, when they are known
+    :param deadline: time after which the caller is no longer waiting
+    :returns: value returned by the method
+    '''
+    sender = msg.header.fields.get(jeepney.HeaderFields.sender)
+    token = dbus_objects.integration._current_call.set(dbus_objects.integration.CallContext(
+        server, bus, sender, credentials, deadline,
+    ))
+    try:
+        return method(*descriptor.convert_arguments(msg.body))
+    finally:
+        dbus_objects.integration._current_call.reset(token)
+
+
+class DBusProtocol(dbus_objects.integration.DBusServerBase):
+    '''
+    DBus server that does no I/O
+    '''
+    def __init__(self, bus: str, name: str, wakeup: Optional[Callable[[], None]] = None) -> None:
+        '''
+        Sans-IO DBus server, serving the registered objects over a single
+        connection
+
+        Method calls are executed as they are received, the replies (and our
+        own calls to the bus) are queued until the transport takes them with
+        :meth:`messages_to_send` or :meth:`data_to_send`. Handlers can return a
+        :class:`dbus_objects.integration.PendingReply` and complete it from
+        any thread, ``wakeup`` is then called (from that thread) so that the
+        transport collects the reply.
+
+        Calls over the ``rate_limit`` of their method (see
+        :func:`dbus_objects.object.dbus_method`) get a
+        ``org.freedesktop.DBus.Error.LimitsExceeded`` error. Pending replies of
+        methods with a ``timeout`` are cancelled, with a
+        ``org.freedesktop.DBus.Error.Timeout`` error, once it passes; the
+        transport has to call :meth:`messages_to_send` by
+        :attr:`next_deadline` for that.
+
+        Calls subject to an access control policy (see
+        :class:`dbus_objects.policy.Policy`) are only allowed if the
+        transport passes the credentials of the caller along with the data.
+
+        :param bus: bus the connection is to, only used to tell the buses apart
+        :param name: DBus name, requested by :meth:`connect`
+        :param wakeup: function called when replies complete outside of :meth:`receive_data`
+        '''
+        super().__init__(bus, name)
+        self.__logger = logging.getLogger(self.__class__.__name__)
+        self._dbus = jeepney.DBus()
+        self._parser = jeepney.low_level.Parser()
+        self._serials = itertools.count(1)
+        self._outgoing: List[jeepney.Message] = []
+        # replies completed from other threads, protected by the lock
+        self._completed: Deque[Tuple[jeepney.Message, dbus_objects.object._DBusMethod,
+                                     dbus_objects.integration.PendingReply, Optional[int]]] = collections.deque()
+        # pending replies with a deadline: (reply, method call, descriptor)
+        self._deadlines = dbus_objects.integration.dispatch.DeadlineHeap()
+        self._lock = threading.Lock()
+        self._wakeup = wakeup
+        self._reply_callbacks: Dict[int, Callable[[jeepney.Message], None]] = {}  # serial -> callback
+        self._unique_name: Optional[str] = None
+        self._owned_names: Set[str] = set()
+        self._connected = False
+
+    @property
+    def unique_name(self) -> Optional[str]:
+        '''
+        Unique name the bus gave us, once the ``Hello`` reply is received
+        '''
+        return self._unique_name
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        '''
+        Time (:func:`time.monotonic`) the next pending reply times out at,
+        ``None`` if there is none
+        '''
+        return self._deadlines.next_deadline
+
+    @property
+    def owned_names(self) -> Set[str]:
+        '''
+        Names currently owned on the bus
+        '''
+        return set(self._owned_names)
+
+    def connect(self) -> None:
+        '''
+        Queues the ``Hello`` and the requests for the names of the server,
+        for connections to a bus (not needed on direct connections)
+        '''
+        self._connected = True
+        self._call_bus(self._dbus.Hello(), self._hello_received)
+        for name in self._names[self._bus]:
+            self._request_name(name)
+
+    def add_name(self, name: str, bus: Optional[str] = None) -> None:
+        '''
+        Publishes the server under another name, only names on the bus of the
+        connection are requested
+
+        :param name: DBus name
+        :param bus: DBus bus, defaults to the bus the server was created with
+        '''
+        bus = bus or self._bus
+        known = name in self._names.get(bus, [])
+        super().add_name(name, bus)
+        if not known and bus == self._bus and self._connected:
+            self._request_name(name)
+
+    def _request_name(self, name: str) -> None:
+        self._call_bus(self._dbus.RequestName(name), functools.partial(self._name_requested, name))
+
+    def _hello_received(self, reply: jeepney.Message) -> None:
+        if reply.header.message_type == jeepney.MessageType.method_return:
+            self._unique_name = reply.body[0]
+
+    def _name_requested(self, name: str, reply: jeepney.Message) -> None:
+        # primary owner or already owner
+        if reply.header.message_type == jeepney.MessageType.method_return and reply.body[0] in (1, 4):
+            self.__logger.debug(f'acquired name {name} on {self._bus}')
+            self._owned_names.add(name)
+        else:
+            self.__logger.warning(f'could not acquire name {name} on {self._bus}: {reply.body}')
+
+    def _send(self, msg: jeepney.Message) -> int:
+        '''
+        Queues a message to send, with the next serial
+
+        :returns: serial of the message
+        '''
+        msg.header.serial = next(self._serials)
+        self._outgoing.append(msg)
+        return typing.cast(int, msg.header.serial)
+
+    def _call_bus(self, msg: jeepney.Message, callback: Optional[Callable[[jeepney.Message], None]] = None) -> None:
+        '''
+        Queues a method call to the bus
+
+        :param msg: method call message
+        :param callback: function called with the reply, no reply is expected without one
+        '''
+        if callback is None:
+            msg.header.flags |= jeepney.low_level.MessageFlag.no_reply_expected
+        serial = self._send(msg)
+        if callback is not None:
+            self._reply_callbacks[serial] = callback
+
+    def _add_match(self, bus: str, rule: str) -> None:
+        if bus == self._bus:
+            self._call_bus(self._dbus.AddMatch(rule))
+
+    def _remove_match(self, bus: str, rule: str) -> None:
+        if bus == self._bus:
+            self._call_bus(self._dbus.RemoveMatch(rule))
+
+    def _check_client(self, bus: str, client: str) -> None:
+        if bus == self._bus:
+            self._call_bus(
+                self._dbus.NameHasOwner(client),
+                lambda reply: None if not reply.body or reply.body[0] else self._client_left(bus, client),
+            )
+
+    def _resolve_name(self, bus: str, name: str) -> None:
+        if bus == self._bus:
+            self._call_bus(
+                self._dbus.GetNameOwner(name),
+                lambda reply: None if reply.header.message_type == jeepney.MessageType.error
+                else self._name_owner_changed(bus, name, reply.body[0]),
+            )
+
+    def receive_data(self, data: bytes, credentials: Optional[dbus_objects.policy.Credentials] = None) -> None:
+        '''
+        Handles the data received from the connection, partial messages are
+        kept until the rest arrives
+
+        :param data: received bytes
+        :param credentials: credentials of the caller, on direct connections
+        '''
+        self._parser.add_data(data)
+        msg = self._parser.get_next_message()
+        while msg is not None:
+            self.receive_message(msg, credentials)
+            msg = self._parser.get_next_message()
+
+    def receive_message(
+        self,
+        msg: jeepney.Message,
+        credentials: Optional[dbus_objects.policy.Credentials] = None,
+    ) -> None:
+        '''
+        Handles a message received from the connection
+
+        :param msg: received message
+        :param credentials: credentials of the caller, for the access control policies
+        '''
+        message_type = msg.header.message_type
+        if message_type == jeepney.MessageType.method_call:
+            self._handle_method_call(msg, credentials)
+        elif message_type == jeepney.MessageType.signal:
+            self._handle_signal(msg)
+        else:
+            callback = self._reply_callbacks.pop(msg.header.fields.get(jeepney.HeaderFields.reply_serial), None)
+            if callback is not None:
+                callback(msg)
+            else:
+                self.__logger.info(f'Unhandled message: {msg} / {msg.header} / {msg.header.fields}')
+
+    def _handle_signal(self, msg: jeepney.Message) -> None:
+        fields = msg.header.fields
+        sender = fields.get(jeepney.HeaderFields.sender)
+        member = fields.get(jeepney.HeaderFields.member)
+        if sender == 'org.freedesktop.DBus' and member in ('NameAcquired', 'NameLost') and msg.body:
+            if member == 'NameAcquired' and msg.body[0] in self._names[self._bus]:
+                self._owned_names.add(msg.body[0])
+            else:
+                self._owned_names.discard(msg.body[0])
+        self.dispatch_signal(
+            self._bus, sender, fields.get(jeepney.HeaderFields.path),
+            fields.get(jeepney.HeaderFields.interface), member, msg.body,
+        )
+
+    def _lookup(
+        self,
+        msg: jeepney.Message,
+        credentials: Optional[dbus_objects.policy.Credentials],
+    ) -> dbus_objects.object._DBusMethodTuple:
+        '''
+        Finds the method of a call and checks the call can be executed
+
+        :param msg: method call message
+        :param credentials: credentials of the caller
+        '''
+        fields = msg.header.fields
+        path = fields.get(jeepney.HeaderFields.path)
+        interface = fields.get(jeepney.HeaderFields.interface)
+        member = fields.get(jeepney.HeaderFields.member)
+        if path is None or member is None:
+            raise dbus_objects.errors.InvalidArgs('Method call without path or member')
+        method, descriptor = self.get_method(path, interface, member)
+        check_signature(msg, descriptor)
+        policies = self.get_policies(path, interface, member, msg.body, descriptor)
+        if policies and (credentials is None or not all(policy.allows(credentials) for policy in policies)):
+            raise dbus_objects.errors.AccessDenied(f'Access denied to {descriptor.name}')
+        return method, descriptor
+
+    def _handle_method_call(
+        self,
+        msg: jeepney.Message,
+        credentials: Optional[dbus_objects.policy.Credentials],
+    ) -> None:
+        try:
+            method, descriptor = self._lookup(msg, credentials)
+        except Exception as e:
+            self.__logger.debug(f'refusing method call: {e}')
+            self._send_error(msg, e)
+            return
+        if not self._consume_method_token(msg.header.fields[jeepney.HeaderFields.path], descriptor):
+            self.__logger.debug(f'method {descriptor.name} is over the rate limit')
+            self._send_error(msg, dbus_objects.errors.LimitsExceeded(f'Rate limit exceeded for {descriptor.name}'))
+            return
+
+        timeout = descriptor.timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            return_args = invoke(self, self._bus, msg, method, descriptor, credentials, deadline)
+            if isinstance(return_args, dbus_objects.integration.PendingReply):
+                deadline_key = None
+                if deadline is not None:
+                    deadline_key = self._deadlines.push(deadline, (return_args, msg, descriptor))
+                return_args._bind(lambda reply: self._deferred_reply(msg, descriptor, reply, deadline_key))
+            elif reply_expected(msg):
+                self._send(method_return(msg, descriptor, return_args))
+        except Exception as e:
+            self.__logger.error(f'An exception ocurred when try to call method: {descriptor.name}', exc_info=e)
+            self._send_error(msg, e)
+
+    def _send_error(self, msg: jeepney.Message, error: BaseException) -> None:
+        reply = error_reply(msg, error)
+        if reply is not None:
+            self._send(reply)
+
+    def _deferred_reply(
+        self,
+        msg: jeepney.Message,
+        descriptor: dbus_objects.object._DBusMethod,
+        reply: dbus_objects.integration.PendingReply,
+        deadline_key: Optional[int] = None,
+    ) -> None:
+        '''
+        Queue the reply of a call completed later, this can be called from
+        any thread
+        '''
+        with self._lock:
+            self._completed.append((msg, descriptor, reply, deadline_key))
+        if self._wakeup is not None:
+            self._wakeup()
+
+    def _collect_completed(self) -> None:
+        '''
+        Queue the replies of the calls completed from other threads
+        '''
+        with self._lock:
+            completed, self._completed = self._completed, collections.deque()
+        for msg, descriptor, reply, deadline_key in completed:
+            if deadline_key is not None:
+                self._deadlines.remove(deadline_key)
+            if reply.error is not None:
+                self.__logger.error(f'Deferred call to {descriptor.name} failed: {reply.error}')
+                self._send_error(msg, reply.error)
+                continue
+            try:
+                if reply_expected(msg):
+                    self._send(method_return(msg, descriptor, reply.value))
+            except Exception as e:
+                self.__logger.error(f'Deferred call to {descriptor.name} failed: {e}')
+                self._send_error(msg, e)
+
+    def _expire_deferred(self) -> None:
+        '''
+        Cancel the pending replies whose deadline passed
+        '''
+        for reply, msg, descriptor in self._deadlines.pop_expired():
+            if reply._cancel():
+                self.__logger.debug(f'call to {descriptor.name} timed out')
+                self._send_error(msg, dbus_objects.errors.Timeout(f'{descriptor.name} timed out'))
+
+    def messages_to_send(self) -> List[jeepney.Message]:
+        '''
+        Takes the messages waiting to be sent, they already have their serial
+        (``msg.header.serial``), which has to be kept
+        '''
+        self._collect_completed()
+        self._expire_deferred()
+        messages, self._outgoing = self._outgoing, []
+        return messages
+
+    def data_to_send(self) -> bytes:
+        '''
+        Takes the messages waiting to be sent, serialised
+        '''
+        return b''.join(msg.serialise() for msg in self.messages_to_send())
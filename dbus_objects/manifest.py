@@ -0,0 +1,212 @@
+# SPDX-License-Identifier: MIT
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import os.path
+import tempfile
+import typing
+
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import dbus_objects.signature
+
+
+_VERSION = 1
+
+_logger = logging.getLogger(__name__)
+
+
+class Manifest():
+    '''
+    On-disk cache of the resolved DBus interfaces of the
+    :class:`dbus_objects.object.DBusObject` classes
+
+    Resolving the signatures of a class (``inspect.signature`` and the
+    ``typing`` introspection) and building its introspection XML is done
+    when the class is created, which adds up with lots of classes. While a
+    manifest is in use (see :func:`use_manifest`), classes whose entry is
+    up to date load the signatures, argument names and introspection
+    fragments from it instead, the type annotations are only inspected
+    when a return value needs converting.
+
+    Entries are keyed by the qualified name of the class and a hash of the
+    annotations and options of its members, so changed classes are
+    resolved again (and their entry replaced) automatically.
+    '''
+    def __init__(self, path: str) -> None:
+        '''
+        :param path: manifest file, it is created on :meth:`save` if missing
+        '''
+        self._path = path
+        self._classes: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _load(self) -> None:
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            _logger.warning(f'Ignoring unreadable manifest {self._path}: {e}')
+            return
+        if not isinstance(data, dict) or data.get('version') != _VERSION or not isinstance(data.get('classes'), dict):
+            _logger.info(f'Ignoring manifest {self._path} from another version')
+            return
+        self._classes = data['classes']
+
+    def lookup(self, name: str, key: str) -> Optional[Dict[str, Any]]:
+        '''
+        Fetches the members of a class, if its entry is up to date
+
+        :param name: qualified class name
+        :param key: hash of the class members (see :func:`_class_key`)
+        '''
+        entry = self._classes.get(name)
+        if entry is None or entry.get('key') != key:
+            self.misses += 1
+            return None
+        members = entry.get('members')
+        if not isinstance(members, dict):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return members
+
+    def store(self, name: str, key: str, members: Dict[str, Any]) -> None:
+        '''
+        Replaces the entry of a class
+
+        :param name: qualified class name
+        :param key: hash of the class members (see :func:`_class_key`)
+        :param members: attribute name -> resolved member
+        '''
+        self._classes[name] = {'key': key, 'members': members}
+        self._dirty = True
+
+    def save(self) -> None:
+        '''
+        Writes the manifest to disk, if anything changed
+
+        The file is replaced atomically, so concurrent readers never see a
+        partial manifest.
+        '''
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.dbus-objects-manifest-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': _VERSION, 'classes': self._classes}, f, sort_keys=True)
+            os.replace(tmp, self._path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._dirty = False
+
+
+def _annotation_fingerprint(annotation: Any) -> str:
+    '''
+    Description of an annotation that includes the fields of the structs
+    (``typing.NamedTuple`` and dataclasses) in it
+
+    :param annotation: type annotation
+    '''
+    if dbus_objects.signature._is_struct(annotation):
+        return repr((annotation, [
+            (name, _annotation_fingerprint(field))
+            for name, field in dbus_objects.signature.struct_fields(annotation)
+        ]))
+    args = typing.get_args(annotation)
+    if args:
+        return repr((typing.get_origin(annotation), [_annotation_fingerprint(arg) for arg in args]))
+    return repr(annotation)
+
+
+def _func_fingerprint(func: Callable[..., Any]) -> str:
+    '''
+    Cheap description of everything the signatures of a function depend on:
+    its argument names and annotations (or ``__signature__``, for generated
+    functions)
+
+    :param func: function
+    '''
+    code = getattr(func, '__code__', None)
+    arguments = code.co_varnames[:code.co_argcount + code.co_kwonlyargcount] if code else ()
+    signature = getattr(func, '__signature__', None)
+    if signature is not None:
+        annotations = {
+            name: parameter.annotation for name, parameter in signature.parameters.items()
+        }
+        annotations['return'] = signature.return_annotation
+    else:
+        annotations = dict(getattr(func, '__annotations__', {}))
+        if any(isinstance(annotation, str) for annotation in annotations.values()):
+            # postponed annotations, the structs they name have to be looked up
+            try:
+                annotations = typing.get_type_hints(func)
+            except Exception:
+                pass
+    return repr((
+        getattr(func, '__qualname__', None),
+        arguments,
+        signature is not None,
+        {name: _annotation_fingerprint(annotation) for name, annotation in annotations.items()},
+    ))
+
+
+def _class_key(name: str, members: Iterable[Tuple[str, str]]) -> str:
+    '''
+    Hash identifying the members of a class
+
+    :param name: qualified class name
+    :param members: (attribute name, member fingerprint) pairs
+    '''
+    digest = hashlib.sha256(name.encode())
+    for attribute, fingerprint in members:
+        digest.update(b'\0' + attribute.encode() + b'\0' + fingerprint.encode())
+    return digest.hexdigest()
+
+
+_active: Optional[Manifest] = None
+
+
+def use_manifest(path: str, autosave: bool = True) -> Manifest:
+    '''
+    Loads a manifest and uses it for the classes created from now on, so it
+    must be called before the modules defining them are imported
+
+    :param path: manifest file
+    :param autosave: save the manifest when the interpreter exits
+    '''
+    global _active
+    manifest = Manifest(path)
+    _active = manifest
+    if autosave:
+        atexit.register(manifest.save)
+    return manifest
+
+
+def disable_manifest() -> None:
+    '''
+    Stops using the manifest for the classes created from now on
+    '''
+    global _active
+    _active = None
+
+
+def active_manifest() -> Optional[Manifest]:
+    '''
+    Manifest in use, if any
+    '''
+    return _active
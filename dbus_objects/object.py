@@ -2,13 +2,32 @@
 
 from __future__ import annotations
 
+import copy
+import enum
+import inspect
 import itertools
+import sys
+import time
 import types
+import typing
 import xml.etree.ElementTree as ET
 
-from typing import Any, Callable, Generator, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Generator, List, Mapping, Optional, Sequence, Tuple
 
+import dbus_objects.manifest
+import dbus_objects.policy
 import dbus_objects.signature
+import dbus_objects.types
+
+
+class Priority(enum.IntEnum):
+    '''
+    Dispatch priority of DBus methods, calls with higher priority are
+    executed first when the server is backlogged
+    '''
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
 
 
 class _DBusDescriptorBase():
@@ -26,7 +45,6 @@ class _DBusDescriptorBase():
         self._interface_orig = interface
         self._interface = self._interface_orig
         self._name = dbus_objects.signature.dbus_case(name) if name else None
-        self._list_name: Optional[str] = None
 
     @property
     def interface(self) -> str:
@@ -40,29 +58,34 @@ class _DBusDescriptorBase():
             raise ValueError("Name hasn't been set yet")
         return self._name
 
-    def register_interface(self, obj: Any) -> None:
-        if not self._interface_orig:
-            if obj.default_interface_root:
-                self._interface = '.'.join([obj.default_interface_root, obj._dbus_name])
-            else:
-                raise DBusObjectException(f'Missing interface in DBus method: {self.name}')
+    def bind_interface(self, obj: Any) -> Any:
+        '''
+        Descriptor with the interface resolved for the object
+
+        Descriptors without an explicit interface use the default interface
+        root and name of the object. The descriptor is shared by all the
+        instances of the class, so it is never modified: a copy with the
+        interface set is returned instead.
+
+        :param obj: object
+        '''
+        if self._interface_orig:
+            return self
+        if not obj.default_interface_root:
+            raise DBusObjectException(f'Missing interface in DBus method: {self.name}')
+        bound = copy.copy(self)
+        bound._interface = sys.intern('.'.join([obj.default_interface_root, obj._dbus_name]))
+        return bound
 
     def __set_name__(self, obj_type: Any, name: str) -> None:
         if not issubclass(obj_type, DBusObject):
             raise DBusObjectException(
                 f'The {self.__class__.__name__} decorator can only be used inside DBusObject'
             )
+        # the owner collects its descriptors in DBusObject.__init_subclass__
         self._owner = obj_type
         self._descriptor_name = name
 
-        # get the method list for our type and initialize it if necessary
-        assert self._list_name
-        self._method_list = getattr(self._owner, self._list_name) or []
-        setattr(self._owner, self._list_name, self._method_list)
-
-        # add ourselves to the owner method list
-        self._method_list.append((self._descriptor_name, self))
-
     def __get__(self, obj: Any, obj_type: Any = None) -> Any:
         raise NotImplementedError('This should be implemented in a subclass')
 
@@ -78,26 +101,161 @@ class _DBusMethodBase(_DBusDescriptorBase):
         name: Optional[str] = None,
         return_names: Optional[Sequence[str]] = None,
         multiple_returns: bool = False,
+        policy: Optional[dbus_objects.policy.Policy] = None,
     ) -> None:
         super().__init__(interface, name if name else func.__name__)
         self._func = func
         self._return_names = return_names or []
         self._multiple_returns = multiple_returns
+        self._policy = policy
+
+        self._signatures: Optional[Tuple[dbus_objects.signature.DBusSignature, dbus_objects.signature.DBusSignature]] = None
+        self._argument_converter: Optional[Callable[[Any], Any]] = None
+        self._return_converter: Optional[Callable[[Any], Any]] = None
+        # known without resolving the signatures when loaded from the manifest
+        self._signature_strings: Optional[Tuple[str, str]] = None
+        self._converts_arguments: Optional[bool] = None
+        self._converts: Optional[bool] = None
+        self._xml: Optional[ET.Element] = None
+        self._xml_fragment: Optional[str] = None
+        # with a manifest, the signatures are resolved (or loaded) once the class is created
+        if dbus_objects.manifest.active_manifest() is None:
+            self._resolve()
+
+    def _resolve(self) -> Tuple[dbus_objects.signature.DBusSignature, dbus_objects.signature.DBusSignature]:
+        '''
+        Resolves the signatures from the function annotations
+        '''
+        if self._signatures is None:
+            input_signature = dbus_objects.signature.DBusSignature.from_parameters(
+                self._func,
+            )
+            output_signature = dbus_objects.signature.DBusSignature.from_return(
+                self._func,
+                self._return_names,
+                self._multiple_returns,
+            )
+            self._argument_converter = input_signature.argument_converter()
+            self._return_converter = output_signature.return_converter(self._multiple_returns)
+            self._converts_arguments = self._argument_converter is not None
+            self._converts = self._return_converter is not None
+            self._signature_strings = (str(input_signature), str(output_signature))
+            self._signatures = (input_signature, output_signature)
+        return self._signatures
 
-        self._input_signature = dbus_objects.signature.DBusSignature.from_parameters(
-            self._func,
-        )
-        self._output_signature = dbus_objects.signature.DBusSignature.from_return(
-            self._func,
+    @property
+    def _input_signature(self) -> dbus_objects.signature.DBusSignature:
+        return self._resolve()[0]
+
+    @property
+    def _output_signature(self) -> dbus_objects.signature.DBusSignature:
+        return self._resolve()[1]
+
+    def _get_signature_strings(self) -> Tuple[str, str]:
+        if self._signature_strings is None:
+            self._resolve()
+            assert self._signature_strings is not None
+        return self._signature_strings
+
+    def _manifest_fingerprint(self) -> str:
+        '''
+        Description of everything the manifest entry depends on
+        '''
+        return repr((
+            type(self).__name__,
+            self._name,
             self._return_names,
             self._multiple_returns,
-        )
+            dbus_objects.manifest._func_fingerprint(self._func),
+        ))
+
+    def _manifest_entry(self) -> Dict[str, Any]:
+        '''
+        Resolved member, as stored in the manifest
+        '''
+        input_signature, output_signature = self._resolve()
+        return {
+            'signature': list(self._get_signature_strings()),
+            'names': [list(input_signature.names or []), list(output_signature.names or [])],
+            'converts': [self._converts_arguments, self._converts],
+            'xml': ET.tostring(self.xml).decode(),
+        }
+
+    def _load_manifest(self, entry: Dict[str, Any]) -> None:
+        '''
+        Takes the resolved member from the manifest, unless it was already
+        resolved
+
+        :param entry: member entry of the manifest
+        '''
+        if self._signatures is not None:
+            return
+        input_signature, output_signature = entry['signature']
+        self._signature_strings = (input_signature, output_signature)
+        converts_arguments, converts = entry['converts']
+        self._converts_arguments = bool(converts_arguments)
+        self._converts = bool(converts)
+        self._xml_fragment = entry['xml']
+
+    @property
+    def xml(self) -> ET.Element:
+        if self._xml is None:
+            if self._xml_fragment is not None:
+                self._xml = ET.fromstring(self._xml_fragment)
+            else:
+                self._xml = self._build_xml()
+        return self._xml
+
+    def _build_xml(self) -> ET.Element:
+        raise NotImplementedError('This should be implemented in a subclass')
+
+    def convert_arguments(self, args: Sequence[Any]) -> Sequence[Any]:
+        '''
+        Turns the arguments received over DBus into the annotated types (eg.
+        structs into ``typing.NamedTuple`` or dataclass instances)
+
+        :param args: arguments, as received from jeepney
+        '''
+        if self._converts_arguments is False:
+            return args
+        self._resolve()
+        if self._argument_converter is None:
+            return args
+        return self._argument_converter(args)  # type: ignore
+
+    def convert_return(self, value: Any) -> Any:
+        '''
+        Encodes the variants (see :func:`dbus_objects.signature.variant`) and
+        dataclasses in a value returned by the function
+
+        :param value: returned value
+        '''
+        if value is None or self._converts is False:
+            return value
+        self._resolve()
+        if self._return_converter is None:
+            return value
+        return self._return_converter(value)
+
+    @property
+    def policy(self) -> Optional[dbus_objects.policy.Policy]:
+        return self._policy
+
+    @property
+    def multiple_returns(self) -> bool:
+        return self._multiple_returns
 
     def __get__(self, obj: Any, obj_type: Any = None) -> Any:
         if obj is None:
             return self._func
-        # construct interface from obj
-        self.register_interface(obj)
+        return types.MethodType(self._func, obj)
+
+    def bind(self, obj: Any) -> Callable[..., Any]:
+        '''
+        Function exported over DBus, bound to the object
+
+        :param obj: object
+        '''
         return types.MethodType(self._func, obj)
 
 
@@ -112,19 +270,107 @@ class _DBusMethod(_DBusMethodBase):
         name: Optional[str] = None,
         return_names: Optional[Sequence[str]] = None,
         multiple_returns: bool = False,
+        priority: int = Priority.NORMAL,
+        rate_limit: Optional[Tuple[float, float]] = None,
+        policy: Optional[dbus_objects.policy.Policy] = None,
+        batch: bool = False,
+        timeout: Optional[float] = None,
     ) -> None:
-        super().__init__(func, interface, name, return_names, multiple_returns)
-        self._list_name = '_dbus_methods'
+        super().__init__(func, interface, name, return_names, multiple_returns, policy)
+        self._priority = priority
+        if rate_limit is not None and (rate_limit[0] <= 0 or rate_limit[1] < 1):
+            raise ValueError(f'Invalid rate_limit, the rate must be positive and the burst at least 1: {rate_limit}')
+        self._rate_limit = rate_limit
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f'Invalid timeout, must be positive: {timeout}')
+        self._timeout = timeout
+        self._batch = batch
+        self._batch_func: Optional[Callable[[Any, List[Tuple[Any, ...]]], Any]] = None
+
+    def __set_name__(self, obj_type: Any, name: str) -> None:
+        super().__set_name__(obj_type, name)
+        if self._batch:
+            companion = self._batch_method()
+            setattr(obj_type, f'_{name}_dbus_batch', companion)
+            companion.__set_name__(obj_type, f'_{name}_dbus_batch')
+
+    def batch_implementation(self, func: Callable[[Any, List[Tuple[Any, ...]]], Any]) -> _DBusMethod:
+        '''
+        Decorator that registers a vectorized implementation for the batch
+        companion method (implies ``batch``)
+
+        Works like the setter of :meth:`property`, the function must have the
+        same name as the method. The function receives the list of argument tuples and must return the
+        list of result tuples, in the same order.
+        '''
+        self._batch = True
+        self._batch_func = func
+        return self
+
+    def _batch_method(self) -> _DBusMethod:
+        '''
+        Creates the ``<Name>Batch`` companion method, which takes an array of
+        argument structs and returns an array of result structs
+        '''
+        parameters = list(inspect.signature(self._func).parameters.values())[1:]
+        if not parameters:
+            raise DBusObjectException(f'Batch methods need at least one argument: {self.name}')
+        inputs = [parameter.annotation for parameter in parameters]
+        return_annotation = inspect.signature(self._func).return_annotation
+        if not return_annotation or return_annotation is inspect.Signature.empty:
+            outputs = []
+        elif self._multiple_returns:
+            outputs = list(typing.get_args(return_annotation))
+        else:
+            outputs = [return_annotation]
+
+        func, batch_func, multiple_returns = self._func, self._batch_func, self._multiple_returns
+
+        def batch(obj: Any, calls: List[Tuple[Any, ...]]) -> Any:
+            if batch_func is not None:
+                return batch_func(obj, calls)
+            results = []
+            for args in calls:
+                value = func(obj, *args)
+                results.append(value if multiple_returns else (value,))
+            return results if outputs else None
+
+        batch.__name__ = f'{self.name}Batch'
+        batch.__signature__ = inspect.Signature(  # type: ignore
+            [
+                inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+                inspect.Parameter('calls', inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                                  annotation=List[Tuple[tuple(inputs)]]),  # type: ignore
+            ],
+            return_annotation=List[Tuple[tuple(outputs)]] if outputs else None,  # type: ignore
+        )
+        return _DBusMethod(
+            batch,
+            self._interface_orig,
+            f'{self.name}Batch',
+            priority=self._priority,
+            rate_limit=self._rate_limit,
+            policy=self._policy,
+            timeout=self._timeout,
+        )
 
     @property
     def signature(self) -> Tuple[str, str]:
-        return str(self._input_signature), str(self._output_signature)
+        return self._get_signature_strings()
 
     @property
-    def xml(self) -> ET.Element:
-        if not self._input_signature or not self._output_signature:
-            raise ValueError("Signature hasn't been set yet")
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def rate_limit(self) -> Optional[Tuple[float, float]]:
+        return self._rate_limit
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return self._timeout
 
+    def _build_xml(self) -> ET.Element:
         xml = ET.Element('method', {'name': self.name})
 
         for direction, signature, names in (
@@ -144,11 +390,116 @@ class _DBusMethod(_DBusMethodBase):
         return xml
 
 
+class _DBusStreamMethod(_DBusMethod):
+    '''
+    Descriptor class that implements a DBus method backed by a generator
+
+    Over DBus, the method returns a cursor and the items are fetched in chunks
+    with the ``<Name>Next`` companion method, which returns the next chunk and
+    whether the stream is over (the last chunk may be empty). ``<Name>Cancel``
+    drops the cursor early. Items are only produced when the client asks for
+    them, so at most one chunk per cursor is in memory, and cursors are closed
+    when their client disconnects.
+
+    From python, the method still returns the generator.
+    '''
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        interface: Optional[str] = None,
+        name: Optional[str] = None,
+        chunk_size: int = 1024,
+        priority: int = Priority.NORMAL,
+        rate_limit: Optional[Tuple[float, float]] = None,
+        policy: Optional[dbus_objects.policy.Policy] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError(f'Invalid chunk_size, must be at least 1: {chunk_size}')
+        signature = inspect.signature(func)
+        item_types = typing.get_args(signature.return_annotation)
+        if not item_types:
+            raise DBusObjectException(f'Generator methods must be annotated with Iterator[...]: {func}')
+        self._generator = func
+        self._item_type = item_types[0]
+        self._chunk_size = chunk_size
+
+        def open_stream(obj: Any, *args: Any) -> int:
+            import dbus_objects.integration  # circular import
+
+            context = dbus_objects.integration.current_call()
+            return context.server.open_stream(func(obj, *args), chunk_size, context.bus, context.sender)
+
+        open_stream.__signature__ = signature.replace(  # type: ignore
+            return_annotation=dbus_objects.types.UInt64,
+        )
+        super().__init__(
+            open_stream, interface, name or func.__name__, ['cursor'],
+            priority=priority, rate_limit=rate_limit, policy=policy, timeout=timeout,
+        )
+
+    def __get__(self, obj: Any, obj_type: Any = None) -> Any:
+        if obj is None:
+            return self._generator
+        return types.MethodType(self._generator, obj)
+
+    def __set_name__(self, obj_type: Any, name: str) -> None:
+        super().__set_name__(obj_type, name)
+        for suffix, companion in (('next', self._next_method()), ('cancel', self._cancel_method())):
+            attribute = f'_{name}_dbus_{suffix}'
+            setattr(obj_type, attribute, companion)
+            companion.__set_name__(obj_type, attribute)
+
+    def _next_method(self) -> _DBusMethod:
+        def next_chunk(obj: Any, cursor: int) -> Tuple[List[Any], bool]:
+            import dbus_objects.integration  # circular import
+
+            context = dbus_objects.integration.current_call()
+            return context.server.next_stream_chunk(cursor, context.bus, context.sender)
+
+        next_chunk.__signature__ = inspect.Signature(  # type: ignore
+            [
+                inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+                inspect.Parameter('cursor', inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                                  annotation=dbus_objects.types.UInt64),
+            ],
+            return_annotation=dbus_objects.types.MultipleReturn[List[self._item_type], bool],  # type: ignore
+        )
+        return _DBusMethod(
+            next_chunk, self._interface_orig, f'{self.name}Next', ['items', 'done'], True,
+            priority=self._priority, rate_limit=self._rate_limit, policy=self._policy, timeout=self._timeout,
+        )
+
+    def _cancel_method(self) -> _DBusMethod:
+        def cancel(obj: Any, cursor: int) -> None:
+            import dbus_objects.integration  # circular import
+
+            context = dbus_objects.integration.current_call()
+            context.server.close_stream(cursor, context.bus, context.sender)
+
+        cancel.__signature__ = inspect.Signature(  # type: ignore
+            [
+                inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+                inspect.Parameter('cursor', inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                                  annotation=dbus_objects.types.UInt64),
+            ],
+            return_annotation=None,
+        )
+        return _DBusMethod(
+            cancel, self._interface_orig, f'{self.name}Cancel',
+            priority=self._priority, policy=self._policy,
+        )
+
+
 class _DBusProperty(_DBusMethodBase):
     '''
     Descriptor class that implements a DBus property
 
     Works like a simpler :meth:`property`
+
+    When caching is enabled, the last value returned by the getter is stored
+    in the object and served until it gets older than ``max_age`` or until
+    it is invalidated, either explicitly or by calling the setter.
     '''
     def __init__(
         self,
@@ -157,22 +508,34 @@ class _DBusProperty(_DBusMethodBase):
         name: Optional[str] = None,
         return_names: Optional[Sequence[str]] = None,
         multiple_returns: bool = False,
+        cache: bool = False,
+        max_age: Optional[float] = None,
+        policy: Optional[dbus_objects.policy.Policy] = None,
     ) -> None:
-        super().__init__(func, interface, name, return_names, multiple_returns)
-        self._list_name = '_dbus_properties'
+        super().__init__(func, interface, name, return_names, multiple_returns, policy)
         self._setter: Optional[Callable[[Any, Any], Any]] = None
+        if max_age is not None and max_age < 0:
+            raise ValueError(f'Invalid max_age, must not be negative: {max_age}')
+        self._cache = cache or max_age is not None
+        self._max_age = max_age
         # TODO: Verify signature
         # TODO: Allow emiting a signal when the value changes
 
     @property
     def signature(self) -> str:
-        return str(self._output_signature)
+        return self._get_signature_strings()[1]
 
     @property
-    def xml(self) -> ET.Element:
-        if not self._input_signature or not self._output_signature:
-            raise ValueError("Signature hasn't been set yet")
+    def cached(self) -> bool:
+        return self._cache
+
+    def _manifest_fingerprint(self) -> str:
+        return repr((
+            super()._manifest_fingerprint(),
+            dbus_objects.manifest._func_fingerprint(self._setter) if self._setter else None,
+        ))
 
+    def _build_xml(self) -> ET.Element:
         xml = ET.Element('property', {
             'name': self.name,
             'type': self.signature,
@@ -186,12 +549,27 @@ class _DBusProperty(_DBusMethodBase):
     def __get__(self, obj: Any, obj_type: Any = None) -> Any:
         if obj is None:
             return self._func(obj)
-        return self._func(obj)
+        if not self._cache:
+            return self._func(obj)
+
+        cache = obj._dbus_property_cache
+        if cache is None:
+            cache = obj._dbus_property_cache = {}
+        now = time.monotonic()
+        entry = cache.get(self._descriptor_name)
+        if entry is not None:
+            timestamp, value = entry
+            if self._max_age is None or now - timestamp < self._max_age:
+                return value
+        value = self._func(obj)
+        cache[self._descriptor_name] = (now, value)
+        return value
 
     def __set__(self, obj: Any, value: Any) -> None:
         if self._setter is None:
             raise AttributeError(f'{self._descriptor_name} has no setter')
         self._setter(obj, value)
+        self.invalidate(obj)
 
     def setter(self, value: Callable[[Any, Any], Any]) -> _DBusProperty:
         '''
@@ -200,8 +578,18 @@ class _DBusProperty(_DBusMethodBase):
         Works just like the built-in :meth:`property`
         '''
         self._setter = value
+        self._xml = None
         return self
 
+    def invalidate(self, obj: Any) -> None:
+        '''
+        Drops the cached value of the property for the given object
+
+        :param obj: object holding the cached value
+        '''
+        if self._cache and obj._dbus_property_cache:
+            obj._dbus_property_cache.pop(self._descriptor_name, None)
+
 
 # TODO: _DBusSignal
 
@@ -211,6 +599,12 @@ def dbus_method(
     name: Optional[str] = None,
     return_names: Optional[Sequence[str]] = None,
     multiple_returns: bool = False,
+    priority: int = Priority.NORMAL,
+    rate_limit: Optional[Tuple[float, float]] = None,
+    policy: Optional[dbus_objects.policy.Policy] = None,
+    batch: bool = False,
+    chunk_size: int = 1024,
+    timeout: Optional[float] = None,
 ) -> Callable[[Callable[..., Any]], _DBusMethod]:
     '''
     This decorator exports a function as a DBus method
@@ -225,9 +619,31 @@ def dbus_method(
     :param name: DBus method name
     :param return_names: Names of the return arguments
     :param multiple_returns: Returns multiple parameters
+    :param priority: Dispatch priority (see :class:`Priority`)
+    :param rate_limit: Calls per second and burst size allowed for the method
+                       (all callers together)
+    :param policy: Access control policy, checked against the caller
+                   credentials before the call is dispatched
+    :param batch: Also export a ``<Name>Batch`` method that takes an array of
+                  argument structs and returns an array of result structs, so
+                  clients can make many calls in one round-trip (see
+                  :meth:`_DBusMethod.batch_implementation`)
+    :param chunk_size: Number of items per chunk of generator methods, which
+                       are streamed to the client (see :class:`_DBusStreamMethod`)
+    :param timeout: Seconds the client is expected to wait for the reply,
+                    calls still queued after that are dropped with a timeout
+                    error (overrides the server default)
     '''
     def decorator(func: Callable[..., Any]) -> _DBusMethod:
-        return _DBusMethod(func, interface, name, return_names, multiple_returns)
+        if inspect.isgeneratorfunction(func):
+            if return_names is not None or multiple_returns or batch:
+                raise DBusObjectException(
+                    f'Generator methods do not support return_names, multiple_returns nor batch: {func}'
+                )
+            return _DBusStreamMethod(func, interface, name, chunk_size, priority, rate_limit, policy, timeout)
+        return _DBusMethod(
+            func, interface, name, return_names, multiple_returns, priority, rate_limit, policy, batch, timeout
+        )
     return decorator
 
 
@@ -236,19 +652,30 @@ def dbus_property(
     name: Optional[str] = None,
     return_names: Optional[Sequence[str]] = None,
     multiple_returns: bool = False,
+    cache: bool = False,
+    max_age: Optional[float] = None,
+    policy: Optional[dbus_objects.policy.Policy] = None,
 ) -> Callable[[Callable[..., Any]], _DBusProperty]:
     '''
     This decorator exports a method as a DBus property
 
     Works just like :meth:`dbus_method` and :meth:`property`
 
+    Expensive getters can enable caching, the value will then be kept until
+    it is older than ``max_age`` seconds, the setter is called or
+    :meth:`DBusObject.invalidate_dbus_property` is called.
+
     :param interface: DBus interface name
     :param name: DBus method name
     :param return_names: Names of the return arguments
     :param multiple_returns: Returns multiple parameters
+    :param cache: Cache the value returned by the getter
+    :param max_age: Maximum age of the cached value in seconds (implies ``cache``)
+    :param policy: Access control policy, applies to the ``org.freedesktop.DBus.Properties``
+                   calls on the property
     '''
     def decorator(func: Callable[..., Any]) -> _DBusProperty:
-        return _DBusProperty(func, interface, name, return_names, multiple_returns)
+        return _DBusProperty(func, interface, name, return_names, multiple_returns, cache, max_age, policy)
     return decorator
 
 
@@ -263,15 +690,121 @@ _DBusPropertyTuple = Tuple[
 ]  # getter, setter, descriptor
 
 
+class _DBusMemberTable():
+    '''
+    DBus methods and properties of a class, by interface and name
+
+    Built once per class, interface root and object name, and shared by all
+    the instances with them, so registering an object does not copy any of
+    its members. The descriptors have their interface resolved (see
+    :meth:`_DBusDescriptorBase.bind_interface`) and the table is read-only.
+    '''
+    __slots__ = ('methods', 'properties', 'has_policies')
+
+    def __init__(self, obj: DBusObject) -> None:
+        '''
+        :param obj: object to build the table from
+        '''
+        methods: Dict[str, Dict[str, _DBusMethod]] = {}
+        properties: Dict[str, Dict[str, Tuple[str, _DBusProperty]]] = {}
+        self.has_policies = False
+        for _method_name, method in obj._dbus_methods:
+            method = method.bind_interface(obj)
+            methods.setdefault(method.interface, {})[sys.intern(method.name)] = method
+            self.has_policies |= method.policy is not None
+        for property_name, prop in obj._dbus_properties:
+            prop = prop.bind_interface(obj)
+            properties.setdefault(prop.interface, {})[sys.intern(prop.name)] = (property_name, prop)
+            self.has_policies |= prop.policy is not None
+        self.methods: Mapping[str, Mapping[str, _DBusMethod]] = types.MappingProxyType({
+            interface: types.MappingProxyType(members) for interface, members in methods.items()
+        })
+        # interface -> name -> (attribute name, descriptor)
+        self.properties: Mapping[str, Mapping[str, Tuple[str, _DBusProperty]]] = types.MappingProxyType({
+            interface: types.MappingProxyType(members) for interface, members in properties.items()
+        })
+
+
 class DBusObject():
     '''
     This class represents a DBus object. It should be subclassed and to export
     DBus methods, you must define typed functions with the
     :meth:`dbus_objects.object.dbus_object` decorator.
     '''
-    # type -> method name list
-    _dbus_methods: Optional[List[_DBusMethodTupleInternal]] = None
-    _dbus_properties: Optional[List[_DBusPropertyTupleInternal]] = None
+    __slots__ = ('is_dbus_object', '_dbus_name', 'default_interface_root', '_dbus_property_cache', '__weakref__')
+
+    # (attribute name, descriptor) of the class and its bases, collected when the class is created
+    _dbus_methods: List[_DBusMethodTupleInternal] = []
+    _dbus_properties: List[_DBusPropertyTupleInternal] = []
+    # (default interface root, DBus name) -> member table, filled as instances get registered
+    _dbus_member_tables: Dict[Tuple[Optional[str], str], _DBusMemberTable] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # attributes overridden by subclasses replace the ones from the bases, even if they aren't descriptors
+        descriptors: Dict[str, _DBusDescriptorBase] = {}
+        for klass in reversed(cls.__mro__):
+            for attribute, value in vars(klass).items():
+                if isinstance(value, _DBusDescriptorBase):
+                    descriptors[attribute] = value
+                else:
+                    descriptors.pop(attribute, None)
+        cls._dbus_methods = [
+            (attribute, descriptor)
+            for attribute, descriptor in descriptors.items()
+            if isinstance(descriptor, _DBusMethod)
+        ]
+        cls._dbus_properties = [
+            (attribute, descriptor)
+            for attribute, descriptor in descriptors.items()
+            if isinstance(descriptor, _DBusProperty)
+        ]
+        cls._dbus_member_tables = {}
+        manifest = dbus_objects.manifest.active_manifest()
+        if manifest is not None:
+            cls._dbus_use_manifest(manifest, descriptors)
+
+    @classmethod
+    def _dbus_use_manifest(
+        cls,
+        manifest: dbus_objects.manifest.Manifest,
+        descriptors: Dict[str, _DBusDescriptorBase],
+    ) -> None:
+        '''
+        Loads the resolved members from the manifest, or resolves them and
+        updates the manifest if the entry of the class is missing or stale
+
+        :param manifest: manifest in use
+        :param descriptors: attribute name -> descriptor of the class
+        '''
+        members = {
+            attribute: descriptor
+            for attribute, descriptor in descriptors.items()
+            if isinstance(descriptor, _DBusMethodBase)
+        }
+        name = f'{cls.__module__}.{cls.__qualname__}'
+        key = dbus_objects.manifest._class_key(name, (
+            (attribute, descriptor._manifest_fingerprint())
+            for attribute, descriptor in members.items()
+        ))
+        entries = manifest.lookup(name, key)
+        if entries is not None and entries.keys() == members.keys():
+            try:
+                for attribute, descriptor in members.items():
+                    descriptor._load_manifest(entries[attribute])
+                return
+            except (KeyError, TypeError, ValueError):
+                # malformed entry, resolve everything again
+                for descriptor in members.values():
+                    if descriptor._signatures is None:
+                        descriptor._signature_strings = None
+                        descriptor._converts = None
+                        descriptor._converts_arguments = None
+                        descriptor._xml_fragment = None
+        manifest.store(name, key, {
+            attribute: descriptor._manifest_entry()
+            for attribute, descriptor in members.items()
+        })
 
     def __init__(self, name: Optional[str] = None, default_interface_root: Optional[str] = None):
         '''
@@ -281,37 +814,61 @@ class DBusObject():
         :param name: DBus object name
         '''
         self.is_dbus_object = True
-        self._dbus_name = dbus_objects.signature.dbus_case(
+        self._dbus_name = sys.intern(dbus_objects.signature.dbus_case(
             name if name else type(self).__name__
-        )
-        self.default_interface_root = default_interface_root
+        ))
+        self.default_interface_root = sys.intern(default_interface_root) if default_interface_root else None
+        # property name -> (timestamp, value), created on first use
+        self._dbus_property_cache: Optional[Dict[str, Tuple[float, Any]]] = None
 
     @property
     def dbus_name(self) -> str:
         return self._dbus_name
 
+    def invalidate_dbus_property(self, name: Optional[str] = None) -> None:
+        '''
+        Invalidates the cached value of a property, or of all properties if
+        no name is given
+
+        :param name: property attribute name
+        '''
+        if not self._dbus_property_cache:
+            return
+        if name is None:
+            self._dbus_property_cache.clear()
+        else:
+            self._dbus_property_cache.pop(name, None)
+
+    def _dbus_member_table(self) -> _DBusMemberTable:
+        '''
+        Methods and properties of the object, shared with the other instances
+        of the class with the same interface root and name
+        '''
+        key = (self.default_interface_root, self._dbus_name)
+        table = self._dbus_member_tables.get(key)
+        if table is None:
+            table = self._dbus_member_tables[key] = _DBusMemberTable(self)
+        return table
+
     def get_dbus_methods(self) -> Generator[_DBusMethodTuple, _DBusMethodTuple, None]:
         '''
         Generator that provides the DBus methods
         '''
-        if not self._dbus_methods:
-            return
-        for method_name, descriptor in self._dbus_methods:
-            yield getattr(self, method_name), descriptor
+        for methods in self._dbus_member_table().methods.values():
+            for descriptor in methods.values():
+                yield descriptor.bind(self), descriptor
 
     def get_dbus_properties(self) -> Generator[_DBusPropertyTuple, _DBusPropertyTuple, None]:
         '''
         Generator that provides the DBus properties
         '''
-        if not self._dbus_properties:
-            return
-        for property_name, descriptor in self._dbus_properties:
-            descriptor.register_interface(self)  # explicitely register the interface
-            yield (
-                lambda: getattr(self, property_name),
-                lambda value: setattr(self, property_name, value),
-                descriptor,
-            )
+        for properties in self._dbus_member_table().properties.values():
+            for property_name, descriptor in properties.values():
+                yield (
+                    lambda name=property_name: getattr(self, name),  # type: ignore
+                    lambda value, name=property_name: setattr(self, name, value),  # type: ignore
+                    descriptor,
+                )
 
 
 class DBusObjectException(Exception):
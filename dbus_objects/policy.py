@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: MIT
+
+from typing import Any, Callable, Collection, Dict, Optional, Tuple
+
+
+class Credentials():
+    '''
+    Credentials of the process on the other end of a connection, as reported
+    by the bus (``org.freedesktop.DBus.GetConnectionCredentials``)
+    '''
+    def __init__(
+        self,
+        uid: Optional[int] = None,
+        gids: Collection[int] = (),
+        pid: Optional[int] = None,
+    ) -> None:
+        '''
+        :param uid: Unix user ID
+        :param gids: Unix group IDs
+        :param pid: process ID
+        '''
+        self.uid = uid
+        self.gids = frozenset(gids)
+        self.pid = pid
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(uid={self.uid}, gids={sorted(self.gids)}, pid={self.pid})'
+
+    @classmethod
+    def from_dbus(cls, credentials: Dict[str, Tuple[str, Any]]) -> 'Credentials':
+        '''
+        Creates the credentials from the ``GetConnectionCredentials`` reply
+
+        :param credentials: credentials dictionary, with the values as (signature, value) variants
+        '''
+        values = {key: value for key, (_signature, value) in credentials.items()}
+        return cls(
+            values.get('UnixUserID'),
+            values.get('UnixGroupIDs', ()),
+            values.get('ProcessID'),
+        )
+
+
+class Policy():
+    '''
+    Access control policy of a DBus method or property
+
+    The caller is allowed if its user is in ``uids`` or any of its groups is
+    in ``gids`` (when either is given), and ``check`` returns ``True`` (when
+    given).
+    '''
+    def __init__(
+        self,
+        uids: Optional[Collection[int]] = None,
+        gids: Optional[Collection[int]] = None,
+        check: Optional[Callable[[Credentials], bool]] = None,
+    ) -> None:
+        '''
+        :param uids: allowed Unix user IDs
+        :param gids: allowed Unix group IDs
+        :param check: callback that receives the caller credentials
+        '''
+        self._uids = frozenset(uids) if uids is not None else None
+        self._gids = frozenset(gids) if gids is not None else None
+        self._check = check
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(uids={self._uids}, gids={self._gids}, check={self._check})'
+
+    def allows(self, credentials: Credentials) -> bool:
+        '''
+        Whether the caller is allowed
+
+        :param credentials: caller credentials
+        '''
+        if self._uids is not None or self._gids is not None:
+            if not (
+                (self._uids is not None and credentials.uid in self._uids)
+                or (self._gids is not None and not self._gids.isdisjoint(credentials.gids))
+            ):
+                return False
+        return self._check is None or bool(self._check(credentials))
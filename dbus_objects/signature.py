@@ -2,11 +2,13 @@
 
 from __future__ import annotations
 
+import dataclasses
 import inspect
+import operator
 import sys
 import typing
 
-from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Type
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
 
 import dbus_objects.object
 import dbus_objects.types
@@ -18,6 +20,289 @@ if sys.version_info < (3, 8):
     typing.get_origin = typing_extensions.get_origin
 
 
+_Converter = Callable[[Any], Any]
+
+# python type -> (signature, value converter), subclasses are added on first use
+_VARIANT_TYPES: Dict[type, Tuple[str, Optional[_Converter]]] = {
+    bool: ('b', None),
+    float: ('d', None),
+    str: ('s', None),
+    bytes: ('ay', None),
+}
+
+
+def register_variant_type(typ: type, signature: str, convert: Optional[_Converter] = None) -> None:
+    '''
+    Sets how values of a type are encoded in variants
+
+    :param typ: python type
+    :param signature: DBus signature
+    :param convert: function that converts the value to the type expected by
+                    the signature
+    '''
+    _VARIANT_TYPES[typ] = (signature, convert)
+    _SHAPES.clear()
+
+
+class EncodedVariant(typing.NamedTuple):
+    '''
+    Value already encoded for a variant, see :func:`variant`
+
+    Values returned in variant positions are only sent as they are when
+    wrapped in this type, plain tuples are structs.
+    '''
+    signature: str
+    value: Any
+
+
+# struct type -> (attribute name, annotation) of its fields
+_STRUCT_FIELDS: Dict[type, List[Tuple[str, Any]]] = {}
+# annotation -> converter, built once per type
+_ENCODERS: Dict[Any, Optional[_Converter]] = {}
+_DECODERS: Dict[Any, Optional[_Converter]] = {}
+# shape of a container value (see _shape) -> signature
+_SHAPES: Dict[Hashable, str] = {}
+_SHAPES_SIZE = 1024
+
+
+def _is_struct(typ: Any) -> bool:
+    '''
+    Whether the type is a ``typing.NamedTuple`` or a dataclass, which map to
+    DBus structs
+    '''
+    if not isinstance(typ, type):
+        return False
+    return (issubclass(typ, tuple) and hasattr(typ, '_fields')) or dataclasses.is_dataclass(typ)
+
+
+def struct_fields(typ: type) -> List[Tuple[str, Any]]:
+    '''
+    Fields of a ``typing.NamedTuple`` or dataclass that make up its DBus
+    struct, in order, as (attribute name, annotation) pairs
+
+    Dataclass fields with ``init=False`` are not part of the struct.
+
+    :param typ: struct type
+    '''
+    fields = _STRUCT_FIELDS.get(typ)
+    if fields is None:
+        hints = typing.get_type_hints(typ)
+        if dataclasses.is_dataclass(typ):
+            names = [field.name for field in dataclasses.fields(typ) if field.init]
+        else:
+            names = list(typ._fields)  # type: ignore
+        missing = [name for name in names if name not in hints]
+        if missing:
+            raise dbus_objects.object.DBusObjectException(
+                f'Struct fields are missing a type annotation: {", ".join(missing)} ({typ})'
+            )
+        fields = _STRUCT_FIELDS[typ] = [(name, hints[name]) for name in names]
+    return fields
+
+
+def _int_signature(value: int) -> str:
+    if -2**31 <= value < 2**31:
+        return 'i'
+    elif -2**63 <= value < 2**63:
+        return 'x'
+    return 't'
+
+
+def _unify(signatures: Iterable[str]) -> Optional[str]:
+    '''
+    Common signature of container items, ``None`` if they need to be variants
+    '''
+    unique = set(signatures)
+    if len(unique) == 1:
+        return unique.pop()
+    if unique and unique <= {'i', 'x', 't'}:
+        return 'x' if 't' not in unique else None
+    return None
+
+
+def _shape(value: Any) -> Optional[Hashable]:
+    '''
+    Type structure of a container made of the built-in types that are sent as
+    they are, ``None`` for anything else
+
+    Values of the same shape get the same signature.
+
+    :param value: python value
+    '''
+    typ = type(value)
+    if typ is int:
+        return _int_signature(value)
+    if typ is list:
+        items = _items_shape(value)
+        return None if items is None else (list, items)
+    if typ is dict:
+        keys = _items_shape(value)
+        values = _items_shape(value.values())
+        return None if keys is None or values is None else (dict, keys, values)
+    if typ is tuple:
+        fields = tuple(map(_shape, value))
+        return None if None in fields else (tuple, fields)
+    known = _VARIANT_TYPES.get(typ)
+    if known is not None and known[1] is None:
+        return typing.cast(Hashable, typ)
+    return None
+
+
+def _items_shape(items: typing.Collection[Any]) -> Optional[typing.FrozenSet[Hashable]]:
+    '''
+    Shapes of the items of a container, ``None`` if any of them has no shape
+    or if they have different types (they end up in variants anyway)
+
+    :param items: container items
+    '''
+    types = set(map(type, items))
+    if len(types) != 1:
+        return frozenset() if not types else None
+    typ = types.pop()
+    if typ is int:
+        # the values in between get the signatures of the ends, or of zero
+        low, high = min(items), max(items)
+        signatures = {_int_signature(low), _int_signature(high)}
+        if low <= 0 <= high:
+            signatures.add(_int_signature(0))
+        return frozenset(signatures)
+    if typ is list or typ is dict or typ is tuple:
+        shapes = frozenset(map(_shape, items))
+        return None if None in shapes else shapes
+    known = _VARIANT_TYPES.get(typ)
+    if known is not None and known[1] is None:
+        return frozenset((typ,))
+    return None
+
+
+def _encode(value: Any) -> Tuple[str, Any]:
+    '''
+    Infers the signature of a value and converts it for that signature
+
+    The signature of containers is cached per shape (see :func:`_shape`),
+    those that need no conversion are then sent without visiting every
+    item again.
+
+    :param value: python value
+    '''
+    typ = type(value)
+    if typ is list or typ is dict or typ is tuple:
+        shape = _shape(value)
+        if shape is not None:
+            signature = _SHAPES.get(shape)
+            if signature is None:
+                if len(_SHAPES) >= _SHAPES_SIZE:
+                    _SHAPES.clear()
+                signature, encoded = _infer(value)
+                _SHAPES[shape] = signature
+                return signature, encoded
+            # the items are only converted when they end up in variants
+            if 'v' not in signature:
+                return signature, value
+    return _infer(value)
+
+
+def _infer(value: Any) -> Tuple[str, Any]:  # noqa: C901
+    '''
+    Infers the signature of a value and converts it for that signature,
+    without looking at the shape cache
+
+    :param value: python value
+    '''
+    typ = type(value)
+    if typ is int:
+        return _int_signature(value), value
+    known = _VARIANT_TYPES.get(typ)
+    if known is not None:
+        signature, convert = known
+        return signature, convert(value) if convert else value
+    if typ is EncodedVariant:
+        return value.signature, value.value
+
+    if typ is list:
+        items = [_encode(item) for item in value]
+        item_signature = _unify(signature for signature, _item in items)
+        if item_signature is None:
+            return 'av', items
+        return 'a' + item_signature, [item for _signature, item in items]
+    elif typ is dict:
+        if not value:
+            return 'a{sv}', {}
+        key_signature = _unify(_encode(key)[0] for key in value)
+        values = {key: _encode(item) for key, item in value.items()}
+        value_signature = _unify(signature for signature, _item in values.values())
+        if key_signature not in ('s', 'i', 'x', 't', 'd', 'y', 'b'):
+            raise dbus_objects.object.DBusObjectException(f'Can\'t infer the DBus signature of the keys of {value}')
+        if value_signature is None:
+            return f'a{{{key_signature}v}}', values
+        return f'a{{{key_signature}{value_signature}}}', {key: item for key, (_signature, item) in values.items()}
+    elif typ is tuple:
+        items = [_encode(item) for item in value]
+        return '(' + ''.join(signature for signature, _item in items) + ')', tuple(item for _signature, item in items)
+
+    # subclasses of the known types (eg. enums), resolved once per type
+    if isinstance(value, int):
+        return _int_signature(value), int(value)
+    for base, (signature, convert) in list(_VARIANT_TYPES.items()):
+        if isinstance(value, base):
+            _VARIANT_TYPES[typ] = (signature, convert)
+            return signature, convert(value) if convert else value
+    for container in (list, dict, tuple):
+        if isinstance(value, container):
+            return _encode(container(value))
+    if _is_struct(typ):
+        return _encode(tuple(getattr(value, name) for name, _annotation in struct_fields(typ)))
+    raise dbus_objects.object.DBusObjectException(f'Can\'t infer the DBus signature of \'{typ}\'')
+
+
+def variant(value: Any, signature: Optional[str] = None) -> EncodedVariant:
+    '''
+    Encodes a value as a variant, inferring the signature from the python
+    value unless given
+
+    Values are mapped as ``bool`` -> ``b``, ``int`` -> ``i`` (``x`` or ``t``
+    if it does not fit), ``float`` -> ``d``, ``str`` -> ``s``, ``bytes`` ->
+    ``ay``, lists and dictionaries to arrays (of variants if the items have
+    different types) and tuples to structs. Other types can be added with
+    :func:`register_variant_type`. The result can be returned in variant
+    positions, it is sent as it is.
+
+    :param value: python value
+    :param signature: DBus signature, overrides the inference
+    '''
+    if signature is not None:
+        return EncodedVariant(signature, value)
+    return EncodedVariant(*_encode(value))
+
+
+def _to_variant(value: Any) -> Tuple[str, Any]:
+    return value if type(value) is EncodedVariant else _encode(value)
+
+
+def _tuple_converter(
+    items: Sequence[Optional[_Converter]],
+    getter: Optional[_Converter] = None,
+) -> _Converter:
+    '''
+    Function that converts the items of a tuple, each with its own converter
+
+    :param items: converter of each item, ``None`` to keep it as it is
+    :param getter: function that gets the tuple from the value
+    '''
+    if not any(items):
+        return getter if getter is not None else tuple
+    if getter is None:
+        getter = _identity
+    return lambda value: tuple(
+        convert(element) if convert else element
+        for convert, element in zip(items, getter(value))
+    )
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
 class DBusSignature():
     def __init__(
         self,
@@ -26,6 +311,8 @@ class DBusSignature():
     ) -> None:
         self._list = self._get_signatures(annotations)
         self._names = names
+        self._annotations = annotations
+        self._converters = [self._type_converter(annotation) for annotation in annotations]
 
     def __iter__(self) -> Iterator[Any]:
         return iter(self._list)
@@ -93,7 +380,7 @@ class DBusSignature():
         '''
         attr_class: type = typ if not typing.get_origin(typ) else typing.get_origin(typ)  # type: ignore
         args = typing.get_args(typ)
-        # TODO: Variants, File Descriptors, DBus Signature
+        # TODO: File Descriptors, DBus Signature
         if attr_class is dbus_objects.types.Variant:
             return 'v'
         elif attr_class is list:
@@ -106,6 +393,8 @@ class DBusSignature():
             return 's'
         elif attr_class is float:
             return 'd'
+        elif attr_class is bool:
+            return 'b'
         elif attr_class is int or attr_class is dbus_objects.types.Int32:
             return 'i'
         elif attr_class is dbus_objects.types.Byte:
@@ -122,9 +411,128 @@ class DBusSignature():
             return 'x'
         elif attr_class is dbus_objects.object.DBusObject:
             return 'o'
+        elif _is_struct(attr_class):
+            return '(' + ''.join(cls._type_signature(annotation) for _name, annotation in struct_fields(attr_class)) + ')'
 
         raise dbus_objects.object.DBusObjectException(f'Can\'t convert \'{typ}\' to a DBus signature')
 
+    @classmethod
+    def _type_converter(cls, typ: type) -> Optional[_Converter]:
+        '''
+        Builds a function that encodes the values of a python type for
+        jeepney, ``None`` if they can be sent as they are
+
+        Variants are encoded (values already encoded with :func:`variant` are
+        kept as they are) and dataclasses are turned into tuples. The
+        function is built once per type.
+
+        :param typ: python type
+        '''
+        if typ not in _ENCODERS:
+            _ENCODERS[typ] = cls._build_converter(typ)
+        return _ENCODERS[typ]
+
+    @classmethod
+    def _build_converter(cls, typ: type) -> Optional[_Converter]:  # noqa: C901
+        attr_class = typing.get_origin(typ) or typ
+        args = typing.get_args(typ)
+        if attr_class is dbus_objects.types.Variant:
+            return _to_variant
+        elif attr_class is list:
+            item_converter = cls._type_converter(args[0])
+            if item_converter is not None:
+                return lambda value: list(map(item_converter, value))
+        elif attr_class is dict:
+            value_converter = cls._type_converter(args[1])
+            if value_converter is not None:
+                return lambda value: {key: value_converter(element) for key, element in value.items()}
+        elif attr_class is tuple:
+            items = [cls._type_converter(arg) for arg in args]
+            if any(items):
+                return _tuple_converter(items)
+        elif _is_struct(attr_class):
+            fields = struct_fields(attr_class)
+            items = [cls._type_converter(annotation) for _name, annotation in fields]
+            if dataclasses.is_dataclass(attr_class):
+                getter = operator.attrgetter(*(name for name, _annotation in fields))
+                if len(fields) == 1:
+                    return _tuple_converter(items, lambda value: (getter(value),))
+                return _tuple_converter(items, getter)
+            if any(items):
+                return _tuple_converter(items)
+        return None
+
+    @classmethod
+    def _type_decoder(cls, typ: type) -> Optional[_Converter]:
+        '''
+        Builds a function that turns the values received from jeepney into
+        the python type, ``None`` if they can be used as they are
+
+        Structs annotated with a ``typing.NamedTuple`` or a dataclass are
+        turned into instances of it. The function is built once per type.
+
+        :param typ: python type
+        '''
+        if typ not in _DECODERS:
+            _DECODERS[typ] = cls._build_decoder(typ)
+        return _DECODERS[typ]
+
+    @classmethod
+    def _build_decoder(cls, typ: type) -> Optional[_Converter]:
+        attr_class = typing.get_origin(typ) or typ
+        args = typing.get_args(typ)
+        if attr_class is list:
+            item_decoder = cls._type_decoder(args[0])
+            if item_decoder is not None:
+                return lambda value: list(map(item_decoder, value))
+        elif attr_class is dict:
+            value_decoder = cls._type_decoder(args[1])
+            if value_decoder is not None:
+                return lambda value: {key: value_decoder(element) for key, element in value.items()}
+        elif attr_class is tuple:
+            items = [cls._type_decoder(arg) for arg in args]
+            if any(items):
+                return _tuple_converter(items)
+        elif _is_struct(attr_class):
+            items = [cls._type_decoder(annotation) for _name, annotation in struct_fields(attr_class)]
+            if dataclasses.is_dataclass(attr_class):
+                struct = attr_class
+                make: _Converter = lambda value: struct(*value)  # noqa: E731
+            else:
+                make = attr_class._make  # type: ignore
+            if any(items):
+                convert = _tuple_converter(items)
+                return lambda value: make(convert(value))
+            return make
+        return None
+
+    def argument_converter(self) -> Optional[_Converter]:
+        '''
+        Function that turns the arguments received from jeepney into the
+        annotated types, ``None`` if they can be passed as they are
+        '''
+        decoders = [self._type_decoder(annotation) for annotation in self._annotations]
+        if not any(decoders):
+            return None
+        return _tuple_converter(decoders)
+
+    def return_converter(self, multiple_returns: bool = False) -> Optional[_Converter]:
+        '''
+        Function that encodes the variants in a return value, ``None`` if the
+        signature has no variants
+
+        :param multiple_returns: the value holds multiple return arguments
+        '''
+        converters = self._converters
+        if not any(converters):
+            return None
+        if multiple_returns:
+            return lambda value: tuple(
+                convert(element) if convert else element
+                for convert, element in zip(converters, value)
+            )
+        return converters[0]
+
     @classmethod
     def _get_signatures(cls, args: Iterable[type]) -> List[str]:
         '''
@@ -1,5 +1,9 @@
 # SPDX-License-Identifier: MIT
 
+import threading
+import time
+import xml.etree.ElementTree as ET
+
 import pytest
 import xmldiff.main
 
@@ -82,3 +86,377 @@ def test_properties(base_server):
     assert get_all('interface') == {
         'Prop': ('s', 'some property'),
     }
+
+
+def test_add_name():
+    server = dbus_objects.integration.DBusServerBase(
+        bus='SESSION',
+        name='io.github.ffy00.dbus-objects.tests'
+    )
+    server.add_name('io.github.ffy00.dbus-objects.tests.other')
+    server.add_name('io.github.ffy00.dbus-objects.tests', bus='SYSTEM')
+
+    assert server.names == [
+        ('SESSION', 'io.github.ffy00.dbus-objects.tests'),
+        ('SESSION', 'io.github.ffy00.dbus-objects.tests.other'),
+        ('SYSTEM', 'io.github.ffy00.dbus-objects.tests'),
+    ]
+
+    with pytest.warns(Warning):
+        server.add_name('io.github.ffy00.dbus-objects.tests.other')
+
+
+class _MatchRecordingServer(dbus_objects.integration.DBusServerBase):
+    def __init__(self):
+        super().__init__(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+        self.rules = []
+
+    def _add_match(self, bus, rule):
+        self.rules.append(rule)
+
+    def _remove_match(self, bus, rule):
+        self.rules.remove(rule)
+
+
+def test_subscribe_signal():
+    server = _MatchRecordingServer()
+    received = []
+
+    owner_changed = server.subscribe_signal(
+        lambda *args: received.append(('owner', args)),
+        sender='org.freedesktop.DBus',
+        interface='org.freedesktop.DBus',
+        member='NameOwnerChanged',
+    )
+    duplicate = server.subscribe_signal(
+        lambda *args: received.append(('duplicate', args)),
+        sender='org.freedesktop.DBus',
+        interface='org.freedesktop.DBus',
+        member='NameOwnerChanged',
+    )
+    server.subscribe_signal(
+        lambda *args: received.append(('any', args)),
+        member='Changed',
+        arg0='something',
+    )
+
+    assert server.rules == [
+        "type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',member='NameOwnerChanged'",
+        "type='signal',member='Changed',arg0='something'",
+    ]
+
+    assert server.dispatch_signal(
+        'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus',
+        'org.freedesktop.DBus', 'NameOwnerChanged', ('name', 'old', 'new'),
+    )
+    assert received == [('owner', ('name', 'old', 'new')), ('duplicate', ('name', 'old', 'new'))]
+
+    received.clear()
+    assert not server.dispatch_signal('SESSION', ':1.1', '/', 'com.example', 'Changed', ('other',))
+    assert server.dispatch_signal('SESSION', ':1.1', '/', 'com.example', 'Changed', ('something',))
+    assert not server.dispatch_signal('SYSTEM', ':1.1', '/', 'com.example', 'Changed', ('something',))
+    assert received == [('any', ('something',))]
+
+    server.unsubscribe_signal(owner_changed)
+    assert len(server.rules) == 2
+    server.unsubscribe_signal(duplicate)
+    assert server.rules == ["type='signal',member='Changed',arg0='something'"]
+    assert not server.dispatch_signal(
+        'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus',
+        'org.freedesktop.DBus', 'NameOwnerChanged', ('name', 'old', 'new'),
+    )
+
+
+def test_subscribe_signal_well_known_sender():
+    server = _MatchRecordingServer()
+    received = []
+    subscription = server.subscribe_signal(received.append, sender='com.example.Name', member='Changed')
+    assert server.rules == [
+        "type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',member='NameOwnerChanged',"
+        "arg0='com.example.Name'",
+        "type='signal',sender='com.example.Name',member='Changed'",
+    ]
+
+    def owner_changed(old, new):
+        server.dispatch_signal(
+            'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus',
+            'org.freedesktop.DBus', 'NameOwnerChanged', ('com.example.Name', old, new),
+        )
+
+    # signals carry the unique name of the emitter
+    assert not server.dispatch_signal('SESSION', ':1.5', '/', 'com.example', 'Changed', ('first',))
+    owner_changed('', ':1.5')
+    assert server.dispatch_signal('SESSION', ':1.5', '/', 'com.example', 'Changed', ('second',))
+    owner_changed(':1.5', ':1.6')
+    assert not server.dispatch_signal('SESSION', ':1.5', '/', 'com.example', 'Changed', ('third',))
+    assert server.dispatch_signal('SESSION', ':1.6', '/', 'com.example', 'Changed', ('fourth',))
+    assert received == ['second', 'fourth']
+
+    server.unsubscribe_signal(subscription)
+    assert not server.rules
+    assert not server._name_owners
+
+
+def test_client_resources():
+    server = _MatchRecordingServer()
+    released = []
+
+    first = server.add_client_resource(':1.10', lambda: released.append('first'))
+    server.add_client_resource(':1.10', lambda: released.append('second'))
+    dropped = server.add_client_resource(':1.20', lambda: released.append('dropped'))
+    assert server.clients == [('SESSION', ':1.10'), ('SESSION', ':1.20')]
+    assert server.rules == [
+        "type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',member='NameOwnerChanged',arg0=':1.10'",
+        "type='signal',sender='org.freedesktop.DBus',interface='org.freedesktop.DBus',member='NameOwnerChanged',arg0=':1.20'",
+    ]
+
+    # removing the last resource stops watching the client
+    server.remove_client_resource(dropped)
+    assert server.clients == [('SESSION', ':1.10')]
+    assert len(server.rules) == 1
+
+    # name changes that are not a disconnection are ignored
+    server.dispatch_signal(
+        'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus',
+        'org.freedesktop.DBus', 'NameOwnerChanged', (':1.10', '', ':1.10'),
+    )
+    assert not released
+
+    server.dispatch_signal(
+        'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus',
+        'org.freedesktop.DBus', 'NameOwnerChanged', (':1.10', ':1.10', ''),
+    )
+    assert released == ['first', 'second']
+    assert not server.clients
+    assert not server.rules
+
+    server.remove_client_resource(first)  # already released, no-op
+
+
+def test_stream_limits():
+    server = _MatchRecordingServer()
+    server.set_stream_limits(per_client=2, total=3, idle_timeout=60)
+    closed = []
+
+    class Items():
+        def __init__(self, name):
+            self.name = name
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            return self.name
+
+        def close(self):
+            closed.append(self.name)
+
+    def open_stream(name, client):
+        return server.open_stream(Items(name), 1, 'SESSION', client)
+
+    cursors = [open_stream('first', ':1.1'), open_stream('second', ':1.1')]
+    with pytest.raises(dbus_objects.errors.LimitsExceeded):
+        open_stream('third', ':1.1')
+    cursors.append(open_stream('anonymous', None))
+    with pytest.raises(dbus_objects.errors.LimitsExceeded):
+        open_stream('fourth', ':1.2')
+
+    # idle streams are closed, even those without a client
+    for cursor in cursors[1:]:
+        server._streams[cursor].last_used -= 61
+    assert server.next_stream_chunk(cursors[0], 'SESSION', ':1.1') == (['first'], False)
+    open_stream('fifth', ':1.2')
+    assert sorted(closed) == ['anonymous', 'second']
+    assert server.clients == [('SESSION', ':1.1'), ('SESSION', ':1.2')]
+
+    server.close_streams()
+    assert sorted(closed) == ['anonymous', 'fifth', 'first', 'second']
+    assert not server._streams and not server._stream_counts and not server.clients
+    with pytest.raises(ValueError):
+        server.set_stream_limits(per_client=0)
+
+
+def test_current_call_outside_call():
+    with pytest.raises(dbus_objects.object.DBusObjectException):
+        dbus_objects.integration.current_call()
+
+
+def test_pending_reply():
+    completed = []
+
+    reply = dbus_objects.integration.PendingReply()
+    reply._bind(completed.append)
+    assert not reply.done
+    reply.complete('value')
+    assert completed == [reply]
+    assert reply.done and reply.value == 'value' and reply.error is None
+    with pytest.raises(dbus_objects.object.DBusObjectException):
+        reply.complete('again')
+
+    # completed before being returned
+    failed = dbus_objects.integration.PendingReply()
+    error = ValueError('failed')
+    failed.fail(error)
+    failed._bind(completed.append)
+    assert completed == [reply, failed]
+    assert failed.error is error
+
+
+def test_call_context_cancelled():
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    assert not dbus_objects.integration.CallContext(server, 'SESSION', ':1.1').cancelled
+    assert dbus_objects.integration.CallContext(server, 'SESSION', ':1.1', deadline=time.monotonic() - 1).cancelled
+    assert not dbus_objects.integration.CallContext(server, 'SESSION', ':1.1', deadline=time.monotonic() + 60).cancelled
+
+
+def test_pending_reply_cancel():
+    completed = []
+    reply = dbus_objects.integration.PendingReply()
+    reply._bind(completed.append)
+    assert reply._cancel()
+    assert reply.cancelled
+    reply.complete('late')  # ignored
+    assert not completed
+    assert not reply._cancel()
+
+
+def test_lookup_errors(base_server):
+    with pytest.raises(dbus_objects.errors.UnknownObject):
+        base_server.get_method('/io/github/ffy00/missing', 'org.freedesktop.DBus.Peer', 'Ping')
+    with pytest.raises(dbus_objects.errors.UnknownInterface):
+        base_server.get_method('/io/github/ffy00/dbus_objects/example', 'com.example.Missing', 'Ping')
+    with pytest.raises(dbus_objects.errors.UnknownMethod):
+        base_server.get_method('/io/github/ffy00/dbus_objects/example', 'org.freedesktop.DBus.Peer', 'Missing')
+    with pytest.raises(dbus_objects.errors.UnknownProperty):
+        base_server.get_property('/io/github/ffy00/dbus_objects/example', 'com.example.object.ExampleObject', 'Missing')
+
+    # the interface is optional in method calls
+    ping, descriptor = base_server.get_method('/io/github/ffy00/dbus_objects/example', None, 'Ping')
+    assert descriptor.interface == 'com.example.object.ExampleObject'
+
+
+def _children(server, path):
+    introspect, _descriptor = server.get_method(path, 'org.freedesktop.DBus.Introspectable', 'Introspect')
+    xml = introspect()[len(dbus_objects.integration._Introspectable._XML_DOCTYPE):]
+    return [node.get('name') for node in ET.fromstring(xml).findall('node')]
+
+
+def test_unregister_object(obj):
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    server.register_object('/com/example/a', obj)
+    server.register_object('/com/example/b', obj)
+    assert _children(server, '/com/example') == ['a', 'b']
+
+    server.unregister_object('/com/example/a')
+    assert _children(server, '/com/example') == ['b']
+    with pytest.raises(KeyError):
+        server.get_method('/com/example/a', 'org.freedesktop.DBus.Peer', 'Ping')
+    with pytest.raises(KeyError):
+        server.unregister_object('/com/example/a')
+
+    # the parents keep the standard interfaces only while there are objects below them
+    server.unregister_object('/com/example/b', obj)
+    with pytest.raises(dbus_objects.errors.UnknownObject):
+        server.get_method('/', 'org.freedesktop.DBus.Peer', 'Ping')
+    assert not server._tree.root.children
+
+    # and it can be registered again
+    server.register_object('/com/example/a', obj)
+    assert _children(server, '/com/example') == ['a']
+
+
+def test_unregister_object_shared_path(obj):
+    class OtherObject(dbus_objects.object.DBusObject):
+        def __init__(self):
+            super().__init__(default_interface_root='com.example.object')
+
+        @dbus_objects.object.dbus_property()
+        def other(self) -> str:
+            return 'other'
+
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    other = OtherObject()
+    server.register_object('/com/example', obj)
+    server.register_object('/com/example', other)
+
+    server.unregister_object('/com/example', obj)
+    with pytest.raises(dbus_objects.errors.UnknownInterface):
+        server.get_method('/com/example', 'com.example.object.ExampleObject', 'Ping')
+    # the Properties interface now belongs to the remaining object
+    get_all, _descriptor = server.get_method('/com/example', 'org.freedesktop.DBus.Properties', 'GetAll')
+    assert get_all('') == {'Other': ('s', 'other')}
+
+
+def test_unregister_subtree(obj):
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    server.register_object('/com/example', obj)
+    server.register_object('/com/example/devices/a', obj)
+    server.register_object('/com/example/devices/b/c', obj)
+    server.register_object('/com/other', obj)
+
+    assert server.unregister_subtree('/com/example/devices') == 2
+    assert server.unregister_subtree('/com/example/devices') == 0
+    assert _children(server, '/com/example') == []
+    assert _children(server, '/com') == ['example', 'other']
+    assert server.unregister_subtree('/') == 2
+    assert not server._tree.root.children
+
+
+def test_registration_snapshots(obj):
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    server.register_object('/com/example/a', obj)
+    snapshot = server._tree
+
+    server.register_object('/com/example/b', obj)
+    server.unregister_object('/com/example/a')
+    # published snapshots are never modified
+    assert snapshot.get_node('/com/example/b') is None
+    assert snapshot.get_node('/com/example/a').objects == (obj,)
+    assert snapshot.root.references == 1
+    assert server._tree.get_node('/com/example/a') is None
+    # the untouched nodes are shared
+    previous = server._tree
+    server.register_object('/org/example', obj)
+    assert server._tree.get_node('/com') is previous.get_node('/com')
+    assert server._tree.root is not previous.root
+
+
+def test_register_objects(obj):
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    server.register_objects([('/com/example/a', obj), ('/com/example/b', obj)])
+    assert _children(server, '/com/example') == ['a', 'b']
+
+    # a failed batch publishes nothing
+    with pytest.raises(AttributeError):
+        server.register_objects([('/com/example/c', obj), ('/com/example/d', object())])
+    assert _children(server, '/com/example') == ['a', 'b']
+
+
+def test_registration_from_threads(obj):
+    server = dbus_objects.integration.DBusServerBase(bus='SESSION', name='io.github.ffy00.dbus-objects.tests')
+    done = threading.Event()
+
+    def register():
+        for i in range(200):
+            server.register_objects([(f'/com/example/a/{i}', obj), (f'/com/example/b/{i}', obj)])
+        for i in range(200):
+            server.unregister_subtree(f'/com/example/a/{i}')
+            server.unregister_object(f'/com/example/b/{i}')
+        done.set()
+
+    thread = threading.Thread(target=register, daemon=True)
+    thread.start()
+    checks = 0
+    while not done.is_set() or not checks:
+        tree = server._tree
+        a = tree.get_node('/com/example/a')
+        b = tree.get_node('/com/example/b')
+        # the objects of a batch show up together, and they are removed one by one
+        assert (b.references if b else 0) - (a.references if a else 0) in (0, 1)
+        try:
+            _children(server, '/com/example')
+        except dbus_objects.errors.UnknownObject:
+            pass  # everything was unregistered already
+        checks += 1
+    thread.join(timeout=5)
+    assert not server._tree.root.children
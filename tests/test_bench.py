@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import time
+
+import pytest
+
+import dbus_objects.bench
+
+from dbus_objects.integration.capture import private_bus
+
+
+@pytest.fixture()
+def bench_bus():
+    with private_bus() as address:
+        run = threading.Event()
+        run.set()
+        thread = threading.Thread(target=dbus_objects.bench.serve, args=(address,), kwargs={'event': run}, daemon=True)
+        thread.start()
+        dbus_objects.bench._wait_for_name(address, dbus_objects.bench.BENCH_NAME)
+        yield address
+        time.sleep(0.2)
+        run.clear()
+        # wake the loop up
+        dbus_objects.bench.run_load(address, duration=0.1)
+        thread.join(timeout=5)
+
+
+def test_concurrency(bench_bus):
+    report = dbus_objects.bench.run_load(bench_bus, clients=2, concurrency=4, duration=0.5, server_pid=os.getpid())
+    assert report.calls > 0
+    assert (report.errors, report.unanswered) == (0, 0)
+    assert 0 < report.p50 <= report.p90 <= report.p99 <= report.p999
+    assert report.throughput == pytest.approx(report.calls / report.duration)
+    assert report.server_cpu is not None and report.server_cpu >= 0
+
+
+def test_rate(bench_bus):
+    report = dbus_objects.bench.run_load(
+        bench_bus, method='Echo', signature='s', args=['hello'], clients=2, rate=200, duration=0.5,
+    )
+    # the last due call may be sent right at the end
+    assert 90 <= report.calls <= 102
+    assert report.errors == 0
+
+
+def test_errors(bench_bus):
+    report = dbus_objects.bench.run_load(bench_bus, method='Missing', duration=0.2)
+    assert report.calls > 0
+    assert report.errors == report.calls
+
+
+def test_invalid_load():
+    with pytest.raises(ValueError):
+        dbus_objects.bench.run_load('SESSION', clients=0)
+    with pytest.raises(ValueError):
+        dbus_objects.bench.run_load('SESSION', rate=0)
+
+
+def test_cli(capsys):
+    dbus_objects.bench.main([
+        'run', '--private', '--serve', '--clients', '2', '--processes', '--duration', '0.3',
+    ])
+    out = capsys.readouterr().out
+    assert 'errors      0' in out
+    assert 'server cpu' in out
+
+
+def test_cli_peer(capsys):
+    dbus_objects.bench.main([
+        'run', '--private', '--serve', '--peer', '--clients', '2', '--duration', '0.3',
+    ])
+    out = capsys.readouterr().out
+    assert 'errors      0' in out
+    assert 'unanswered  0' in out
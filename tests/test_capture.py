@@ -0,0 +1,143 @@
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+import types
+
+import jeepney
+import pytest
+
+import dbus_objects.object
+
+from dbus_objects.integration.capture import main, private_bus, read_capture, replay
+from dbus_objects.integration.jeepney import BlockingDBusServer
+
+
+class _StubConnection():
+    def __init__(self, bus, unique_name):
+        self.bus = bus
+        self.conn = types.SimpleNamespace(unique_name=unique_name)
+        self.owned_names = set()
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+        return len(self.sent)
+
+
+class _CaptureObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+
+    @dbus_objects.object.dbus_method()
+    def echo(self, value: str) -> str:
+        return value
+
+    @dbus_objects.object.dbus_method()
+    def fail(self) -> None:
+        raise ValueError('failed')
+
+
+def _call(member, signature=None, body=(), serial=1, bus_name='io.github.ffy00.dbus-objects.tests.capture'):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name=bus_name,
+        interface='com.example.object.CaptureObject',
+    ), member, signature, body)
+    msg.header.serial = serial
+    msg.header.fields[jeepney.HeaderFields.sender] = ':1.42'
+    return msg
+
+
+def _server(name='io.github.ffy00.dbus-objects.tests.capture', bus='SESSION'):
+    server = BlockingDBusServer(bus=bus, name=name)
+    server.register_object('/io/github/ffy00/dbus_objects/example', _CaptureObject())
+    return server
+
+
+def _capture(server, path):
+    connection = _StubConnection('SESSION', ':1.1')
+    writer = server.start_capture(path)
+    for serial in range(1, 4):
+        server._handle_msg(_call('Echo', 's', (f'value {serial}',), serial), connection)
+    server._handle_msg(_call('Fail', serial=4), connection)
+    server._run_queue()
+    server.stop_capture()
+    # not captured anymore
+    server._handle_msg(_call('Echo', 's', ('late',), 5), connection)
+    assert writer.records == 4
+    return connection
+
+
+def test_capture(tmp_path):
+    path = str(tmp_path / 'calls.cap')
+    server = _server()
+    _capture(server, path)
+    server.close()
+
+    records = list(read_capture(path))
+    assert [msg.header.fields[jeepney.HeaderFields.member] for _timestamp, msg in records] == [
+        'Echo', 'Echo', 'Echo', 'Fail',
+    ]
+    assert records[0][1].body == ('value 1',)
+    assert records[0][1].header.fields[jeepney.HeaderFields.sender] == ':1.42'
+    timestamps = [timestamp for timestamp, _msg in records]
+    assert timestamps == sorted(timestamps)
+
+
+def test_read_capture_invalid(tmp_path):
+    path = tmp_path / 'calls.cap'
+    path.write_bytes(b'not a capture')
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+    server = _server()
+    _capture(server, str(path))
+    server.close()
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+
+def test_replay_in_process(tmp_path):
+    path = str(tmp_path / 'calls.cap')
+    server = _server()
+    _capture(server, path)
+
+    summary = replay(path, server, speed=0)
+    server.close()
+    echo = summary['com.example.object.CaptureObject.Echo']
+    assert (echo.calls, echo.errors, echo.unanswered) == (3, 0, 0)
+    assert 0 < echo.p50 <= echo.p90 <= echo.p99 <= echo.max
+    fail = summary['com.example.object.CaptureObject.Fail']
+    assert (fail.calls, fail.errors) == (1, 1)
+
+
+def test_replay_private_bus(tmp_path, capsys):
+    path = str(tmp_path / 'calls.cap')
+    recorder = _server()
+    _capture(recorder, path)
+    recorder.close()
+
+    with private_bus() as address:
+        server = _server(name='io.github.ffy00.dbus-objects.tests.replay', bus=address)
+        run = threading.Event()
+        run.set()
+        thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+        thread.start()
+        try:
+            summary = replay(path, address, speed=100, destination='io.github.ffy00.dbus-objects.tests.replay')
+            assert summary['com.example.object.CaptureObject.Echo'].calls == 3
+            assert summary['com.example.object.CaptureObject.Echo'].unanswered == 0
+            assert summary['com.example.object.CaptureObject.Fail'].errors == 1
+
+            main(['replay', path, '--bus', address, '--speed', '0',
+                  '--destination', 'io.github.ffy00.dbus-objects.tests.replay'])
+            assert 'com.example.object.CaptureObject.Echo' in capsys.readouterr().out
+        finally:
+            time.sleep(0.2)
+            run.clear()
+            # wake the loop up
+            replay(path, address, speed=0, destination='io.github.ffy00.dbus-objects.tests.replay', timeout=0.5)
+            thread.join(timeout=5)
+            server.close()
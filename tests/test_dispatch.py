@@ -0,0 +1,165 @@
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+
+import pytest
+
+from dbus_objects.integration.dispatch import DeadlineHeap, DispatchQueue, RateLimiter, TokenBucket, WorkerLanes
+
+
+def test_dispatch_queue_order():
+    queue = DispatchQueue()
+    queue.push('low', 0)
+    queue.push('normal 1', 1)
+    queue.push('high', 2)
+    queue.push('normal 2', 1)
+
+    assert len(queue) == 4
+    assert [queue.pop() for _ in range(4)] == ['high', 'normal 1', 'normal 2', 'low']
+    assert not queue
+
+
+def test_dispatch_queue_stats():
+    queue = DispatchQueue()
+    queue.push('a', 1)
+    queue.push('b', 1)
+    queue.push('c', 2)
+    while queue:
+        queue.pop()
+
+    stats = queue.stats
+    assert stats[1]['count'] == 2
+    assert stats[2]['count'] == 1
+    assert stats[1]['max_wait'] >= 0
+    assert stats[1]['total_wait'] >= stats[1]['max_wait']
+
+
+def test_dispatch_queue_round_robin():
+    queue = DispatchQueue()
+    for i in range(3):
+        queue.push(f'a{i}', 1, ':1.1')
+    queue.push('b0', 1, ':1.2')
+    queue.push('c0', 1, ':1.3')
+
+    assert [queue.pop() for _ in range(5)] == ['a0', 'b0', 'c0', 'a1', 'a2']
+
+
+def test_dispatch_queue_weights():
+    queue = DispatchQueue()
+    queue.set_weight(':1.1', 2)
+    for i in range(4):
+        queue.push(f'a{i}', 1, ':1.1')
+        queue.push(f'b{i}', 1, ':1.2')
+
+    assert [queue.pop() for _ in range(8)] == ['a0', 'a1', 'b0', 'a2', 'a3', 'b1', 'b2', 'b3']
+    with pytest.raises(ValueError):
+        queue.set_weight(':1.1', 0)
+
+
+def test_dispatch_queue_pop_ready():
+    queue = DispatchQueue()
+    for i in range(2):
+        queue.push(('a', i), 1, ':1.1')
+        queue.push(('b', i), 1, ':1.2')
+    queue.push(('a', 2), 2, ':1.3')
+
+    def ready(item):
+        return item[0] != 'a'
+
+    # the oldest item of each sender goes first, so b1 is ready but a0 is not
+    assert queue.pop_ready(ready) == ('b', 0)
+    assert queue.pop_ready(ready) == ('b', 1)
+    assert queue.pop_ready(ready) is None
+    assert len(queue) == 3
+    assert queue.pop() == ('a', 2)
+    assert queue.pop_ready(lambda item: True) == ('a', 0)
+    assert queue.pop() == ('a', 1)
+    assert queue.pop_ready(lambda item: True) is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(0.001, 2)
+    assert bucket.full
+    assert bucket.consume()
+    assert bucket.consume()
+    assert not bucket.consume()
+    assert not bucket.full
+    with pytest.raises(ValueError):
+        TokenBucket(0, 1)
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(0.001, 1)
+    assert limiter.consume(':1.1')
+    assert not limiter.consume(':1.1')
+    assert limiter.consume(':1.2')
+    assert len(limiter) == 2
+
+
+def test_rate_limiter_prune():
+    limiter = RateLimiter(1000, 1)
+    limiter._prune_size = 2
+    limiter.consume('a')
+    limiter.consume('b')
+    time.sleep(0.01)  # buckets refill
+    limiter.consume('c')
+    assert len(limiter) == 1
+
+
+def test_deadline_heap():
+    deadlines = DeadlineHeap()
+    keys = [deadlines.push(float(i), f'entry {i}') for i in range(500)]
+    assert len(deadlines) == 500
+    assert deadlines.next_deadline == 0
+
+    # removed in a different order than their deadlines
+    for key in reversed(keys[1:]):
+        deadlines.remove(key)
+    assert len(deadlines) == 1
+    assert deadlines.next_deadline == 0
+    # the removed entries are not kept around
+    assert len(deadlines._heap) <= 2 + deadlines._SLACK
+
+    keys = [deadlines.push(float(i), f'entry {i}') for i in range(1, 4)]
+    deadlines.remove(keys[0])
+    assert deadlines.pop_expired(2.5) == ['entry 0', 'entry 2']
+    assert deadlines.next_deadline == 3
+    deadlines.remove(keys[1])  # already expired
+    assert deadlines.pop_expired(10) == ['entry 3']
+    assert not deadlines and deadlines.next_deadline is None
+
+
+def test_worker_lanes():
+    lanes = WorkerLanes(2)
+    assert lanes.lane('/com/example/a') == lanes.lane('/com/example/a')
+    assert {lanes.lane(key) for key in range(10)} == {0, 1}
+
+    blocked = threading.Event()
+    results = []
+    lanes.submit(0, blocked.wait)
+    for i in range(5):
+        lanes.submit(0, lambda i=i: results.append(('a', i)))
+    # the other lane is not held up
+    lanes.submit(1, lambda: results.append(('b', 0)))
+    time.sleep(0.1)
+    assert results == [('b', 0)]
+    assert lanes.stats[0]['queued'] == 5
+    assert lanes.queued(0) == 5
+    assert lanes.queued(1) == 0
+
+    blocked.set()
+    assert lanes.wait_idle(timeout=5)
+    # in order per key
+    assert results[1:] == [('a', i) for i in range(5)]
+    stats = lanes.stats
+    assert [lane['count'] for lane in stats] == [6, 1]
+    assert stats[0]['max_queued'] == 6
+    assert stats[0]['max_wait'] >= 0.1
+    assert stats[0]['queued'] == 0
+
+    lanes.close()
+    with pytest.raises(RuntimeError):
+        lanes.submit(0, lambda: None)
+    with pytest.raises(ValueError):
+        WorkerLanes(0)
@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+import dbus_objects.errors
+
+
+class _CustomError(Exception):
+    pass
+
+
+def test_dbus_error_name():
+    assert dbus_objects.errors.error_name(dbus_objects.errors.InvalidArgs('bad')) == (
+        'org.freedesktop.DBus.Error.InvalidArgs'
+    )
+    error = dbus_objects.errors.DBusError('custom', name='com.example.Error.Custom')
+    assert dbus_objects.errors.error_name(error) == 'com.example.Error.Custom'
+    assert str(error) == 'custom'
+    with pytest.raises(ValueError):
+        dbus_objects.errors.DBusError('custom', name='Client Error')
+
+
+def test_lookup_errors_are_key_errors():
+    with pytest.raises(KeyError):
+        raise dbus_objects.errors.UnknownMethod('No such method')
+    assert str(dbus_objects.errors.UnknownObject('No such object: /')) == 'No such object: /'
+
+
+def test_python_error_name():
+    assert dbus_objects.errors.error_name(ValueError('bad')) == 'org.freedesktop.DBus.Python.ValueError'
+    assert dbus_objects.errors.error_name(NotImplementedError()) == 'org.freedesktop.DBus.Error.NotSupported'
+    assert dbus_objects.errors.error_name(FileNotFoundError()) == 'org.freedesktop.DBus.Python.FileNotFoundError'
+    assert dbus_objects.errors.error_name(_CustomError()) == f'org.freedesktop.DBus.Python.{__name__}._CustomError'
+
+    class LocalError(Exception):
+        pass
+
+    name = dbus_objects.errors.error_name(LocalError())
+    assert dbus_objects.errors.valid_error_name(name)
+    assert name.endswith('._locals_.LocalError')
+
+
+def test_register_error():
+    class RegisteredError(Exception):
+        pass
+
+    class SubError(RegisteredError):
+        pass
+
+    dbus_objects.errors.register_error(RegisteredError, 'com.example.Error.Registered')
+    assert dbus_objects.errors.error_name(SubError()) == 'com.example.Error.Registered'
+    with pytest.raises(ValueError):
+        dbus_objects.errors.register_error(RegisteredError, 'Registered')
+
+
+def test_error_message():
+    assert dbus_objects.errors.error_message(ValueError('bad value')) == 'bad value'
+    assert dbus_objects.errors.error_message(ValueError()) == 'ValueError'
@@ -1,9 +1,26 @@
 # SPDX-License-Identifier: MIT
 
+import dataclasses
+import multiprocessing
+import os
+import threading
+import time
+import types
+import typing
+
 import jeepney
+import jeepney.io.blocking
 import pytest
 
-from dbus_objects.integration.jeepney import BlockingDBusServer
+import dbus_objects.errors
+import dbus_objects.integration
+import dbus_objects.object
+import dbus_objects.signature
+import dbus_objects.types
+
+from dbus_objects.integration.jeepney import BlockingDBusServer, NameRequestResult
+from dbus_objects.object import Priority
+from dbus_objects.policy import Policy
 
 
 def test_create_error():
@@ -15,3 +32,1118 @@ def test_listen(jeepney_one_time_server, jeepney_client, jeepney_connection):
     msg = jeepney.new_method_call(jeepney_client, 'Ping', '', tuple())
     reply = jeepney_connection.send_and_get_reply(msg)
     assert reply.body[0] == 'Pong!'
+
+
+def test_standby_takeover(obj):
+    name = 'io.github.ffy00.dbus-objects.tests.standby'
+    active = BlockingDBusServer(bus='SESSION', name=name)
+    assert active.owns_name
+    assert active.name_request_result == NameRequestResult.PRIMARY_OWNER
+
+    standby = BlockingDBusServer(bus='SESSION', name=name, standby=True)
+    standby.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    assert not standby.owns_name
+    assert standby.name_request_result == NameRequestResult.IN_QUEUE
+
+    active.close()
+
+    deadline = time.monotonic() + 5
+    while not standby.owns_name and time.monotonic() < deadline:
+        standby._handle_msg(standby._conn.receive(timeout=5), standby._connections['SESSION'])
+    assert standby.owns_name
+    standby.close()
+
+
+def test_listen_multiple_names(obj, jeepney_connection):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.first')
+    server.add_name('io.github.ffy00.dbus-objects.tests.second')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    assert server.owns('io.github.ffy00.dbus-objects.tests.first')
+    assert server.owns('io.github.ffy00.dbus-objects.tests.second')
+
+    run = multiprocessing.Event()
+    run.set()
+    process = multiprocessing.Process(target=server.listen, kwargs={'event': run})
+    process.start()
+
+    def ping(name):
+        client = jeepney.DBusAddress(
+            '/io/github/ffy00/dbus_objects/example',
+            bus_name=name,
+            interface='com.example.object.ExampleObject',
+        )
+        msg = jeepney.new_method_call(client, 'Ping')
+        return jeepney_connection.send_and_get_reply(msg, timeout=5).body[0]
+
+    assert ping('io.github.ffy00.dbus-objects.tests.first') == 'Pong!'
+
+    # clear the event, listen will exit after handling the next message
+    time.sleep(0.2)
+    run.clear()
+    assert ping('io.github.ffy00.dbus-objects.tests.second') == 'Pong!'
+
+    process.join(timeout=5)
+    server.close()
+
+
+class _StubConnection():
+    def __init__(self, bus, unique_name):
+        self.bus = bus
+        self.conn = types.SimpleNamespace(unique_name=unique_name)
+        self.owned_names = set()
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+        return len(self.sent)
+
+
+def _method_call(destination, member='Ping', sender=None, serial=1):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name=destination,
+        interface='com.example.object.ExampleObject',
+    ), member)
+    msg.header.serial = serial
+    if sender:
+        msg.header.fields[jeepney.HeaderFields.sender] = sender
+    return msg
+
+
+def test_reply_on_originating_connection(obj):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.routing')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    session = _StubConnection('SESSION', ':1.1')
+    system = _StubConnection('SYSTEM', ':1.2')
+
+    server._handle_msg(_method_call('io.github.ffy00.dbus-objects.tests.routing'), system)
+    server._run_queue()
+    assert len(system.sent) == 1 and not session.sent
+    assert system.sent[0].body == ('Pong!',)
+
+    server._handle_msg(_method_call('io.github.ffy00.dbus-objects.tests.routing'), session)
+    server._run_queue()
+    assert len(system.sent) == 1 and len(session.sent) == 1
+    server.close()
+
+
+def test_sender_weight_per_bus(obj):
+    name = 'io.github.ffy00.dbus-objects.tests.weights'
+    server = BlockingDBusServer(bus='SESSION', name=name)
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    system = _StubConnection('SYSTEM', ':1.1')
+
+    def run():
+        for serial in range(1, 5):
+            server._handle_msg(_method_call(name, sender=':1.5', serial=serial), system)
+            server._handle_msg(_method_call(name, sender=':1.6', serial=serial + 10), system)
+        server._run_queue()
+        serials = [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in system.sent]
+        system.sent.clear()
+        return serials
+
+    # a client with the same unique name on another bus is someone else
+    server.set_sender_weight(':1.5', 2)
+    assert run() == [1, 11, 2, 12, 3, 13, 4, 14]
+    server.set_sender_weight(':1.5', 2, bus='SYSTEM')
+    assert run() == [1, 2, 11, 3, 4, 12, 13, 14]
+    server.close()
+
+
+def test_standby_serves_owned_names_only(obj):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.standby-names', standby=True)
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+    connection.owned_names.add('io.github.ffy00.dbus-objects.tests.owned')
+
+    server._handle_msg(_method_call('io.github.ffy00.dbus-objects.tests.owned'), connection)
+    server._handle_msg(_method_call('io.github.ffy00.dbus-objects.tests.not-owned'), connection)
+    server._handle_msg(_method_call(':1.1'), connection)
+    server._run_queue()
+
+    errors = [msg for msg in connection.sent if msg.header.message_type == jeepney.MessageType.error]
+    returns = [msg for msg in connection.sent if msg.header.message_type == jeepney.MessageType.method_return]
+    assert len(returns) == 2  # owned name and unique name
+    assert [msg.body for msg in errors] == [('io.github.ffy00.dbus-objects.tests.not-owned is in standby',)]
+    server.close()
+
+
+def test_signal_subscription(jeepney_connection):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.signals')
+    received = []
+    server.subscribe_signal(
+        lambda *args: received.append(args),
+        interface='com.example.Signals',
+        member='Something',
+    )
+
+    emitter = jeepney.DBusAddress('/com/example', interface='com.example.Signals')
+    jeepney_connection.send_message(jeepney.new_signal(emitter, 'Something', 's', ('value',)))
+
+    connection = server._connections['SESSION']
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        server._handle_msg(server._conn.receive(timeout=5), connection)
+    assert received == [('value',)]
+    server.close()
+
+
+def test_signal_subscription_well_known_sender(jeepney_connection):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.signals')
+    received = []
+    server.subscribe_signal(
+        lambda *args: received.append(args),
+        sender='io.github.ffy00.dbus-objects.tests.emitter',
+        member='Something',
+    )
+    connection = server._connections['SESSION']
+    connection.flush()
+
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as emitter:
+        emitter.send_and_get_reply(jeepney.DBus().RequestName('io.github.ffy00.dbus-objects.tests.emitter'))
+        address = jeepney.DBusAddress('/com/example', interface='com.example.Signals')
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            emitter.send_message(jeepney.new_signal(address, 'Something', 's', ('value',)))
+            server._process(connection)
+            connection.flush()
+            time.sleep(0.01)
+        # signals from other senders are not matched
+        jeepney_connection.send_message(jeepney.new_signal(address, 'Something', 's', ('other',)))
+        emitter.send_message(jeepney.new_signal(address, 'Something', 's', ('last',)))
+        while received[-1] != ('last',) and time.monotonic() < deadline:
+            server._process(connection)
+            time.sleep(0.01)
+    assert ('other',) not in received
+    assert received[-1] == ('last',)
+    server.close()
+
+
+def test_listen_burst(obj, jeepney_connection, jeepney_client):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.burst')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    client = jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.burst',
+        interface='com.example.object.ExampleObject',
+    )
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as connection:
+        for _ in range(200):
+            connection.send_message(jeepney.new_method_call(client, 'Ping'))
+        replies = []
+        while len(replies) < 200:
+            msg = connection.receive(timeout=5)
+            if msg.header.message_type == jeepney.MessageType.method_return:
+                replies.append(msg)
+        assert all(reply.body == ('Pong!',) for reply in replies)
+
+        # clear the event, listen will exit after handling the next message
+        time.sleep(0.2)
+        run.clear()
+        connection.send_and_get_reply(jeepney.new_method_call(client, 'Ping'), timeout=5)
+    thread.join(timeout=5)
+
+    stats = server.io_stats
+    assert stats['messages_sent'] == stats['messages_received'] == 201
+    assert stats['send_syscalls'] < stats['messages_sent']
+    server.close()
+
+
+def test_priority_dispatch(obj):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.priority')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    for _ in range(3):
+        server._handle_msg(_method_call('io.github.ffy00.dbus-objects.tests.priority'), connection)
+    peer = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.priority',
+        interface='org.freedesktop.DBus.Peer',
+    ), 'Ping')
+    peer.header.serial = 2
+    server._handle_msg(peer, connection)
+    server._run_queue()
+
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [2, 1, 1, 1]
+    stats = server.queue_stats
+    assert stats[Priority.HIGH]['count'] == 1
+    assert stats[Priority.NORMAL]['count'] == 3
+    server.close()
+
+
+def test_sender_fairness(obj):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.fairness')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    name = 'io.github.ffy00.dbus-objects.tests.fairness'
+    for serial in range(1, 5):
+        server._handle_msg(_method_call(name, sender=':1.10', serial=serial), connection)
+    server._handle_msg(_method_call(name, sender=':1.20', serial=10), connection)
+    server._run_queue()
+
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [1, 10, 2, 3, 4]
+    server.close()
+
+
+def test_sender_rate_limit(obj):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.sender-limit')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    server.set_sender_rate_limit(0.001, 2)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    name = 'io.github.ffy00.dbus-objects.tests.sender-limit'
+    for serial in range(1, 4):
+        server._handle_msg(_method_call(name, sender=':1.10', serial=serial), connection)
+    server._handle_msg(_method_call(name, sender=':1.20', serial=10), connection)
+    server._run_queue()
+
+    errors = [msg for msg in connection.sent if msg.header.message_type == jeepney.MessageType.error]
+    returns = [msg for msg in connection.sent if msg.header.message_type == jeepney.MessageType.method_return]
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in errors] == [3]
+    assert errors[0].header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Error.LimitsExceeded'
+    assert len(returns) == 3
+    server.close()
+
+
+def test_method_rate_limit():
+    class LimitedObject(dbus_objects.object.DBusObject):
+        def __init__(self):
+            super().__init__(default_interface_root='com.example.object')
+
+        @dbus_objects.object.dbus_method(rate_limit=(0.001, 1))
+        def ping(self) -> str:
+            return 'Pong!'
+
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.method-limit')
+    server.register_object('/io/github/ffy00/dbus_objects/example', LimitedObject())
+    connection = _StubConnection('SESSION', ':1.1')
+
+    call = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.method-limit',
+        interface='com.example.object.LimitedObject',
+    ), 'Ping')
+    call.header.serial = 1
+    server._handle_msg(call, connection)
+    server._handle_msg(call, connection)
+    server._run_queue()
+
+    assert [msg.header.message_type for msg in connection.sent] == [
+        jeepney.MessageType.error, jeepney.MessageType.method_return,
+    ]
+    server.close()
+
+
+class _RestrictedObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.calls = 0
+
+    @dbus_objects.object.dbus_method(policy=Policy(uids=[os.getuid()]))
+    def allowed(self) -> str:
+        self.calls += 1
+        return 'allowed'
+
+    @dbus_objects.object.dbus_method(policy=Policy(uids=[]))
+    def denied(self) -> str:
+        return 'denied'  # pragma: no cover
+
+    @dbus_objects.object.dbus_property(policy=Policy(uids=[]))
+    def secret(self) -> str:
+        return 'secret'  # pragma: no cover
+
+
+def test_policy(jeepney_connection):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.policy')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _RestrictedObject())
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    def call(member, interface='com.example.object.RestrictedObject', signature=None, body=()):
+        client = jeepney.DBusAddress(
+            '/io/github/ffy00/dbus_objects/example',
+            bus_name='io.github.ffy00.dbus-objects.tests.policy',
+            interface=interface,
+        )
+        return jeepney_connection.send_and_get_reply(
+            jeepney.new_method_call(client, member, signature, body), timeout=5
+        )
+
+    assert call('Allowed').body == ('allowed',)
+    assert call('Allowed').body == ('allowed',)
+    for reply in (
+        call('Denied'),
+        call('Get', 'org.freedesktop.DBus.Properties', 'ss', ('com.example.object.RestrictedObject', 'Secret')),
+        call('GetAll', 'org.freedesktop.DBus.Properties', 's', ('com.example.object.RestrictedObject',)),
+    ):
+        assert reply.header.message_type == jeepney.MessageType.error
+        assert reply.header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Error.AccessDenied'
+    assert list(server._credentials) == [('SESSION', jeepney_connection.unique_name)]
+
+    time.sleep(0.2)
+    run.clear()
+    call('Allowed')
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_policy_credentials_cache():
+    obj = _RestrictedObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.policy-cache')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    def call(serial):
+        msg = jeepney.new_method_call(jeepney.DBusAddress(
+            '/io/github/ffy00/dbus_objects/example',
+            bus_name='io.github.ffy00.dbus-objects.tests.policy-cache',
+            interface='com.example.object.RestrictedObject',
+        ), 'Allowed')
+        msg.header.serial = serial
+        msg.header.fields[jeepney.HeaderFields.sender] = ':1.10'
+        server._handle_msg(msg, connection)
+
+    # both calls wait for a single credentials lookup
+    call(1)
+    call(2)
+    assert [msg.header.fields[jeepney.HeaderFields.member] for msg in connection.sent] == ['GetConnectionCredentials']
+    lookup = connection.sent.pop()
+    lookup.header.serial = 1
+    reply = jeepney.new_method_return(lookup, 'a{sv}', ({'UnixUserID': ('u', os.getuid())},))
+    reply.header.fields[jeepney.HeaderFields.sender] = 'org.freedesktop.DBus'
+    server._handle_msg(reply, connection)
+    server._run_queue()
+    assert obj.calls == 2
+
+    # cached now
+    connection.sent.clear()
+    call(3)
+    server._run_queue()
+    assert obj.calls == 3
+    assert [msg.header.message_type for msg in connection.sent] == [jeepney.MessageType.method_return]
+
+    # dropped when the client leaves
+    server.dispatch_signal(
+        'SESSION', 'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+        'NameOwnerChanged', (':1.10', ':1.10', ''),
+    )
+    assert not server._credentials
+    server.close()
+
+
+class _SessionObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.sessions = set()
+
+    @dbus_objects.object.dbus_method()
+    def open_session(self) -> str:
+        context = dbus_objects.integration.current_call()
+        self.sessions.add(context.sender)
+        context.add_resource(lambda: self.sessions.discard(context.sender))
+        return context.sender
+
+
+def test_client_resources_released_on_disconnect():
+    obj = _SessionObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.clients')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    client = jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.clients',
+        interface='com.example.object.SessionObject',
+    )
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as connection:
+        reply = connection.send_and_get_reply(jeepney.new_method_call(client, 'OpenSession'), timeout=5)
+        assert reply.body == (connection.unique_name,)
+        assert obj.sessions == {connection.unique_name}
+
+    for _ in range(50):
+        if not obj.sessions:
+            break
+        time.sleep(0.1)
+    assert not obj.sessions
+    assert not server.clients
+
+    time.sleep(0.2)
+    run.clear()
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as connection:
+        connection.send_and_get_reply(jeepney.new_method_call(client, 'OpenSession'), timeout=5)
+    thread.join(timeout=5)
+    server.close()
+
+
+class _VariantObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+
+    @dbus_objects.object.dbus_method()
+    def settings(self) -> typing.Dict[str, dbus_objects.types.Variant]:
+        return {
+            'name': 'example',
+            'size': 3,
+            'ratio': 0.5,
+            'tags': ['a', 'b'],
+            'explicit': dbus_objects.signature.variant(7, 'u'),
+            'struct': ('abc', 5),
+        }
+
+
+def test_variant_inference():
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.variants')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _VariantObject())
+    connection = _StubConnection('SESSION', ':1.1')
+
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.variants',
+        interface='com.example.object.VariantObject',
+    ), 'Settings')
+    msg.header.serial = 1
+    server._handle_msg(msg, connection)
+    server._run_queue()
+
+    reply, = connection.sent
+    assert reply.body == ({
+        'name': ('s', 'example'),
+        'size': ('i', 3),
+        'ratio': ('d', 0.5),
+        'tags': ('as', ['a', 'b']),
+        'explicit': ('u', 7),
+        'struct': ('(si)', ('abc', 5)),
+    },)
+    reply.serialise(serial=1)  # marshals
+    server.close()
+
+
+class _BatchObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+
+    @dbus_objects.object.dbus_method(batch=True)
+    def lookup(self, key: int) -> str:
+        return f'value {key}'
+
+
+def test_batch_method():
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.batch')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _BatchObject())
+    connection = _StubConnection('SESSION', ':1.1')
+
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.batch',
+        interface='com.example.object.BatchObject',
+    ), 'LookupBatch', 'a(i)', ([(1,), (2,), (3,)],))
+    msg.header.serial = 1
+    server._handle_msg(msg, connection)
+    server._run_queue()
+
+    reply, = connection.sent
+    assert reply.header.fields[jeepney.HeaderFields.signature] == 'a(s)'
+    assert reply.body == ([('value 1',), ('value 2',), ('value 3',)],)
+    server.close()
+
+
+class _StreamObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.closed = 0
+
+    @dbus_objects.object.dbus_method(chunk_size=2)
+    def records(self, count: int) -> typing.Iterator[str]:
+        try:
+            for i in range(count):
+                yield f'record {i}'
+        finally:
+            self.closed += 1
+
+
+def test_stream_method(jeepney_connection):
+    obj = _StreamObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.stream')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    def call(connection, member, signature, body):
+        client = jeepney.DBusAddress(
+            '/io/github/ffy00/dbus_objects/example',
+            bus_name='io.github.ffy00.dbus-objects.tests.stream',
+            interface='com.example.object.StreamObject',
+        )
+        return connection.send_and_get_reply(jeepney.new_method_call(client, member, signature, body), timeout=5).body
+
+    cursor, = call(jeepney_connection, 'Records', 'i', (5,))
+    assert call(jeepney_connection, 'RecordsNext', 't', (cursor,)) == (['record 0', 'record 1'], False)
+    assert call(jeepney_connection, 'RecordsNext', 't', (cursor,)) == (['record 2', 'record 3'], False)
+    assert call(jeepney_connection, 'RecordsNext', 't', (cursor,)) == (['record 4'], True)
+    assert obj.closed == 1
+
+    cursor, = call(jeepney_connection, 'Records', 'i', (5,))
+    call(jeepney_connection, 'RecordsNext', 't', (cursor,))
+    call(jeepney_connection, 'RecordsCancel', 't', (cursor,))
+    assert obj.closed == 2
+
+    # closed when the client disconnects
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as connection:
+        cursor, = call(connection, 'Records', 'i', (5,))
+        call(connection, 'RecordsNext', 't', (cursor,))
+    for _ in range(50):
+        if obj.closed == 3:
+            break
+        time.sleep(0.1)
+    assert obj.closed == 3
+    assert not server._streams
+
+    time.sleep(0.2)
+    run.clear()
+    call(jeepney_connection, 'Records', 'i', (0,))
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_stream_method_unknown_cursor():
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.stream-cursor')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _StreamObject())
+    connection = _StubConnection('SESSION', ':1.1')
+
+    def call(member, signature, body, sender):
+        msg = jeepney.new_method_call(jeepney.DBusAddress(
+            '/io/github/ffy00/dbus_objects/example',
+            bus_name='io.github.ffy00.dbus-objects.tests.stream-cursor',
+            interface='com.example.object.StreamObject',
+        ), member, signature, body)
+        msg.header.serial = 1
+        msg.header.fields[jeepney.HeaderFields.sender] = sender
+        server._handle_msg(msg, connection)
+        server._run_queue()
+        return connection.sent[-1]
+
+    cursor, = call('Records', 'i', (5,), ':1.10').body
+    # only the client that opened the cursor can use it
+    assert call('RecordsNext', 't', (cursor,), ':1.20').header.message_type == jeepney.MessageType.error
+    assert call('RecordsNext', 't', (cursor + 1,), ':1.10').header.message_type == jeepney.MessageType.error
+    assert call('RecordsNext', 't', (cursor,), ':1.10').body == (['record 0', 'record 1'], False)
+    server.close()
+
+
+class _DeferredObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.pending = []
+
+    @dbus_objects.object.dbus_method()
+    def wait(self) -> str:
+        reply = dbus_objects.integration.PendingReply()
+        self.pending.append(reply)
+        return reply
+
+    @dbus_objects.object.dbus_method()
+    def ping(self) -> str:
+        return 'Pong!'
+
+
+def test_deferred_reply(jeepney_connection):
+    obj = _DeferredObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.deferred')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    client = jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.deferred',
+        interface='com.example.object.DeferredObject',
+    )
+    with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as waiter:
+        waiter.send(jeepney.new_method_call(client, 'Wait'))
+        # the loop keeps serving other calls in the meantime
+        reply = jeepney_connection.send_and_get_reply(jeepney.new_method_call(client, 'Ping'), timeout=5)
+        assert reply.body == ('Pong!',)
+        assert len(obj.pending) == 1
+
+        threading.Timer(0.1, obj.pending[0].complete, ('done',)).start()
+        reply = waiter.receive(timeout=5)
+        while reply.header.message_type != jeepney.MessageType.method_return:
+            reply = waiter.receive(timeout=5)
+        assert reply.body == ('done',)
+
+    time.sleep(0.2)
+    run.clear()
+    jeepney_connection.send_and_get_reply(jeepney.new_method_call(client, 'Ping'), timeout=5)
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_deferred_reply_failed():
+    obj = _DeferredObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.deferred-failed')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.deferred-failed',
+        interface='com.example.object.DeferredObject',
+    ), 'Wait')
+    msg.header.serial = 1
+    server._handle_msg(msg, connection)
+    server._run_queue()
+    assert not connection.sent
+
+    # only exceptions meant for the client are accepted
+    with pytest.raises(TypeError):
+        obj.pending[0].fail(KeyboardInterrupt())
+    thread = threading.Thread(target=obj.pending[0].fail, args=(ValueError('failed'),))
+    thread.start()
+    thread.join()
+    server._send_completed()
+    reply, = connection.sent
+    assert reply.header.message_type == jeepney.MessageType.error
+    assert reply.body == ('failed',)
+
+    # the error is replied without being raised in the loop
+    server._handle_msg(msg, connection)
+    server._run_queue()
+    obj.pending[1]._settle(None, SystemExit('exit'))
+    server._send_completed()
+    assert connection.sent[-1].header.message_type == jeepney.MessageType.error
+    server.close()
+
+
+def test_deferred_reply_deadline_released():
+    obj = _DeferredObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.deferred-released')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    server.set_call_timeout(60)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.deferred-released',
+        interface='com.example.object.DeferredObject',
+    ), 'Wait')
+    msg.header.serial = 1
+    for _ in range(500):
+        server._handle_msg(msg, connection)
+    server._run_queue()
+    assert len(server._deadlines) == 500
+
+    # completing the calls in a different order than their deadlines
+    for reply in reversed(obj.pending[1:]):
+        reply.complete('done')
+    server._send_completed()
+    assert len(connection.sent) == 499
+    # the completed calls are not referenced anymore
+    assert len(server._deadlines) == 1
+    assert len(server._deadlines._heap) <= 2 + server._deadlines._SLACK
+
+    obj.pending[0].complete('done')
+    server._send_completed()
+    assert not server._deadlines and server._deadlines.next_deadline is None
+    server.close()
+
+
+class _SlowObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.pending = []
+        self.calls = 0
+
+    @dbus_objects.object.dbus_method()
+    def work(self) -> str:
+        self.calls += 1
+        return 'done'
+
+    @dbus_objects.object.dbus_method(timeout=60)
+    def patient(self) -> bool:
+        return dbus_objects.integration.current_call().cancelled
+
+    @dbus_objects.object.dbus_method(timeout=0.2)
+    def wait(self) -> str:
+        reply = dbus_objects.integration.PendingReply()
+        self.pending.append(reply)
+        return reply
+
+
+def _slow_call(destination, member, serial=1):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name=destination,
+        interface='com.example.object.SlowObject',
+    ), member)
+    msg.header.serial = serial
+    return msg
+
+
+def test_call_timeout():
+    obj = _SlowObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.timeout')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    server.set_call_timeout(0.05)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    server._handle_msg(_slow_call('io.github.ffy00.dbus-objects.tests.timeout', 'Work', 1), connection)
+    server._handle_msg(_slow_call('io.github.ffy00.dbus-objects.tests.timeout', 'Patient', 2), connection)
+    time.sleep(0.1)
+    server._run_queue()
+
+    expired, patient = connection.sent
+    assert expired.header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Error.Timeout'
+    assert obj.calls == 0
+    assert patient.body == (False,)  # the method timeout overrides the server one
+    assert server.expired_calls == 1
+    with pytest.raises(ValueError):
+        server.set_call_timeout(0)
+    server.close()
+
+
+def test_deferred_reply_timeout(jeepney_connection):
+    obj = _SlowObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.deferred-timeout')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    start = time.monotonic()
+    reply = jeepney_connection.send_and_get_reply(
+        _slow_call('io.github.ffy00.dbus-objects.tests.deferred-timeout', 'Wait'), timeout=5
+    )
+    assert time.monotonic() - start < 2
+    assert reply.header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Error.Timeout'
+    assert obj.pending[0].cancelled
+    obj.pending[0].complete('late')  # ignored
+
+    time.sleep(0.2)
+    run.clear()
+    jeepney_connection.send_and_get_reply(
+        _slow_call('io.github.ffy00.dbus-objects.tests.deferred-timeout', 'Work'), timeout=5
+    )
+    thread.join(timeout=5)
+    server.close()
+
+
+class _Item(typing.NamedTuple):
+    name: str
+    count: int
+
+
+@dataclasses.dataclass
+class _Order:
+    customer: str
+    items: typing.List[_Item]
+
+
+class _StructObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+
+    @dbus_objects.object.dbus_method()
+    def merge(self, orders: typing.List[_Order]) -> _Order:
+        assert all(isinstance(order, _Order) for order in orders)
+        return _Order(
+            ', '.join(order.customer for order in orders),
+            [item for order in orders for item in order.items],
+        )
+
+
+def test_struct_method():
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.structs')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _StructObject())
+    connection = _StubConnection('SESSION', ':1.1')
+
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.structs',
+        interface='com.example.object.StructObject',
+    ), 'Merge', 'a(sa(si))', ([('alice', [('apple', 1)]), ('bob', [('pear', 2), ('plum', 3)])],))
+    msg.header.serial = 1
+    server._handle_msg(msg, connection)
+    server._run_queue()
+
+    reply, = connection.sent
+    assert reply.header.fields[jeepney.HeaderFields.signature] == '(sa(si))'
+    assert reply.body == (('alice, bob', [('apple', 1), ('pear', 2), ('plum', 3)]),)
+    reply.serialise(serial=1)  # marshals
+    server.close()
+
+
+class _LaneObject(dbus_objects.object.DBusObject):
+    def __init__(self, events):
+        super().__init__(default_interface_root='com.example.object')
+        self.events = events
+        self.release = threading.Event()
+
+    @dbus_objects.object.dbus_method()
+    def slow(self) -> str:
+        self.release.wait(timeout=5)
+        self.events.append('slow')
+        return dbus_objects.integration.current_call().sender
+
+    @dbus_objects.object.dbus_method()
+    def record(self, value: str) -> str:
+        self.events.append(value)
+        return threading.current_thread().name
+
+
+def test_worker_lanes():
+    events = []
+    a, b = _LaneObject(events), _LaneObject(events)
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.lanes')
+    server.register_object('/io/github/ffy00/dbus_objects/a', a)
+    server.register_object('/io/github/ffy00/dbus_objects/b', b)
+    server.set_worker_lanes(2, key=lambda path: 0 if path.endswith('/a') else 1)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    def call(path, member, serial, *body):
+        msg = jeepney.new_method_call(jeepney.DBusAddress(
+            path,
+            bus_name='io.github.ffy00.dbus-objects.tests.lanes',
+            interface='com.example.object.LaneObject',
+        ), member, 's' if body else None, body)
+        msg.header.serial = serial
+        msg.header.fields[jeepney.HeaderFields.sender] = ':1.42'
+        server._handle_msg(msg, connection)
+
+    call('/io/github/ffy00/dbus_objects/a', 'Slow', 1)
+    call('/io/github/ffy00/dbus_objects/a', 'Record', 2, 'a')
+    call('/io/github/ffy00/dbus_objects/b', 'Record', 3, 'b')
+    server._run_queue()
+
+    # the call to the other object is not stuck behind the slow one
+    deadline = time.monotonic() + 5
+    while not connection.sent and time.monotonic() < deadline:
+        server._send_completed()
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [3]
+    assert events == ['b']
+
+    a.release.set()
+    while len(connection.sent) < 3 and time.monotonic() < deadline:
+        server._send_completed()
+    # calls to the same object run in order
+    assert events == ['b', 'slow', 'a']
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [3, 1, 2]
+    # in the lanes, with the call context
+    assert connection.sent[1].body == (':1.42',)
+    assert connection.sent[2].body[0].startswith('dbus-objects-lane-')
+    assert [lane['count'] for lane in server.lane_stats] == [2, 1]
+
+    server.set_worker_lanes(0)
+    assert server.lane_stats == []
+    call('/io/github/ffy00/dbus_objects/b', 'Record', 4, 'c')
+    server._run_queue()
+    assert connection.sent[-1].body == (threading.current_thread().name,)
+    server.close()
+
+
+def test_worker_lanes_backpressure():
+    events = []
+    a, b = _LaneObject(events), _LaneObject(events)
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.lanes')
+    server.register_object('/io/github/ffy00/dbus_objects/a', a)
+    server.register_object('/io/github/ffy00/dbus_objects/b', b)
+    server.set_worker_lanes(2, key=lambda path: 0 if path.endswith('/a') else 1, max_queued=2)
+    connection = _StubConnection('SESSION', ':1.1')
+
+    def call(path, member, serial, *body, sender=':1.42'):
+        msg = jeepney.new_method_call(jeepney.DBusAddress(
+            path,
+            bus_name='io.github.ffy00.dbus-objects.tests.lanes',
+            interface='com.example.object.LaneObject',
+        ), member, 's' if body else None, body)
+        msg.header.serial = serial
+        msg.header.fields[jeepney.HeaderFields.sender] = sender
+        server._handle_msg(msg, connection)
+
+    call('/io/github/ffy00/dbus_objects/a', 'Slow', 1)
+    server._run_queue()
+    deadline = time.monotonic() + 5
+    while server.lane_stats[0]['queued'] and time.monotonic() < deadline:
+        time.sleep(0.01)  # the slow call starts running
+    for serial in range(2, 6):
+        call('/io/github/ffy00/dbus_objects/a', 'Record', serial, f'a{serial}')
+    call('/io/github/ffy00/dbus_objects/b', 'Record', 6, 'b', sender=':1.43')
+    server._run_queue()
+
+    # only two calls wait in the busy lane, the rest stay in the dispatch queue
+    assert server.lane_stats[0]['queued'] == 2
+    assert len(server._queue) == 2
+    assert server._queue_blocked
+    # calls of other senders to the other lane are not held back
+    while not connection.sent and time.monotonic() < deadline:
+        server._send_completed()
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [6]
+
+    a.release.set()
+    while len(connection.sent) < 6 and time.monotonic() < deadline:
+        server._run_queue()
+        server._send_completed()
+    assert events == ['b', 'slow', 'a2', 'a3', 'a4', 'a5']
+    assert server.lane_stats[0]['max_queued'] == 2
+    with pytest.raises(ValueError):
+        server.set_worker_lanes(2, max_queued=0)
+    server.close()
+
+
+class _FailingObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.calls = 0
+
+    @dbus_objects.object.dbus_method()
+    def fail(self) -> str:
+        self.calls += 1
+        raise ValueError('failed')
+
+    @dbus_objects.object.dbus_method()
+    def deny(self) -> str:
+        raise dbus_objects.errors.AccessDenied('not you')
+
+    @dbus_objects.object.dbus_method()
+    def echo(self, value: str) -> str:
+        self.calls += 1
+        return value
+
+
+def _failing_call(path, interface, member, serial=1, signature=None, body=()):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        path,
+        bus_name='io.github.ffy00.dbus-objects.tests.errors',
+        interface=interface,
+    ), member, signature, body)
+    msg.header.serial = serial
+    return msg
+
+
+def test_error_replies():
+    obj = _FailingObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.errors')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+    path = '/io/github/ffy00/dbus_objects/example'
+    interface = 'com.example.object.FailingObject'
+
+    for msg in [
+        _failing_call('/io/github/ffy00/missing', interface, 'Fail', 1),
+        _failing_call(path, 'com.example.Missing', 'Fail', 2),
+        _failing_call(path, interface, 'Missing', 3),
+        _failing_call(path, interface, 'Echo', 4, 'i', (1,)),
+        _failing_call(path, interface, 'Fail', 5),
+        _failing_call(path, interface, 'Deny', 6),
+        _failing_call(path, None, 'Echo', 7, 's', ('no interface',)),
+    ]:
+        server._handle_msg(msg, connection)
+    server._run_queue()
+
+    # the lookup errors are sent right away, without going through the queue
+    assert [msg.header.fields[jeepney.HeaderFields.reply_serial] for msg in connection.sent] == [1, 2, 3, 4, 5, 6, 7]
+    assert [msg.header.fields.get(jeepney.HeaderFields.error_name) for msg in connection.sent] == [
+        'org.freedesktop.DBus.Error.UnknownObject',
+        'org.freedesktop.DBus.Error.UnknownInterface',
+        'org.freedesktop.DBus.Error.UnknownMethod',
+        'org.freedesktop.DBus.Error.InvalidArgs',
+        'org.freedesktop.DBus.Python.ValueError',
+        'org.freedesktop.DBus.Error.AccessDenied',
+        None,
+    ]
+    assert connection.sent[4].body == ('failed',)
+    assert connection.sent[6].body == ('no interface',)
+    server.close()
+
+
+def test_no_reply_expected():
+    obj = _FailingObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.errors')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    connection = _StubConnection('SESSION', ':1.1')
+    path = '/io/github/ffy00/dbus_objects/example'
+    interface = 'com.example.object.FailingObject'
+
+    for msg in [
+        _failing_call(path, interface, 'Echo', 1, 's', ('value',)),
+        _failing_call(path, interface, 'Fail', 2),
+        _failing_call(path, interface, 'Missing', 3),
+    ]:
+        msg.header.flags |= jeepney.low_level.MessageFlag.no_reply_expected
+        server._handle_msg(msg, connection)
+    server._run_queue()
+
+    assert obj.calls == 2
+    assert not connection.sent
+    server.close()
+
+
+def test_error_reply_keeps_connection(jeepney_connection):
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.errors-bus')
+    server.register_object('/io/github/ffy00/dbus_objects/example', _FailingObject())
+
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+
+    client = jeepney.DBusAddress(
+        '/io/github/ffy00/dbus_objects/example',
+        bus_name='io.github.ffy00.dbus-objects.tests.errors-bus',
+        interface='com.example.object.FailingObject',
+    )
+    reply = jeepney_connection.send_and_get_reply(jeepney.new_method_call(client, 'Fail'), timeout=5)
+    assert reply.header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Python.ValueError'
+    # the server is still connected to the bus after replying with the error
+    reply = jeepney_connection.send_and_get_reply(jeepney.new_method_call(client, 'Echo', 's', ('hi',)), timeout=5)
+    assert reply.body == ('hi',)
+
+    time.sleep(0.2)
+    run.clear()
+    jeepney_connection.send_and_get_reply(jeepney.new_method_call(client, 'Echo', 's', ('bye',)), timeout=5)
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_worker_lanes_errors():
+    obj = _FailingObject()
+    server = BlockingDBusServer(bus='SESSION', name='io.github.ffy00.dbus-objects.tests.errors')
+    server.register_object('/io/github/ffy00/dbus_objects/example', obj)
+    server.set_worker_lanes(4)
+    connection = _StubConnection('SESSION', ':1.1')
+    for msg in [
+        _failing_call('/io/github/ffy00/dbus_objects/example', 'com.example.object.FailingObject', 'Fail', 1),
+        _failing_call('/io/github/ffy00/dbus_objects/example', 'com.example.object.FailingObject', 'Deny', 2),
+    ]:
+        server._handle_msg(msg, connection)
+    server._run_queue()
+    server._lanes.wait_idle(timeout=5)
+    server._send_completed()
+
+    assert [msg.header.fields.get(jeepney.HeaderFields.error_name) for msg in connection.sent] == [
+        'org.freedesktop.DBus.Python.ValueError',
+        'org.freedesktop.DBus.Error.AccessDenied',
+    ]
+    server.close()
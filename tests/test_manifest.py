@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: MIT
+
+import dataclasses
+import json
+import typing
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import dbus_objects.manifest
+
+from dbus_objects.object import DBusObject, dbus_method, dbus_property
+from dbus_objects.types import Variant
+
+
+@pytest.fixture()
+def manifest_path(tmp_path):
+    yield str(tmp_path / 'manifest.json')
+    dbus_objects.manifest.disable_manifest()
+
+
+def _make_class(return_type: typing.Any = str):
+    class ManifestObject(DBusObject):
+        def __init__(self):
+            super().__init__(default_interface_root='io.github.ffy00.dbus_objects.test')
+
+        @dbus_method(return_names=('greeting',))
+        def hello(self, name: str, times: int) -> return_type:
+            return name * times
+
+        @dbus_method()
+        def anything(self) -> Variant:
+            return 1
+
+        @dbus_property()
+        def counter(self) -> int:
+            return 1
+
+        @counter.setter
+        def counter(self, value: int) -> None:
+            pass
+
+    return ManifestObject
+
+
+def _descriptors(cls):
+    return {attribute: descriptor for attribute, descriptor in cls._dbus_methods + cls._dbus_properties}
+
+
+def _xml(cls):
+    return {attribute: ET.tostring(descriptor.xml) for attribute, descriptor in _descriptors(cls).items()}
+
+
+def test_manifest_roundtrip(manifest_path):
+    expected = _make_class()
+    expected_xml = _xml(expected)
+
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    _make_class()
+    assert (manifest.hits, manifest.misses) == (0, 1)
+    manifest.save()
+
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_class()
+    assert (manifest.hits, manifest.misses) == (1, 0)
+
+    descriptors = _descriptors(cls)
+    # nothing was resolved from the annotations
+    assert all(descriptor._signatures is None for descriptor in descriptors.values())
+    assert descriptors['hello'].signature == ('si', 's')
+    assert descriptors['counter'].signature == 'i'
+    assert _xml(cls) == expected_xml
+    assert all(descriptor._signatures is None for descriptor in descriptors.values())
+
+    # return values are only converted when needed
+    assert descriptors['hello'].convert_return('a') == 'a'
+    assert descriptors['hello']._signatures is None
+    assert descriptors['anything'].convert_return(1) == ('i', 1)
+
+    obj = cls()
+    assert [descriptor.name for _method, descriptor in obj.get_dbus_methods()] == ['Hello', 'Anything']
+
+
+def test_manifest_stale(manifest_path):
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    _make_class()
+    manifest.save()
+
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_class(int)
+    assert (manifest.hits, manifest.misses) == (0, 1)
+    assert _descriptors(cls)['hello'].signature == ('si', 'i')
+    manifest.save()
+
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_class(int)
+    assert (manifest.hits, manifest.misses) == (1, 0)
+    assert _descriptors(cls)['hello'].signature == ('si', 'i')
+
+
+def _make_struct_class(field_type):
+    @dataclasses.dataclass
+    class Entry:
+        value: field_type
+
+    class StructObject(DBusObject):
+        @dbus_method()
+        def entries(self) -> typing.List[Entry]:
+            return []
+
+    return StructObject
+
+
+def test_manifest_struct_fields(manifest_path):
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    _make_struct_class(int)
+    manifest.save()
+
+    # the struct changed, not the method annotations
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_struct_class(str)
+    assert (manifest.hits, manifest.misses) == (0, 1)
+    assert _descriptors(cls)['entries'].signature == ('', 'a(s)')
+
+
+def test_manifest_malformed_entry(manifest_path):
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    _make_class()
+    manifest.save()
+
+    with open(manifest_path) as f:
+        data = json.load(f)
+    for entry in data['classes'].values():
+        entry['members']['hello'] = {}
+    with open(manifest_path, 'w') as f:
+        json.dump(data, f)
+
+    dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_class()
+    assert _descriptors(cls)['hello'].signature == ('si', 's')
+
+
+def test_manifest_corrupt_file(manifest_path):
+    with open(manifest_path, 'w') as f:
+        f.write('{not json')
+
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    cls = _make_class()
+    assert manifest.misses == 1
+    assert _descriptors(cls)['hello'].signature == ('si', 's')
+    manifest.save()
+
+    with open(manifest_path) as f:
+        assert json.load(f)['version'] == 1
+
+
+def test_manifest_save_unchanged(manifest_path):
+    manifest = dbus_objects.manifest.use_manifest(manifest_path, autosave=False)
+    manifest.save()
+    with pytest.raises(FileNotFoundError):
+        open(manifest_path)
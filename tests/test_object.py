@@ -1,11 +1,13 @@
 # SPDX-License-Identifier: MIT
 
+import typing
 import xml.etree.ElementTree as ET
 
 import pytest
 import xmldiff
 
-from dbus_objects.object import DBusObject, DBusObjectException, dbus_method
+from dbus_objects.object import DBusObject, DBusObjectException, dbus_method, dbus_property
+from dbus_objects.types import MultipleReturn
 
 
 def test_dbus_object(obj):
@@ -87,3 +89,276 @@ def test_property_xml(obj_properties):
             )
             return
     assert False  # pragma: no cover
+
+
+class CachedObject(DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.reads = 0
+        self._value = 'value'
+
+    @dbus_property(cache=True)
+    def cached(self) -> str:
+        self.reads += 1
+        return self._value
+
+    @cached.setter
+    def cached(self, value: str):
+        self._value = value
+
+    @dbus_property(max_age=0)
+    def expired(self) -> int:
+        self.reads += 1
+        return self.reads
+
+    @dbus_property()
+    def uncached(self) -> str:
+        return 'uncached'
+
+
+def test_property_cache():
+    obj = CachedObject()
+
+    assert obj.cached == 'value'
+    assert obj.cached == 'value'
+    assert obj.reads == 1
+
+    obj.cached = 'new value'
+    assert obj.cached == 'new value'
+    assert obj.reads == 2
+
+    obj._value = 'changed behind our back'
+    assert obj.cached == 'new value'
+    obj.invalidate_dbus_property('cached')
+    assert obj.cached == 'changed behind our back'
+    assert obj.reads == 3
+
+
+def test_property_cache_max_age():
+    obj = CachedObject()
+
+    assert obj.expired == 1
+    assert obj.expired == 2
+
+
+def test_property_cache_getters():
+    obj = CachedObject()
+
+    values = {
+        descriptor.name: getter()
+        for getter, _setter, descriptor in obj.get_dbus_properties()
+    }
+    assert values['Cached'] == 'value'
+    assert values['Uncached'] == 'uncached'
+    assert obj.cached == 'value'
+    assert obj.reads == 2  # cached getter + expired getter
+
+
+def test_property_cache_negative_max_age():
+    with pytest.raises(ValueError):
+        dbus_property(max_age=-1)(lambda self: 0)
+
+
+@pytest.mark.parametrize('rate_limit', [(0, 1), (-1, 1), (1, 0), (1, 0.5)])
+def test_method_invalid_rate_limit(rate_limit):
+    def method(self) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        dbus_method(rate_limit=rate_limit)(method)
+
+
+def test_property_getters_bind_own_property():
+    class TwoProperties(DBusObject):
+        def __init__(self):
+            super().__init__(default_interface_root='com.example.object')
+            self._first = 'first'
+            self._second = 'second'
+
+        @dbus_property()
+        def first(self) -> str:
+            return self._first
+
+        @first.setter
+        def first(self, value: str):
+            self._first = value
+
+        @dbus_property()
+        def second(self) -> str:
+            return self._second
+
+        @second.setter
+        def second(self, value: str):
+            self._second = value
+
+    obj = TwoProperties()
+    properties = {
+        descriptor.name: (getter, setter)
+        for getter, setter, descriptor in obj.get_dbus_properties()
+    }
+
+    assert properties['First'][0]() == 'first'
+    assert properties['Second'][0]() == 'second'
+    properties['First'][1]('changed')
+    assert obj.first == 'changed'
+    assert obj.second == 'second'
+
+
+class BatchObject(DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.vectorized_calls = 0
+
+    @dbus_method(batch=True)
+    def lookup(self, key: int, suffix: str) -> str:
+        return f'{key}{suffix}'
+
+    @dbus_method(batch=True, multiple_returns=True)
+    def split(self, key: int) -> MultipleReturn[int, str]:
+        return key, str(key)
+
+    @dbus_method()
+    def square(self, value: int) -> int:
+        return value * value  # pragma: no cover
+
+    @square.batch_implementation
+    def square(self, calls):
+        self.vectorized_calls += 1
+        return [(value * value,) for value, in calls]
+
+
+def test_batch_methods():
+    obj = BatchObject()
+    methods = {descriptor.name: (method, descriptor) for method, descriptor in obj.get_dbus_methods()}
+
+    assert methods['LookupBatch'][1].signature == ('a(is)', 'a(s)')
+    assert methods['SplitBatch'][1].signature == ('a(i)', 'a(is)')
+    assert methods['SquareBatch'][1].signature == ('a(i)', 'a(i)')
+    assert methods['LookupBatch'][1].interface == 'com.example.object.BatchObject'
+
+    assert methods['LookupBatch'][0]([(1, 'a'), (2, 'b')]) == [('1a',), ('2b',)]
+    assert methods['SplitBatch'][0]([(1,), (2,)]) == [(1, '1'), (2, '2')]
+    assert methods['SquareBatch'][0]([(2,), (3,)]) == [(4,), (9,)]
+    assert obj.vectorized_calls == 1
+
+
+def test_batch_method_without_arguments():
+    with pytest.raises((DBusObjectException, RuntimeError)):  # wrapped in RuntimeError before 3.12
+        class InvalidBatchObject(DBusObject):
+            @dbus_method(batch=True)
+            def nothing(self) -> str:
+                return ''  # pragma: no cover
+
+
+class StreamObject(DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+
+    @dbus_method(chunk_size=10)
+    def records(self, count: int) -> typing.Iterator[str]:
+        for i in range(count):
+            yield str(i)
+
+
+def test_stream_method_signatures():
+    obj = StreamObject()
+    signatures = {descriptor.name: descriptor.signature for _method, descriptor in obj.get_dbus_methods()}
+    assert signatures == {
+        'Records': ('i', 't'),
+        'RecordsNext': ('t', 'asb'),
+        'RecordsCancel': ('t', ''),
+    }
+    # python callers still get the generator
+    assert list(obj.records(3)) == ['0', '1', '2']
+
+
+@pytest.mark.parametrize('options', [
+    {'return_names': ('items',)},
+    {'multiple_returns': True},
+    {'batch': True},
+])
+def test_stream_method_unsupported_options(options):
+    def records(self) -> typing.Iterator[str]:
+        yield ''  # pragma: no cover
+
+    with pytest.raises(DBusObjectException):
+        dbus_method(**options)(records)
+
+
+def test_stream_method_needs_item_type():
+    with pytest.raises(DBusObjectException):
+        @dbus_method()
+        def records(self) -> typing.Iterator:
+            yield  # pragma: no cover
+
+
+def test_member_table_shared():
+    class SlottedObject(DBusObject):
+        __slots__ = ()
+
+        def __init__(self, root='com.example'):
+            super().__init__(default_interface_root=root)
+
+        @dbus_method()
+        def ping(self) -> str:
+            return 'Pong!'  # pragma: no cover
+
+        @dbus_property()
+        def prop(self) -> str:
+            return 'value'  # pragma: no cover
+
+    first, second, other_root = SlottedObject(), SlottedObject(), SlottedObject('com.other')
+    table = first._dbus_member_table()
+    assert table is second._dbus_member_table()
+    assert table is not other_root._dbus_member_table()
+    assert list(table.methods['com.example.SlottedObject']) == ['Ping']
+    assert list(table.properties['com.example.SlottedObject']) == ['Prop']
+    assert table.properties['com.example.SlottedObject']['Prop'][0] == 'prop'
+    assert list(other_root._dbus_member_table().methods) == ['com.other.SlottedObject']
+
+    # DBusObject adds no per-instance dictionary
+    assert not hasattr(first, '__dict__')
+
+
+def test_interface_per_instance():
+    class RootedObject(DBusObject):
+        def __init__(self, root):
+            super().__init__(default_interface_root=root)
+
+        @dbus_method()
+        def ping(self) -> str:
+            return 'Pong!'  # pragma: no cover
+
+    first = dict((descriptor.name, descriptor) for _method, descriptor in RootedObject('com.first').get_dbus_methods())
+    second = dict((descriptor.name, descriptor) for _method, descriptor in RootedObject('com.second').get_dbus_methods())
+    # the descriptor shared by the class is not modified, each root gets its own copy
+    assert first['Ping'].interface == 'com.first.RootedObject'
+    assert second['Ping'].interface == 'com.second.RootedObject'
+    with pytest.raises(ValueError):
+        RootedObject.__dict__['ping'].interface
+
+
+def test_inherited_members():
+    class BaseObject(DBusObject):
+        def __init__(self):
+            super().__init__(default_interface_root='com.example')
+
+        @dbus_method()
+        def ping(self) -> str:
+            return 'Pong!'  # pragma: no cover
+
+        @dbus_method()
+        def hidden(self) -> str:
+            return 'hidden'  # pragma: no cover
+
+    class ChildObject(BaseObject):
+        @dbus_method()
+        def extra(self) -> str:
+            return 'extra'  # pragma: no cover
+
+        def hidden(self):
+            pass  # pragma: no cover
+
+    assert [name for name, _descriptor in BaseObject._dbus_methods] == ['ping', 'hidden']
+    assert [name for name, _descriptor in ChildObject._dbus_methods] == ['ping', 'extra']
+    assert [descriptor.name for _method, descriptor in ChildObject().get_dbus_methods()] == ['Ping', 'Extra']
@@ -0,0 +1,225 @@
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import time
+
+import jeepney
+import jeepney.auth
+import jeepney.io.blocking
+import pytest
+
+import dbus_objects.integration
+import dbus_objects.object
+
+from dbus_objects.integration.jeepney import BlockingDBusServer
+from dbus_objects.integration.peer import SASLExternal, open_peer_connection
+from dbus_objects.policy import Policy
+
+
+NAME = 'io.github.ffy00.dbus-objects.tests.peer'
+PATH = '/io/github/ffy00/dbus_objects/example'
+
+
+def _hex(uid):
+    return str(uid).encode().hex().encode()
+
+
+def test_sasl_external():
+    auth = SASLExternal(1000, {1000}, 'abcd')
+    assert auth.feed(b'\0AUTH EXTERNAL ' + _hex(1000) + b'\r\n') == b'OK abcd\r\n'
+    assert not auth.authenticated
+    assert auth.feed(b'BEGIN\r\nl\x01\x00\x01') == b''
+    assert auth.authenticated
+    assert auth.remaining == b'l\x01\x00\x01'
+
+
+def test_sasl_external_split_data():
+    auth = SASLExternal(1000, {1000}, 'abcd')
+    assert auth.feed(b'\0AUTH EXTER') == b''
+    assert auth.feed(b'NAL\r\n') == b'DATA\r\n'
+    # no identity, the one of the socket is used
+    assert auth.feed(b'DATA\r\n') == b'OK abcd\r\n'
+    assert auth.feed(b'NEGOTIATE_UNIX_FD\r\n').startswith(b'ERROR')
+    assert auth.feed(b'BEGIN\r\n') == b''
+    assert auth.authenticated
+
+
+def test_sasl_external_rejected():
+    auth = SASLExternal(1000, {1000}, 'abcd')
+    assert auth.feed(b'\0AUTH ANONYMOUS\r\n') == b'REJECTED EXTERNAL\r\n'
+    # claiming to be someone else
+    assert auth.feed(b'AUTH EXTERNAL ' + _hex(0) + b'\r\n') == b'REJECTED EXTERNAL\r\n'
+    assert not auth.failed
+    assert auth.feed(b'AUTH EXTERNAL zz\r\n') == b''
+    assert auth.failed
+
+    auth = SASLExternal(1001, {1000}, 'abcd')
+    assert auth.feed(b'\0AUTH EXTERNAL ' + _hex(1001) + b'\r\n') == b'REJECTED EXTERNAL\r\n'
+
+
+@pytest.mark.parametrize('data', [
+    b'AUTH EXTERNAL\r\n',  # no nul byte
+    b'\0BEGIN\r\n',  # BEGIN before OK
+    b'\0' + b'A' * 20000,  # line too long
+])
+def test_sasl_external_protocol_error(data):
+    auth = SASLExternal(1000, {1000}, 'abcd')
+    auth.feed(data)
+    assert auth.failed
+    assert auth.remaining == b''
+
+
+class _PeerObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.released = threading.Event()
+
+    @dbus_objects.object.dbus_method()
+    def whoami(self) -> str:
+        context = dbus_objects.integration.current_call()
+        context.add_resource(self.released.set)
+        return context.sender
+
+    @dbus_objects.object.dbus_method(policy=Policy(uids=[os.getuid()]))
+    def protected(self) -> int:
+        return dbus_objects.integration.current_call().credentials.pid
+
+    @dbus_objects.object.dbus_method()
+    def echo(self, value: str) -> str:
+        return value
+
+
+def _call(connection, member, bus_name=NAME):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        PATH, bus_name=bus_name, interface='com.example.object.PeerObject',
+    ), member)
+    return connection.send_and_get_reply(msg, timeout=5)
+
+
+@pytest.fixture()
+def peer_server():
+    obj = _PeerObject()
+    server = BlockingDBusServer(bus='SESSION', name=NAME)
+    server.register_object(PATH, obj)
+    server.listen_peer()
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+    yield server, obj
+    time.sleep(0.2)
+    run.clear()
+    # wake the loop up
+    with jeepney.io.blocking.open_dbus_connection('SESSION') as connection:
+        _call(connection, 'Whoami')
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_peer_connection(peer_server):
+    server, obj = peer_server
+    with jeepney.io.blocking.open_dbus_connection('SESSION') as bus:
+        reply = bus.send_and_get_reply(jeepney.new_method_call(jeepney.DBusAddress(
+            '/', bus_name=NAME, interface='io.github.ffy00.dbus_objects.PeerToPeer',
+        ), 'GetAddress'), timeout=5)
+    address = reply.body[0]
+    assert address == server.peer_address
+
+    # the destination is ignored, there is no bus
+    connection = open_peer_connection(address)
+    reply = _call(connection, 'Whoami', bus_name='com.example.anything')
+    assert reply.header.message_type == jeepney.MessageType.method_return
+    assert jeepney.HeaderFields.destination not in reply.header.fields
+    sender = reply.body[0]
+    assert server.peers == [sender]
+    # the credentials come from the socket
+    assert _call(connection, 'Protected').body == (os.getpid(),)
+
+    connection.close()
+    assert obj.released.wait(timeout=5)
+    deadline = time.monotonic() + 5
+    while server.peers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.peers == []
+
+
+def test_peer_connection_refused():
+    server = BlockingDBusServer(bus='SESSION', name=NAME)
+    address = server.listen_peer(uids=[])
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(jeepney.auth.AuthenticationError):
+            open_peer_connection(address, timeout=5)
+    finally:
+        time.sleep(0.2)
+        run.clear()
+        with jeepney.io.blocking.open_dbus_connection('SESSION') as connection:
+            _call(connection, 'Whoami')
+        thread.join(timeout=5)
+        server.close()
+
+
+@pytest.mark.parametrize('limits', [
+    {'max_buffer': 256 * 1024},  # dropped once too much is waiting
+    {'send_timeout': 0.5},  # dropped once nothing could be written for a while
+])
+def test_peer_not_reading(limits):
+    server = BlockingDBusServer(bus='SESSION', name=NAME)
+    server.register_object(PATH, _PeerObject())
+    address = server.listen_peer(**limits)
+    run = threading.Event()
+    run.set()
+    thread = threading.Thread(target=server.listen, kwargs={'event': run}, daemon=True)
+    thread.start()
+    try:
+        connection = open_peer_connection(address)
+        msg = jeepney.new_method_call(jeepney.DBusAddress(
+            PATH, bus_name=NAME, interface='com.example.object.PeerObject',
+        ), 'Echo', 's', ('x' * 64 * 1024,))
+        try:
+            for _ in range(32):  # 2 MiB of replies the client never reads
+                connection.send(msg)
+        except OSError:
+            pass  # already dropped
+        # the loop is not stuck writing to the client
+        with jeepney.io.blocking.open_dbus_connection('SESSION') as bus:
+            assert _call(bus, 'Whoami').header.message_type == jeepney.MessageType.method_return
+        deadline = time.monotonic() + 5
+        while server.peers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.peers == []
+        connection.close()
+    finally:
+        time.sleep(0.2)
+        run.clear()
+        with jeepney.io.blocking.open_dbus_connection('SESSION') as bus:
+            _call(bus, 'Whoami')
+        thread.join(timeout=5)
+        server.close()
+
+    with pytest.raises(ValueError):
+        server.listen_peer(send_timeout=0)
+
+
+def test_stop_peer(tmp_path):
+    server = BlockingDBusServer(bus='SESSION', name=NAME)
+    socket_path = tmp_path / 'socket'
+    address = server.listen_peer(f'unix:path={socket_path}')
+    assert address == server.peer_address
+    assert server.get_method('/', 'io.github.ffy00.dbus_objects.PeerToPeer', 'GetAddress')[0]() == address
+
+    server.stop_peer()
+    assert server.peer_address is None
+    with pytest.raises(KeyError):
+        server.get_method('/', 'io.github.ffy00.dbus_objects.PeerToPeer', 'GetAddress')
+
+    # the default address is in a private directory, removed when closed
+    address = server.listen_peer()
+    directory = os.path.dirname(address[len('unix:path='):])
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    server.close()
+    assert not os.path.exists(directory)
@@ -0,0 +1,31 @@
+# SPDX-License-Identifier: MIT
+
+from dbus_objects.policy import Credentials, Policy
+
+
+def test_credentials_from_dbus():
+    credentials = Credentials.from_dbus({
+        'UnixUserID': ('u', 1000),
+        'UnixGroupIDs': ('au', [1000, 10]),
+        'ProcessID': ('u', 1234),
+        'LinuxSecurityLabel': ('ay', b'unconfined'),
+    })
+    assert credentials.uid == 1000
+    assert credentials.gids == {1000, 10}
+    assert credentials.pid == 1234
+
+
+def test_policy_uids_gids():
+    policy = Policy(uids=[0], gids=[10])
+    assert policy.allows(Credentials(uid=0))
+    assert policy.allows(Credentials(uid=1000, gids=[1000, 10]))
+    assert not policy.allows(Credentials(uid=1000, gids=[1000]))
+    assert not policy.allows(Credentials())
+
+
+def test_policy_check():
+    policy = Policy(uids=[1000], check=lambda credentials: credentials.pid == 1)
+    assert policy.allows(Credentials(uid=1000, pid=1))
+    assert not policy.allows(Credentials(uid=1000, pid=2))
+    assert not policy.allows(Credentials(uid=0, pid=1))
+    assert Policy().allows(Credentials())
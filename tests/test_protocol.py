@@ -0,0 +1,253 @@
+# SPDX-License-Identifier: MIT
+
+import os
+import select
+import socket
+import threading
+import time
+
+import jeepney
+import jeepney.bus
+import jeepney.io.blocking
+import jeepney.low_level
+import pytest
+
+import dbus_objects.integration
+import dbus_objects.object
+
+from dbus_objects.integration.protocol import DBusProtocol
+from dbus_objects.policy import Credentials, Policy
+
+
+NAME = 'io.github.ffy00.dbus-objects.tests.protocol'
+PATH = '/io/github/ffy00/dbus_objects/example'
+
+
+class _ProtocolObject(dbus_objects.object.DBusObject):
+    def __init__(self):
+        super().__init__(default_interface_root='com.example.object')
+        self.pending = None
+
+    @dbus_objects.object.dbus_method()
+    def echo(self, value: str) -> str:
+        return value
+
+    @dbus_objects.object.dbus_method()
+    def whoami(self) -> str:
+        return dbus_objects.integration.current_call().sender
+
+    @dbus_objects.object.dbus_method()
+    def fail(self) -> None:
+        raise ValueError('failed')
+
+    @dbus_objects.object.dbus_method()
+    def later(self) -> int:
+        self.pending = dbus_objects.integration.PendingReply()
+        return self.pending
+
+    @dbus_objects.object.dbus_method(policy=Policy(uids=[1000]))
+    def protected(self) -> bool:
+        return True
+
+    @dbus_objects.object.dbus_method(rate_limit=(0.001, 2))
+    def limited(self) -> bool:
+        return True
+
+    @dbus_objects.object.dbus_method(timeout=0.05)
+    def expiring(self) -> int:
+        self.pending = dbus_objects.integration.PendingReply()
+        return self.pending
+
+
+def _call(member, signature=None, body=(), serial=1):
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        PATH, bus_name=NAME, interface='com.example.object.ProtocolObject',
+    ), member, signature, body)
+    msg.header.fields[jeepney.HeaderFields.sender] = ':1.42'
+    return msg.serialise(serial=serial)
+
+
+def _parse(data):
+    parser = jeepney.low_level.Parser()
+    parser.add_data(data)
+    messages = []
+    msg = parser.get_next_message()
+    while msg is not None:
+        messages.append(msg)
+        msg = parser.get_next_message()
+    return messages
+
+
+@pytest.fixture()
+def protocol():
+    protocol = DBusProtocol('SESSION', NAME)
+    protocol.register_object(PATH, _ProtocolObject())
+    return protocol
+
+
+def test_method_call(protocol):
+    data = _call('Echo', 's', ('hello',), serial=7) + _call('Whoami', serial=8)
+    # messages split across reads are kept until complete
+    protocol.receive_data(data[:10])
+    assert protocol.data_to_send() == b''
+    protocol.receive_data(data[10:])
+
+    echo, whoami = _parse(protocol.data_to_send())
+    assert echo.header.message_type == jeepney.MessageType.method_return
+    assert echo.header.fields[jeepney.HeaderFields.reply_serial] == 7
+    assert echo.header.fields[jeepney.HeaderFields.destination] == ':1.42'
+    assert echo.body == ('hello',)
+    assert whoami.body == (':1.42',)
+    assert whoami.header.serial == echo.header.serial + 1
+    assert protocol.data_to_send() == b''
+
+
+def test_error_replies(protocol):
+    protocol.receive_data(_call('Missing'))
+    protocol.receive_data(_call('Echo', 'i', (1,)))
+    protocol.receive_data(_call('Fail'))
+    # no reply expected
+    msg = jeepney.new_method_call(jeepney.DBusAddress(
+        PATH, bus_name=NAME, interface='com.example.object.ProtocolObject',
+    ), 'Fail')
+    msg.header.flags |= jeepney.low_level.MessageFlag.no_reply_expected
+    protocol.receive_message(msg)
+
+    assert [msg.header.fields[jeepney.HeaderFields.error_name] for msg in protocol.messages_to_send()] == [
+        'org.freedesktop.DBus.Error.UnknownMethod',
+        'org.freedesktop.DBus.Error.InvalidArgs',
+        'org.freedesktop.DBus.Python.ValueError',
+    ]
+
+
+def test_policy(protocol):
+    protocol.receive_data(_call('Protected'))
+    protocol.receive_data(_call('Protected'), Credentials(uid=0))
+    protocol.receive_data(_call('Protected'), Credentials(uid=1000))
+    replies = protocol.messages_to_send()
+    assert [msg.header.fields.get(jeepney.HeaderFields.error_name) for msg in replies] == [
+        'org.freedesktop.DBus.Error.AccessDenied',
+        'org.freedesktop.DBus.Error.AccessDenied',
+        None,
+    ]
+    assert replies[2].body == (True,)
+
+
+def test_pending_reply():
+    woken = threading.Event()
+    protocol = DBusProtocol('SESSION', NAME, wakeup=woken.set)
+    obj = _ProtocolObject()
+    protocol.register_object(PATH, obj)
+
+    protocol.receive_data(_call('Later', serial=3))
+    assert protocol.messages_to_send() == []
+    thread = threading.Thread(target=obj.pending.complete, args=(42,))
+    thread.start()
+    thread.join()
+    assert woken.is_set()
+    reply, = protocol.messages_to_send()
+    assert reply.header.fields[jeepney.HeaderFields.reply_serial] == 3
+    assert reply.body == (42,)
+
+
+def test_pending_reply_failed():
+    protocol = DBusProtocol('SESSION', NAME)
+    obj = _ProtocolObject()
+    protocol.register_object(PATH, obj)
+
+    protocol.receive_data(_call('Later'))
+    # the error is replied without being raised
+    obj.pending._settle(None, SystemExit('exit'))
+    reply, = protocol.messages_to_send()
+    assert reply.header.message_type == jeepney.MessageType.error
+
+
+def test_rate_limit(protocol):
+    for serial in range(1, 4):
+        protocol.receive_data(_call('Limited', serial=serial))
+    assert [msg.header.fields.get(jeepney.HeaderFields.error_name) for msg in protocol.messages_to_send()] == [
+        None,
+        None,
+        'org.freedesktop.DBus.Error.LimitsExceeded',
+    ]
+
+
+def test_pending_reply_timeout():
+    protocol = DBusProtocol('SESSION', NAME)
+    obj = _ProtocolObject()
+    protocol.register_object(PATH, obj)
+
+    # completed in time
+    protocol.receive_data(_call('Expiring', serial=1))
+    assert protocol.next_deadline is not None
+    obj.pending.complete(1)
+    reply, = protocol.messages_to_send()
+    assert reply.body == (1,)
+    assert protocol.next_deadline is None
+
+    protocol.receive_data(_call('Expiring', serial=2))
+    assert protocol.messages_to_send() == []
+    time.sleep(max(0.0, protocol.next_deadline - time.monotonic()))
+    reply, = protocol.messages_to_send()
+    assert reply.header.fields[jeepney.HeaderFields.error_name] == 'org.freedesktop.DBus.Error.Timeout'
+    assert obj.pending.cancelled
+    assert protocol.next_deadline is None
+
+
+def test_signal_subscription(protocol):
+    received = []
+    protocol.subscribe_signal(received.append, interface='com.example.Signals', member='Changed')
+    add_match, = protocol.messages_to_send()
+    assert add_match.header.fields[jeepney.HeaderFields.member] == 'AddMatch'
+    assert add_match.header.flags & jeepney.low_level.MessageFlag.no_reply_expected
+
+    signal = jeepney.new_signal(jeepney.DBusAddress('/', interface='com.example.Signals'), 'Changed', 's', ('new',))
+    signal.header.fields[jeepney.HeaderFields.sender] = ':1.7'
+    protocol.receive_data(signal.serialise(serial=1))
+    assert received == ['new']
+
+
+def test_bus_connection(protocol):
+    sock = jeepney.io.blocking.prep_socket(jeepney.bus.get_bus('SESSION'))
+    protocol.connect()
+    sock.sendall(protocol.data_to_send())
+
+    run = threading.Event()
+    run.set()
+
+    def serve():
+        while run.is_set():
+            readable, _, _ = select.select([sock], [], [], 0.05)
+            if readable:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                protocol.receive_data(data)
+            sock.sendall(protocol.data_to_send())
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        with jeepney.io.blocking.open_dbus_connection('SESSION') as client:
+            msg = jeepney.new_method_call(jeepney.DBusAddress(
+                PATH, bus_name=NAME, interface='com.example.object.ProtocolObject',
+            ), 'Whoami')
+            reply = client.send_and_get_reply(msg, timeout=5)
+            assert reply.body == (client.unique_name,)
+        assert protocol.unique_name is not None
+        assert protocol.owned_names == {NAME}
+    finally:
+        run.clear()
+        thread.join(timeout=5)
+        sock.close()
+
+
+def test_direct_connection(protocol):
+    # the transport can be a plain socket pair, there is no bus or handshake
+    server, client = socket.socketpair()
+    with server, client:
+        client.sendall(_call('Echo', 's', ('direct',)))
+        protocol.receive_data(server.recv(65536), Credentials(uid=os.getuid()))
+        server.sendall(protocol.data_to_send())
+        reply, = _parse(client.recv(65536))
+        assert reply.body == ('direct',)
@@ -1,5 +1,8 @@
 # SPDX-License-Identifier: MIT
 
+import dataclasses
+import enum
+import pathlib
 import typing
 
 import pytest
@@ -7,7 +10,7 @@ import pytest
 import dbus_objects.types
 
 from dbus_objects.object import DBusObject, DBusObjectException
-from dbus_objects.signature import DBusSignature, dbus_case
+from dbus_objects.signature import DBusSignature, dbus_case, register_variant_type, variant
 
 
 @pytest.mark.parametrize(
@@ -16,6 +19,7 @@ from dbus_objects.signature import DBusSignature, dbus_case
         (str, 's'),
         (int, 'i'),
         (float, 'd'),
+        (bool, 'b'),
         (dbus_objects.types.Byte, 'y'),
         (dbus_objects.types.UInt16, 'q'),
         (dbus_objects.types.UInt32, 'u'),
@@ -115,3 +119,129 @@ def test_get_dbus_sigature_no_annotations():
 
     with pytest.raises(DBusObjectException):
         DBusSignature.from_parameters(method, skip_first_argument=False)
+
+
+class _Color(enum.IntEnum):
+    RED = 1
+
+
+@pytest.mark.parametrize(
+    ('value', 'encoded'),
+    [
+        ('text', ('s', 'text')),
+        (True, ('b', True)),
+        (1, ('i', 1)),
+        (2**40, ('x', 2**40)),
+        (2**63, ('t', 2**63)),
+        (1.5, ('d', 1.5)),
+        (b'raw', ('ay', b'raw')),
+        (_Color.RED, ('i', 1)),
+        ([1, 2], ('ai', [1, 2])),
+        ([1, 2**40], ('ax', [1, 2**40])),
+        (['a', 1], ('av', [('s', 'a'), ('i', 1)])),
+        ([], ('av', [])),
+        ({'a': 'b'}, ('a{ss}', {'a': 'b'})),
+        ({'a': 'b', 'c': 1}, ('a{sv}', {'a': ('s', 'b'), 'c': ('i', 1)})),
+        ({}, ('a{sv}', {})),
+        (('a', 1, [1.0]), ('(siad)', ('a', 1, [1.0]))),
+        ([{'a': 1, 'b': 'c'}], ('aa{sv}', [{'a': ('i', 1), 'b': ('s', 'c')}])),
+    ],
+)
+def test_variant(value, encoded):
+    assert variant(value) == encoded
+
+
+def test_variant_override():
+    assert variant(1, 'u') == ('u', 1)
+    register_variant_type(pathlib.PurePosixPath, 's', str)
+    assert variant({'path': pathlib.PurePosixPath('/tmp')}) == ('a{ss}', {'path': '/tmp'})
+    with pytest.raises(DBusObjectException):
+        variant(complex(1, 1))
+
+
+def test_variant_shape_cache():
+    value = {'a': [1, 2], 'b': [3]}
+    assert variant(value) == ('a{sai}', value)
+    # same shape, the cached signature is used and the value is sent as it is
+    other = {'c': [4], 'd': [5, 6]}
+    encoded = variant(other)
+    assert encoded == ('a{sai}', other)
+    assert encoded.value is other
+    # a different shape is inferred again
+    assert variant({'a': [1, 2**40]}) == ('a{sax}', {'a': [1, 2**40]})
+    assert variant({'a': [1, 'b']}) == ('a{sav}', {'a': [('i', 1), ('s', 'b')]})
+    assert variant([variant(1, 'u')]) == ('au', [1])
+
+
+def test_return_converter():
+    def method() -> typing.Dict[str, dbus_objects.types.Variant]:
+        pass  # pragma: no cover
+
+    def plain() -> typing.Dict[str, str]:
+        pass  # pragma: no cover
+
+    convert = DBusSignature.from_return(method).return_converter()
+    assert convert({'a': 1, 'b': variant('wrapped', 's')}) == {'a': ('i', 1), 'b': ('s', 'wrapped')}
+    # tuples are structs, even when they look like an encoded variant
+    assert convert({'c': ('abc', 5), 'd': ('s', 'x')}) == {'c': ('(si)', ('abc', 5)), 'd': ('(ss)', ('s', 'x'))}
+    assert DBusSignature.from_return(plain).return_converter() is None
+
+
+class _Point(typing.NamedTuple):
+    x: int
+    y: int
+
+
+@dataclasses.dataclass
+class _Shape:
+    name: str
+    points: typing.List[_Point]
+    extra: dbus_objects.types.Variant
+    area: float = dataclasses.field(default=0.0, init=False)
+
+
+@dataclasses.dataclass
+class _Single:
+    value: int
+
+
+def test_struct_signature():
+    assert DBusSignature._type_signature(_Point) == '(ii)'
+    assert DBusSignature._type_signature(_Shape) == '(sa(ii)v)'
+    assert DBusSignature._type_signature(typing.List[_Shape]) == 'a(sa(ii)v)'
+    assert DBusSignature._type_signature(typing.Dict[str, _Point]) == 'a{s(ii)}'
+
+
+def test_struct_missing_annotation():
+    import collections
+
+    with pytest.raises(DBusObjectException):
+        DBusSignature._type_signature(collections.namedtuple('Untyped', ['x']))
+
+
+def test_struct_converters():
+    def method(shapes: typing.List[_Shape], origin: _Point, single: _Single) -> typing.List[_Shape]:
+        pass  # pragma: no cover
+
+    args = ([('square', [(0, 0), (1, 1)], ('s', 'red'))], (2, 3), (4,))
+    shapes, origin, single = DBusSignature.from_parameters(method, False).argument_converter()(args)
+    assert shapes == [_Shape('square', [_Point(0, 0), _Point(1, 1)], ('s', 'red'))]
+    assert isinstance(shapes[0].points[0], _Point)
+    assert origin == _Point(2, 3)
+    assert single == _Single(4)
+
+    shapes[0].extra = 3
+    convert = DBusSignature.from_return(method).return_converter()
+    assert convert(shapes) == [('square', [(0, 0), (1, 1)], ('i', 3))]
+    assert DBusSignature._type_converter(_Single)(_Single(4)) == (4,)
+
+    # named tuples without variants are sent as they are
+    assert DBusSignature._type_converter(_Point) is None
+    assert DBusSignature._type_converter(typing.List[_Point]) is None
+    # the converters are built once per type
+    assert DBusSignature._type_decoder(typing.List[_Shape]) is DBusSignature._type_decoder(typing.List[_Shape])
+
+
+def test_struct_variant():
+    assert variant(_Point(1, 2)) == ('(ii)', (1, 2))
+    assert variant(_Single(1)) == ('(i)', (1,))